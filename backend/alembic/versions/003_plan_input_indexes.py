@@ -0,0 +1,38 @@
+"""Plan input indexes: (sku, warehouse_code, week_start) for snapshot/receipt/demand loading
+
+Revision ID: 003
+Revises: 002
+Create Date: 2025-03-03
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+
+
+revision: str = "003"
+down_revision: Union[str, None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Latest snapshot per key (DISTINCT ON sku, warehouse_code ORDER BY week_start DESC)
+    op.create_index(
+        "ix_inventory_snapshots_weekly_sku_wh_week",
+        "inventory_snapshots_weekly",
+        ["sku", "warehouse_code", "week_start"],
+    )
+    # Per-key horizon range scans
+    op.create_index("ix_receipts_sku_wh_week", "receipts", ["sku", "warehouse_code", "week_start"])
+    op.create_index(
+        "ix_demand_actuals_sku_wh_type_week",
+        "demand_actuals",
+        ["sku", "warehouse_code", "demand_type", "week_start"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_demand_actuals_sku_wh_type_week", table_name="demand_actuals")
+    op.drop_index("ix_receipts_sku_wh_week", table_name="receipts")
+    op.drop_index("ix_inventory_snapshots_weekly_sku_wh_week", table_name="inventory_snapshots_weekly")
@@ -0,0 +1,46 @@
+"""Plan jobs: background plan run queue with status, stage progress and cancel flag
+
+Revision ID: 004
+Revises: 003
+Create Date: 2025-03-10
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "plan_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("scenario_name", sa.String(128), nullable=False),
+        sa.Column("run_at", sa.Date(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "CANCELLED", name="jobstatus"),
+            nullable=False,
+        ),
+        sa.Column("stage", sa.String(32), nullable=True),
+        sa.Column("stage_progress", sa.Numeric(5, 4), nullable=False, server_default="0"),
+        sa.Column("progress", sa.Numeric(5, 4), nullable=False, server_default="0"),
+        sa.Column("cancel_requested", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("plan_run_id", sa.Integer(), sa.ForeignKey("plan_runs.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_plan_jobs_status", "plan_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_table("plan_jobs")
+    op.execute("DROP TYPE IF EXISTS jobstatus")
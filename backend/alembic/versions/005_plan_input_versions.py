@@ -0,0 +1,46 @@
+"""Plan input versions: per-key change counters and the versions each plan run used
+
+Revision ID: 005
+Revises: 004
+Create Date: 2025-03-17
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "plan_input_versions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("sku", sa.String(64), nullable=False),
+        sa.Column("warehouse_code", sa.String(32), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.UniqueConstraint("sku", "warehouse_code", name="uq_plan_input_versions_sku_wh"),
+    )
+    op.create_table(
+        "plan_run_input_versions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("plan_run_id", sa.Integer(), sa.ForeignKey("plan_runs.id"), nullable=False),
+        sa.Column("sku", sa.String(64), nullable=False),
+        sa.Column("warehouse_code", sa.String(32), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+    )
+    op.create_index("ix_plan_run_input_versions_plan_run_id", "plan_run_input_versions", ["plan_run_id"])
+    op.add_column("plan_runs", sa.Column("base_plan_run_id", sa.Integer(), sa.ForeignKey("plan_runs.id"), nullable=True))
+    op.add_column("plan_jobs", sa.Column("incremental", sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    op.drop_column("plan_jobs", "incremental")
+    op.drop_column("plan_runs", "base_plan_run_id")
+    op.drop_table("plan_run_input_versions")
+    op.drop_table("plan_input_versions")
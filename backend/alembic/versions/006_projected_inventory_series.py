@@ -0,0 +1,47 @@
+"""Projected inventory series: compact one-row-per-key projection storage
+
+Revision ID: 006
+Revises: 005
+Create Date: 2025-03-24
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "006"
+down_revision: Union[str, None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "projected_inventory_series",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("plan_run_id", sa.Integer(), sa.ForeignKey("plan_runs.id"), nullable=False),
+        sa.Column("sku", sa.String(64), nullable=False),
+        sa.Column("warehouse_code", sa.String(32), nullable=False),
+        sa.Column("first_week", sa.Date(), nullable=False),
+        sa.Column("start_qty", postgresql.ARRAY(sa.Numeric(18, 4)), nullable=False),
+        sa.Column("receipts_qty", postgresql.ARRAY(sa.Numeric(18, 4)), nullable=False),
+        sa.Column("demand_qty", postgresql.ARRAY(sa.Numeric(18, 4)), nullable=False),
+        sa.Column("projected_qty", postgresql.ARRAY(sa.Numeric(18, 4)), nullable=False),
+        sa.Column("weeks_of_cover", postgresql.ARRAY(sa.Numeric(10, 2)), nullable=False),
+        sa.Column("stockout", postgresql.ARRAY(sa.Boolean()), nullable=False),
+        sa.UniqueConstraint(
+            "plan_run_id", "sku", "warehouse_code", name="uq_projected_inventory_series_run_sku_wh"
+        ),
+    )
+    op.add_column(
+        "plan_runs",
+        sa.Column("projection_storage", sa.String(16), nullable=False, server_default="rows"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("plan_runs", "projection_storage")
+    op.drop_table("projected_inventory_series")
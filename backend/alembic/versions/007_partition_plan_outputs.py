@@ -0,0 +1,76 @@
+"""Partition plan output tables by plan_run_id; existing rows become a legacy partition
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-03-31
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> (single-column indexes, extra unique constraint columns)
+_TABLES: dict[str, tuple[list[str], list[str]]] = {
+    "projected_inventory": (["plan_run_id", "week_start", "sku", "warehouse_code"], []),
+    "planned_orders": (["plan_run_id", "week_start", "sku", "warehouse_code"], []),
+    "projected_inventory_series": ([], ["plan_run_id", "sku", "warehouse_code"]),
+    "plan_run_input_versions": (["plan_run_id"], []),
+}
+_SERIES_UNIQUE = "uq_projected_inventory_series_run_sku_wh"
+
+
+def _index_names(table: str) -> list[str]:
+    rows = op.get_bind().execute(
+        sa.text("SELECT indexname FROM pg_indexes WHERE tablename = :t"), {"t": table}
+    )
+    return [r[0] for r in rows]
+
+
+def _add_keys_and_indexes(table: str, partitioned: bool) -> None:
+    indexes, unique = _TABLES[table]
+    pk = "(id, plan_run_id)" if partitioned else "(id)"
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY {pk}")
+    op.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {table}_plan_run_id_fkey "
+        f"FOREIGN KEY (plan_run_id) REFERENCES plan_runs (id)"
+    )
+    if unique:
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {_SERIES_UNIQUE} UNIQUE ({', '.join(unique)})")
+    for col in indexes:
+        op.create_index(f"ix_{table}_{col}", table, [col])
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    legacy_hi = bind.execute(sa.text("SELECT COALESCE(MAX(id), 0) + 1 FROM plan_runs")).scalar_one()
+    for table in _TABLES:
+        legacy = f"{table}_legacy"
+        op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        # The partition key must be part of the primary key; rebuilt as (id, plan_run_id) on attach.
+        op.execute(f"ALTER TABLE {legacy} DROP CONSTRAINT {table}_pkey")
+        for name in _index_names(legacy):
+            op.execute(f"ALTER INDEX {name} RENAME TO {name}_legacy")
+        op.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_plan_run_id_fkey TO {table}_plan_run_id_fkey_legacy")
+        op.execute(f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (plan_run_id)")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        _add_keys_and_indexes(table, partitioned=True)
+        # Indexes matching the parent's are adopted; the rest are built once here.
+        op.execute(f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ({legacy_hi})")
+
+
+def downgrade() -> None:
+    for table in _TABLES:
+        parted = f"{table}_parted"
+        op.execute(f"ALTER TABLE {table} RENAME TO {parted}")
+        op.execute(f"CREATE TABLE {table} (LIKE {parted} INCLUDING DEFAULTS)")
+        op.execute(f"INSERT INTO {table} SELECT * FROM {parted}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {parted} CASCADE")
+        _add_keys_and_indexes(table, partitioned=False)
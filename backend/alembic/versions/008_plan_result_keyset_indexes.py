@@ -0,0 +1,40 @@
+"""Composite indexes for keyset pagination of plan results and plan runs
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-04-07
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_RESULT_TABLES = ("projected_inventory", "planned_orders")
+
+
+def upgrade() -> None:
+    for table in _RESULT_TABLES:
+        # Created on the partitioned parent, so every run partition (and the legacy one) gets them.
+        # Pages in (week_start, sku, warehouse_code, id) order within a run
+        op.create_index(
+            f"ix_{table}_run_week_sku_wh", table, ["plan_run_id", "week_start", "sku", "warehouse_code", "id"]
+        )
+        # Per-key reads (sku + warehouse filters) in week order
+        op.create_index(f"ix_{table}_run_sku_wh_week", table, ["plan_run_id", "sku", "warehouse_code", "week_start"])
+        # Both composites lead with plan_run_id
+        op.drop_index(f"ix_{table}_plan_run_id", table_name=table)
+    op.create_index("ix_plan_runs_created_at_id", "plan_runs", ["created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_plan_runs_created_at_id", table_name="plan_runs")
+    for table in _RESULT_TABLES:
+        op.create_index(f"ix_{table}_plan_run_id", table, ["plan_run_id"])
+        op.drop_index(f"ix_{table}_run_sku_wh_week", table_name=table)
+        op.drop_index(f"ix_{table}_run_week_sku_wh", table_name=table)
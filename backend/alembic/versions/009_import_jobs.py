@@ -0,0 +1,54 @@
+"""Import jobs: background CSV imports committed in batches, with a resumable high-water mark
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-04-14
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "import_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("kind", sa.String(32), nullable=False),
+        sa.Column("filename", sa.String(256), nullable=True),
+        sa.Column(
+            "status",
+            # jobstatus is shared with plan_jobs (004)
+            postgresql.ENUM(
+                "QUEUED", "RUNNING", "SUCCEEDED", "FAILED", "CANCELLED", name="jobstatus", create_type=False
+            ),
+            nullable=False,
+        ),
+        sa.Column("file_size", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("rows_done", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("valid_rows", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("inserted_rows", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_rows", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("progress", sa.Numeric(5, 4), nullable=False, server_default="0"),
+        sa.Column("error_report_id", sa.String(32), nullable=True),
+        sa.Column("error_report_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("cancel_requested", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_import_jobs_status", "import_jobs", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_table("import_jobs")
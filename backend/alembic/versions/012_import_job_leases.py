@@ -0,0 +1,27 @@
+"""Import job leases: the process running a job and its heartbeat, so processes can share the queue
+
+Revision ID: 012
+Revises: 011
+Create Date: 2025-05-05
+
+"""
+# pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "012"
+down_revision: Union[str, None] = "011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("import_jobs", sa.Column("claimed_by", sa.String(128), nullable=True))
+    op.add_column("import_jobs", sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("import_jobs", "heartbeat_at")
+    op.drop_column("import_jobs", "claimed_by")
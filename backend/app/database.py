@@ -1,23 +1,227 @@
 from __future__ import annotations
 import logging
-from collections.abc import Generator
+import shlex
+import ssl
+import time
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
 
-from sqlalchemy import create_engine
+from sqlalchemy import URL, Engine, create_engine, make_url, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
 from app.config import settings
+from app.services.pool_stats import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument
 
 logger = logging.getLogger(__name__)
 
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-)
+_POOL_OPTIONS: dict[str, Any] = {
+    "pool_pre_ping": True,
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout_s,
+    "pool_recycle": settings.db_pool_recycle_s,
+}
+# Applies to request sessions (engine, async_engine and the replica's); background_engine has none
+_statement_timeout_ms = settings.db_statement_timeout_ms
+
+
+def _create_engine(url: str, statement_timeout: bool = True) -> Engine:
+    timeout_ms = _statement_timeout_ms if statement_timeout else 0
+    created = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        connect_args={"options": f"-c statement_timeout={timeout_ms}"} if timeout_ms > 0 else {},
+        **_POOL_OPTIONS,
+    )
+    instrument(created.pool)
+    return created
+
+
+# Query parameters asyncpg.connect() takes as they are; host and port are read by SQLAlchemy's dialect
+_ASYNCPG_QUERY_PARAMS = {"host", "port", "passfile", "target_session_attrs", "direct_tls"}
+
+
+def _asyncpg_ssl(mode: str, query: dict[str, str]) -> str | ssl.SSLContext:
+    """asyncpg's ssl argument for a libpq sslmode and its certificate files (sslrootcert, sslcert, sslkey)."""
+    rootcert, cert, key = query.get("sslrootcert"), query.get("sslcert"), query.get("sslkey")
+    if mode == "disable" or not (rootcert or cert):
+        return mode
+    context = ssl.create_default_context(cafile=rootcert)
+    if mode != "verify-full":
+        context.check_hostname = False
+    if not rootcert or mode in ("allow", "prefer"):
+        context.verify_mode = ssl.CERT_NONE
+    if cert:
+        context.load_cert_chain(cert, key)
+    return context
+
+
+def _asyncpg_connect(url: str) -> tuple[URL, dict[str, Any]]:
+    """The asyncpg URL and connect args for a libpq (psycopg2) database URL.
+
+    libpq query parameters are not asyncpg.connect() arguments: sslmode and its
+    certificate files become ssl, connect_timeout becomes timeout,
+    application_name and options' -c settings become server_settings; others
+    asyncpg has no equivalent for (keepalives, gssencmode, ...) are dropped.
+    """
+    parsed = make_url(url)
+    query = {k: v if isinstance(v, str) else v[-1] for k, v in parsed.query.items()}
+    args: dict[str, Any] = {}
+    server_settings: dict[str, str] = {}
+    if "sslmode" in query:
+        args["ssl"] = _asyncpg_ssl(query["sslmode"], query)
+    if float(query.get("connect_timeout") or 0) > 0:  # libpq: 0 or unset waits indefinitely
+        args["timeout"] = float(query["connect_timeout"])
+    if "application_name" in query:
+        server_settings["application_name"] = query["application_name"]
+    options = shlex.split(query.get("options", ""))
+    for flag, value in zip(options, options[1:] + [""]):
+        setting = value if flag == "-c" else flag[2:] if flag.startswith("--") else ""
+        if "=" in setting:
+            name, _, setting_value = setting.partition("=")
+            server_settings[name.replace("-", "_")] = setting_value
+    if _statement_timeout_ms > 0:
+        server_settings["statement_timeout"] = str(_statement_timeout_ms)
+    if server_settings:
+        args["server_settings"] = server_settings
+    dropped = sorted(
+        k for k in query
+        if k not in _ASYNCPG_QUERY_PARAMS
+        and k not in ("sslmode", "sslrootcert", "sslcert", "sslkey", "connect_timeout", "application_name", "options")
+    )
+    if dropped:
+        logger.warning("Ignoring database URL parameters asyncpg does not support: %s", ", ".join(dropped))
+    kept = {k: v for k, v in parsed.query.items() if k in _ASYNCPG_QUERY_PARAMS}
+    return parsed.set(drivername="postgresql+asyncpg", query=kept), args
+
+
+def _create_async_engine(url: str) -> AsyncEngine:
+    # Read-only endpoints use asyncpg, so waiting on Postgres does not hold a threadpool slot.
+    # Autocommit: their queries need no BEGIN/ROLLBACK round trips; do not write through it.
+    async_url, connect_args = _asyncpg_connect(url)
+    created = create_async_engine(
+        async_url,
+        poolclass=InstrumentedAsyncQueuePool,
+        connect_args=connect_args,
+        isolation_level="AUTOCOMMIT",
+        **_POOL_OPTIONS,
+    )
+    instrument(created.pool)
+    return created
+
+
+engine = _create_engine(settings.database_url)
 SessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine
 )
 Base = declarative_base()
 
+# Long-running work outside requests: plan and import jobs, import worker processes, run purges.
+# Without db_statement_timeout_ms, which is sized for API requests and would abort them partway.
+background_engine = _create_engine(settings.database_url, statement_timeout=False)
+BackgroundSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=background_engine)
+
+async_engine = _create_async_engine(settings.database_url)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# Read replica for GET endpoints (see get_read_db); None sends every read to the primary
+replica_engine = _create_engine(settings.database_replica_url) if settings.database_replica_url else None
+replica_async_engine = _create_async_engine(settings.database_replica_url) if settings.database_replica_url else None
+
+# 0 on a server that is not a standby, or on a standby streaming from its primary that has replayed all WAL
+# received; otherwise (receiver disconnected, replay behind) the age of the last replayed transaction, NULL
+# before the first replay. pg_stat_wal_receiver.status is only visible to roles with pg_read_all_stats
+# (e.g. pg_monitor); without it the standby is always measured by replay age.
+_REPLICA_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()"
+    " AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0"
+    " ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+_replica_checked_at = float("-inf")
+_replica_lag: float | None = None
+_replica_fresh = False
+
+
+def _replica_check_due() -> bool:
+    """Whether the caller should measure the replica's lag; claims the check so others use the last result."""
+    global _replica_checked_at
+    now = time.monotonic()
+    if now - _replica_checked_at < settings.database_replica_check_s:
+        return False
+    _replica_checked_at = now
+    return True
+
+
+def _record_replica_lag(lag: float | None) -> None:
+    global _replica_lag, _replica_fresh
+    fresh = lag is not None and lag <= settings.database_replica_max_lag_s
+    if fresh != _replica_fresh:
+        if fresh:
+            logger.info("Read replica caught up (%.1fs behind); routing reads to it", lag)
+        else:
+            logger.warning("Read replica lagging (%s s behind) or unreachable; reading from the primary", lag)
+    _replica_lag, _replica_fresh = lag, fresh
+
+
+def replica_lag() -> float | None:
+    """Seconds the replica was behind at the last check; None if unknown or unreachable."""
+    return _replica_lag
+
+
+def replica_fresh() -> bool:
+    """Whether reads may go to the replica: configured, reachable and at most database_replica_max_lag_s behind."""
+    if replica_engine is None:
+        return False
+    if _replica_check_due():
+        try:
+            with replica_engine.connect() as conn:
+                lag = conn.scalar(_REPLICA_LAG)
+        except Exception as e:
+            logger.debug("Read replica check failed: %s", e)
+            lag = None
+        _record_replica_lag(float(lag) if lag is not None else None)
+    return _replica_fresh
+
+
+async def replica_fresh_async() -> bool:
+    """replica_fresh, measuring over the async engine."""
+    if replica_async_engine is None:
+        return False
+    if _replica_check_due():
+        try:
+            async with replica_async_engine.connect() as conn:
+                lag = await conn.scalar(_REPLICA_LAG)
+        except Exception as e:
+            logger.debug("Read replica check failed: %s", e)
+            lag = None
+        _record_replica_lag(float(lag) if lag is not None else None)
+    return _replica_fresh
+
+
+class RoutingSession(Session):
+    """Session that runs every statement on info["replica"] when set, else on its primary bind. Read-only."""
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kw: Any) -> Any:
+        replica = self.info.get("replica")
+        if replica is not None:
+            return replica
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=RoutingSession)
+AsyncReadSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False, sync_session_class=RoutingSession)
+
+
+def on_replica(db: Session | AsyncSession) -> bool:
+    return db.info.get("replica") is not None
+
+
+def use_primary(db: Session | AsyncSession) -> None:
+    """Send the session's further statements to the primary, e.g. for rows the replica has not replayed yet."""
+    db.info["replica"] = None
+
 
 def get_db() -> Generator[Session, None, None]:
     db: Session = SessionLocal()
@@ -25,3 +229,25 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_read_db() -> Generator[Session, None, None]:
+    """A read-only session on the replica when it is fresh enough, else on the primary."""
+    replica = replica_engine if replica_fresh() else None
+    db: Session = ReadSessionLocal(info={"replica": replica})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """get_read_db over asyncpg."""
+    replica = replica_async_engine.sync_engine if replica_async_engine is not None and await replica_fresh_async() else None
+    async with AsyncReadSessionLocal(info={"replica": replica}) as db:
+        yield db
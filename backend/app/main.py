@@ -1,14 +1,17 @@
 # pyright: reportUnknownMemberType=false, reportUnknownArgumentType=false, reportUnknownVariableType=false
 from __future__ import annotations
 import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.exc import SQLAlchemyError
 
-from app.database import Base, engine
+from app.database import Base, SessionLocal, engine
 from app.routers import (
     products,
     warehouses,
@@ -22,7 +25,15 @@ from app.routers import (
     imports_router,
     exports,
     templates,
+    health,
 )
+from app.services.import_jobs import recover_import_jobs, shutdown_import_jobs
+from app.services.import_workers import shutdown_import_workers
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.plan_jobs import recover_plan_jobs, shutdown_plan_jobs
+from app.services.plan_partitions import require_partitioned_tables
+from app.services.plan_retention import start_purge_scheduler, stop_purge_scheduler
+from app.services.plan_shards import shutdown_plan_shards
 
 logger = logging.getLogger(__name__)
 
@@ -38,10 +49,40 @@ except Exception as e:
 _DIST = Path(__file__).resolve().parent.parent.parent / "frontend" / "dist"
 _SERVE_FRONTEND = _DIST.is_dir()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Resume queued background plan runs and imports and start the retention purge; stop them on shutdown.
+
+    Refuses to start on a database whose plan output tables are not partitioned (migrations not run).
+    """
+    try:
+        with SessionLocal() as db:
+            require_partitioned_tables(db)
+    except SQLAlchemyError as e:
+        logger.warning("Could not check plan output partitioning (%s).", e)
+    try:
+        recover_plan_jobs()
+    except Exception as e:
+        logger.warning("Could not recover plan jobs (%s).", e)
+    try:
+        recover_import_jobs()
+    except Exception as e:
+        logger.warning("Could not recover import jobs (%s).", e)
+    start_purge_scheduler()
+    yield
+    stop_purge_scheduler()
+    shutdown_plan_jobs()
+    shutdown_import_jobs()
+    shutdown_plan_shards()
+    shutdown_import_workers()
+
+
 app = FastAPI(
     title="Weekly Supply Planning API",
     description="MVP weekly supply planning with SKU/warehouse projections and planned orders",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -50,6 +91,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(products.router, prefix="/api/products", tags=["products"])
@@ -64,6 +106,7 @@ app.include_router(plan_run.router, prefix="/api/plan", tags=["plan"])
 app.include_router(imports_router.router, prefix="/api/import", tags=["imports"])
 app.include_router(exports.router, prefix="/api/exports", tags=["exports"])
 app.include_router(templates.router, prefix="/api/templates", tags=["templates"])
+app.include_router(health.router, prefix="/api/health", tags=["health"])
 
 # Serve built frontend (after: cd frontend && npm run build)
 if _SERVE_FRONTEND:
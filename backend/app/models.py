@@ -3,17 +3,23 @@ import enum
 import logging
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
     Date,
+    DateTime,
     Enum as SQLEnum,
     ForeignKey,
+    Index,
     Integer,
     Numeric,
     String,
     Text,
     UniqueConstraint,
+    func,
+    literal_column,
 )
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -37,6 +43,14 @@ class DemandType(str, enum.Enum):
     ADJUSTMENT = "ADJUSTMENT"
 
 
+class JobStatus(str, enum.Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    SUCCEEDED = "SUCCEEDED"
+    FAILED = "FAILED"
+    CANCELLED = "CANCELLED"
+
+
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
@@ -100,7 +114,10 @@ class InventorySnapshotWeekly(Base):
     sku = Column(String(64), nullable=False, index=True)
     warehouse_code = Column(String(32), nullable=False, index=True)
     on_hand_qty = Column(Numeric(18, 4), default=0)
-    __table_args__ = (UniqueConstraint("week_start", "sku", "warehouse_code", name="uq_inv_week_sku_wh"),)
+    __table_args__ = (
+        UniqueConstraint("week_start", "sku", "warehouse_code", name="uq_inv_week_sku_wh"),
+        Index("ix_inventory_snapshots_weekly_sku_wh_week", "sku", "warehouse_code", "week_start"),
+    )
 
 
 class Receipt(Base):
@@ -111,6 +128,18 @@ class Receipt(Base):
     warehouse_code = Column(String(32), nullable=False, index=True)
     qty = Column(Numeric(18, 4), nullable=False)
     source_type = Column(String(64), nullable=True)  # e.g. PO, TRANSFER, etc.
+    __table_args__ = (
+        Index("ix_receipts_sku_wh_week", "sku", "warehouse_code", "week_start"),
+        # COALESCE so a NULL source_type is one key (import upsert target)
+        Index(
+            "uq_receipts_week_sku_wh_source",
+            "week_start",
+            "sku",
+            "warehouse_code",
+            func.coalesce(source_type, literal_column("''")),
+            unique=True,
+        ),
+    )
 
 
 class DemandActual(Base):
@@ -121,6 +150,27 @@ class DemandActual(Base):
     warehouse_code = Column(String(32), nullable=False, index=True)
     demand_type = Column(SQLEnum(DemandType), nullable=False)
     qty = Column(Numeric(18, 4), nullable=False)
+    __table_args__ = (
+        UniqueConstraint("week_start", "sku", "warehouse_code", "demand_type", name="uq_demand_actuals_week_sku_wh_type"),
+        Index("ix_demand_actuals_sku_wh_type_week", "sku", "warehouse_code", "demand_type", "week_start"),
+    )
+
+
+class PlanInputVersion(Base):
+    """Per-(sku, warehouse) change counter, bumped whenever a plan input for the key is written."""
+    __tablename__ = "plan_input_versions"
+    id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String(64), nullable=False)
+    warehouse_code = Column(String(32), nullable=False)
+    version = Column(BigInteger, nullable=False, default=1)
+    __table_args__ = (UniqueConstraint("sku", "warehouse_code", name="uq_plan_input_versions_sku_wh"),)
+
+
+class MasterDataVersion(Base):
+    """Per-table change counter of a master-data table, bumped with every write to it (see master_data_cache)."""
+    __tablename__ = "master_data_versions"
+    table_name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=1)
 
 
 class PlanRun(Base):
@@ -129,12 +179,26 @@ class PlanRun(Base):
     scenario_name = Column(String(128), nullable=False, index=True)
     run_at = Column(Date, nullable=False)
     created_at = Column(Date, nullable=False)
+    base_plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), nullable=True)  # incremental: unchanged keys copied from
+    projection_storage = Column(String(16), nullable=False, default="rows")  # rows: projected_inventory; series: projected_inventory_series
+    __table_args__ = (Index("ix_plan_runs_created_at_id", "created_at", "id"),)
+
+
+class PlanRunInputVersion(Base):
+    """Input version of each key a plan run projected; the next incremental run diffs against it."""
+    __tablename__ = "plan_run_input_versions"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), primary_key=True, index=True)
+    sku = Column(String(64), nullable=False)
+    warehouse_code = Column(String(32), nullable=False)
+    version = Column(BigInteger, nullable=False)
+    __table_args__ = {"postgresql_partition_by": "RANGE (plan_run_id)"}
 
 
 class ProjectedInventory(Base):
     __tablename__ = "projected_inventory"
-    id = Column(Integer, primary_key=True, index=True)
-    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), primary_key=True)
     week_start = Column(Date, nullable=False, index=True)
     sku = Column(String(64), nullable=False, index=True)
     warehouse_code = Column(String(32), nullable=False, index=True)
@@ -145,17 +209,99 @@ class ProjectedInventory(Base):
     weeks_of_cover = Column(Numeric(10, 2), nullable=True)
     stockout = Column(Boolean, default=False)
     plan_run = relationship("PlanRun", back_populates="projected_inventory")
+    __table_args__ = (
+        # Keyset pages in (week, sku, warehouse) order, and per-key lookups
+        Index("ix_projected_inventory_run_week_sku_wh", "plan_run_id", "week_start", "sku", "warehouse_code", "id"),
+        Index("ix_projected_inventory_run_sku_wh_week", "plan_run_id", "sku", "warehouse_code", "week_start"),
+        {"postgresql_partition_by": "RANGE (plan_run_id)"},
+    )
+
+
+class ProjectedInventorySeries(Base):
+    """Compact projection: one row per (run, sku, warehouse); arrays hold consecutive weeks from first_week."""
+    __tablename__ = "projected_inventory_series"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), primary_key=True)
+    sku = Column(String(64), nullable=False)
+    warehouse_code = Column(String(32), nullable=False)
+    first_week = Column(Date, nullable=False)
+    start_qty = Column(ARRAY(Numeric(18, 4)), nullable=False)
+    receipts_qty = Column(ARRAY(Numeric(18, 4)), nullable=False)
+    demand_qty = Column(ARRAY(Numeric(18, 4)), nullable=False)
+    projected_qty = Column(ARRAY(Numeric(18, 4)), nullable=False)
+    weeks_of_cover = Column(ARRAY(Numeric(10, 2)), nullable=False)
+    stockout = Column(ARRAY(Boolean), nullable=False)
+    __table_args__ = (
+        UniqueConstraint("plan_run_id", "sku", "warehouse_code", name="uq_projected_inventory_series_run_sku_wh"),
+        {"postgresql_partition_by": "RANGE (plan_run_id)"},
+    )
 
 
 class PlannedOrder(Base):
     __tablename__ = "planned_orders"
-    id = Column(Integer, primary_key=True, index=True)
-    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), primary_key=True)
     week_start = Column(Date, nullable=False, index=True)
     sku = Column(String(64), nullable=False, index=True)
     warehouse_code = Column(String(32), nullable=False, index=True)
     order_qty = Column(Numeric(18, 4), nullable=False)
     plan_run = relationship("PlanRun", back_populates="planned_orders")
+    __table_args__ = (
+        Index("ix_planned_orders_run_week_sku_wh", "plan_run_id", "week_start", "sku", "warehouse_code", "id"),
+        Index("ix_planned_orders_run_sku_wh_week", "plan_run_id", "sku", "warehouse_code", "week_start"),
+        {"postgresql_partition_by": "RANGE (plan_run_id)"},
+    )
+
+
+class PlanJob(Base):
+    """Background plan run request; plan_run_id is set once the run has committed."""
+    __tablename__ = "plan_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    scenario_name = Column(String(128), nullable=False)
+    run_at = Column(Date, nullable=False)
+    status = Column(SQLEnum(JobStatus), nullable=False, default=JobStatus.QUEUED, index=True)
+    stage = Column(String(32), nullable=True)
+    stage_progress = Column(Numeric(5, 4), nullable=False, default=0)
+    progress = Column(Numeric(5, 4), nullable=False, default=0)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    incremental = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+    plan_run_id = Column(Integer, ForeignKey("plan_runs.id"), nullable=True)
+    claimed_by = Column(String(128), nullable=True)  # process holding the job while RUNNING
+    heartbeat_at = Column(DateTime, nullable=True)  # lease renewed by claimed_by; see job_leases
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    plan_run = relationship("PlanRun")
+
+
+class ImportJob(Base):
+    """Background CSV import applied in committed batches.
+
+    rows_done is the high-water mark: data rows (from the first) whose batch has committed,
+    together with these counters, so an interrupted job resumes after it.
+    """
+    __tablename__ = "import_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(32), nullable=False)
+    filename = Column(String(256), nullable=True)
+    status = Column(SQLEnum(JobStatus), nullable=False, default=JobStatus.QUEUED, index=True)
+    file_size = Column(BigInteger, nullable=False, default=0)
+    rows_done = Column(Integer, nullable=False, default=0)
+    valid_rows = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    inserted_rows = Column(Integer, nullable=False, default=0)
+    updated_rows = Column(Integer, nullable=False, default=0)
+    progress = Column(Numeric(5, 4), nullable=False, default=0)
+    error_report_id = Column(String(32), nullable=True)
+    error_report_bytes = Column(BigInteger, nullable=False, default=0)  # report length as of rows_done
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+    claimed_by = Column(String(128), nullable=True)  # process holding the job while RUNNING
+    heartbeat_at = Column(DateTime, nullable=True)  # lease renewed by claimed_by; see job_leases
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
 
 
 PlanRun.projected_inventory = relationship("ProjectedInventory", back_populates="plan_run")
@@ -3,9 +3,10 @@ import logging
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_async_read_db
 from app.models import DemandActual as DemandActualModel
 from app.schemas import DemandActual
 
@@ -14,20 +15,20 @@ router = APIRouter()
 
 
 @router.get("/", response_model=list[DemandActual])
-def list_demand_actuals(
+async def list_demand_actuals(
     week_start: str | None = Query(None),
     sku: str | None = Query(None),
     warehouse_code: str | None = Query(None),
     demand_type: str | None = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ) -> list[DemandActualModel]:
-    q = db.query(DemandActualModel)
+    q = select(DemandActualModel)
     if week_start:
-        q = q.filter(DemandActualModel.week_start == datetime.fromisoformat(week_start).date())
+        q = q.where(DemandActualModel.week_start == datetime.fromisoformat(week_start).date())
     if sku:
-        q = q.filter(DemandActualModel.sku == sku)
+        q = q.where(DemandActualModel.sku == sku)
     if warehouse_code:
-        q = q.filter(DemandActualModel.warehouse_code == warehouse_code)
+        q = q.where(DemandActualModel.warehouse_code == warehouse_code)
     if demand_type:
-        q = q.filter(DemandActualModel.demand_type == demand_type)
-    return q.order_by(DemandActualModel.week_start, DemandActualModel.sku).all()
+        q = q.where(DemandActualModel.demand_type == demand_type)
+    return list(await db.scalars(q.order_by(DemandActualModel.week_start, DemandActualModel.sku)))
@@ -1,100 +1,170 @@
 from __future__ import annotations
 import csv
 import logging
+from collections.abc import Iterable, Iterator, Sequence
 from io import StringIO
-from typing import Any
+from typing import Any, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
+from sqlalchemy import Engine, Select, literal, select
 from sqlalchemy.orm import Session
 
-from app.database import get_db
+from app.database import ReadSessionLocal, get_read_db, on_replica, use_primary
 from app.models import PlanRun, PlannedOrder, ProjectedInventory
+from app.services.columnar_export import MEDIA_TYPES, arrow_schema, columnar_available, stream_columnar
+from app.services.plan_result_cache import CacheKey, cached_response, plan_results
+from app.services.plan_storage import STORAGE_SERIES, series_weeks_select
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+_EXPORT_YIELD_PER = 2000
+_CHUNK_SIZE = 64 * 1024
+_COLUMNAR_BATCH_ROWS = 65536
 
-def _stream_csv(rows: list[dict[str, Any]], columns: list[str]) -> StringIO:
+ExportFormat = Literal["csv", "parquet", "arrow"]
+
+PROJECTED_INVENTORY_EXPORT_COLUMNS = [
+    "scenario_name", "week_start", "sku", "warehouse_code",
+    "start_qty", "receipts_qty", "demand_qty", "projected_qty",
+    "weeks_of_cover", "stockout",
+]
+PLANNED_ORDER_EXPORT_COLUMNS = ["scenario_name", "week_start", "sku", "warehouse_code", "order_qty"]
+
+
+def _csv_chunks(rows: Iterable[Sequence[Any]], columns: list[str]) -> Iterator[str]:
+    """CSV text in ~_CHUNK_SIZE chunks as rows arrive."""
     buf = StringIO()
-    w = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
-    w.writeheader()
-    for r in rows:
-        w.writerow({k: str(v) if v is not None else "" for k, v in r.items()})
-    buf.seek(0)
-    return buf
+    w = csv.writer(buf)
+    w.writerow(columns)
+    for row in rows:
+        w.writerow(row)
+        if buf.tell() >= _CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
 
 
-@router.get("/projected-inventory")
-def export_projected_inventory(
-    plan_run_id: int = Query(...),
-    db: Session = Depends(get_db),
+def _stream_export(
+    stmt: Select[Any], columns: list[str], fmt: ExportFormat, replica: Engine | None
+) -> Iterator[str | bytes]:
+    """Encode stmt's rows as they arrive from a server-side cursor.
+
+    Runs on its own session, on the replica the request's session read from (if
+    any): that session is closed before the body is streamed.
+    """
+    with ReadSessionLocal(info={"replica": replica}) as db:
+        result = db.execute(stmt.execution_options(yield_per=_EXPORT_YIELD_PER))
+        if fmt == "csv":
+            yield from _csv_chunks(result, columns)
+        else:
+            yield from stream_columnar(fmt, arrow_schema(stmt), result.partitions(_COLUMNAR_BATCH_ROWS))
+
+
+def _export_response(
+    db: Session, key: CacheKey, stmt: Select[Any], columns: list[str], fmt: ExportFormat, name: str
 ) -> StreamingResponse:
+    """Stream the export, writing it to the plan result cache's disk tier (if configured) on the way."""
+    if fmt == "csv":
+        media_type = "text/csv"
+    elif columnar_available():
+        media_type = MEDIA_TYPES[fmt]
+    else:
+        raise HTTPException(status_code=501, detail=f"{fmt} export requires pyarrow")
+    headers = {"Content-Disposition": f"attachment; filename={name}.{fmt}"}
+    return StreamingResponse(
+        plan_results.tee(key, _stream_export(stmt, columns, fmt, db.info.get("replica")), media_type, headers),
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+def _get_run(db: Session, plan_run_id: int) -> PlanRun:
+    """The run; read from the primary if the replica has not replayed its commit (and results) yet."""
     run = db.query(PlanRun).filter(PlanRun.id == plan_run_id).first()
+    if not run and on_replica(db):
+        use_primary(db)
+        run = db.query(PlanRun).filter(PlanRun.id == plan_run_id).first()
     if not run:
+        plan_results.evict_run(plan_run_id)  # purged, possibly by another process
         raise HTTPException(status_code=404, detail="Plan run not found")
-    rows = (
-        db.query(ProjectedInventory)
-        .filter(ProjectedInventory.plan_run_id == plan_run_id)
-        .order_by(ProjectedInventory.week_start, ProjectedInventory.sku)
-        .all()
+    return run
+
+
+def projected_inventory_export_select(run: PlanRun) -> Select[Any]:
+    """Rows of PROJECTED_INVENTORY_EXPORT_COLUMNS for a run, in either storage layout."""
+    scenario = literal(run.scenario_name).label("scenario_name")
+    if run.projection_storage == STORAGE_SERIES:
+        weeks = series_weeks_select(run.id)
+        return weeks.with_only_columns(scenario, *weeks.selected_columns)
+    p = ProjectedInventory
+    return (
+        select(
+            scenario,
+            p.week_start,
+            p.sku,
+            p.warehouse_code,
+            p.start_qty,
+            p.receipts_qty,
+            p.demand_qty,
+            p.projected_qty,
+            p.weeks_of_cover,
+            p.stockout,
+        )
+        .where(p.plan_run_id == run.id)
+        .order_by(p.week_start, p.sku)
     )
-    data = [
-        {
-            "scenario_name": run.scenario_name,
-            "week_start": r.week_start,
-            "sku": r.sku,
-            "warehouse_code": r.warehouse_code,
-            "start_qty": getattr(r, "start_qty", None),
-            "receipts_qty": getattr(r, "receipts_qty", None),
-            "demand_qty": getattr(r, "demand_qty", None),
-            "projected_qty": r.projected_qty,
-            "weeks_of_cover": r.weeks_of_cover,
-            "stockout": r.stockout,
-        }
-        for r in rows
-    ]
-    cols = [
-        "scenario_name", "week_start", "sku", "warehouse_code",
-        "start_qty", "receipts_qty", "demand_qty", "projected_qty",
-        "weeks_of_cover", "stockout",
-    ]
-    buf = _stream_csv(data, cols)
-    return StreamingResponse(
-        iter([buf.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=projected_inventory_{run.scenario_name}.csv"},
+
+
+def planned_orders_export_select(run: PlanRun) -> Select[Any]:
+    """Rows of PLANNED_ORDER_EXPORT_COLUMNS for a run."""
+    o = PlannedOrder
+    return (
+        select(literal(run.scenario_name).label("scenario_name"), o.week_start, o.sku, o.warehouse_code, o.order_qty)
+        .where(o.plan_run_id == run.id)
+        .order_by(o.week_start, o.sku)
+    )
+
+
+@router.get("/projected-inventory")
+def export_projected_inventory(
+    request: Request,
+    plan_run_id: int = Query(...),
+    format: ExportFormat = Query("csv", description="csv, parquet or arrow (Arrow IPC file)"),
+    db: Session = Depends(get_read_db),
+) -> Response:
+    key: CacheKey = (plan_run_id, "export-projected-inventory", format)
+    run = _get_run(db, plan_run_id)
+    if hit := plan_results.get(key):
+        return cached_response(request, hit)
+    return _export_response(
+        db,
+        key,
+        projected_inventory_export_select(run),
+        PROJECTED_INVENTORY_EXPORT_COLUMNS,
+        format,
+        f"projected_inventory_{run.scenario_name}",
     )
 
 
 @router.get("/planned-orders")
 def export_planned_orders(
+    request: Request,
     plan_run_id: int = Query(...),
-    db: Session = Depends(get_db),
-) -> StreamingResponse:
-    run = db.query(PlanRun).filter(PlanRun.id == plan_run_id).first()
-    if not run:
-        raise HTTPException(status_code=404, detail="Plan run not found")
-    rows = (
-        db.query(PlannedOrder)
-        .filter(PlannedOrder.plan_run_id == plan_run_id)
-        .order_by(PlannedOrder.week_start, PlannedOrder.sku)
-        .all()
-    )
-    data = [
-        {
-            "scenario_name": run.scenario_name,
-            "week_start": r.week_start,
-            "sku": r.sku,
-            "warehouse_code": r.warehouse_code,
-            "order_qty": r.order_qty,
-        }
-        for r in rows
-    ]
-    cols = ["scenario_name", "week_start", "sku", "warehouse_code", "order_qty"]
-    buf = _stream_csv(data, cols)
-    return StreamingResponse(
-        iter([buf.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=planned_orders_{run.scenario_name}.csv"},
+    format: ExportFormat = Query("csv", description="csv, parquet or arrow (Arrow IPC file)"),
+    db: Session = Depends(get_read_db),
+) -> Response:
+    key: CacheKey = (plan_run_id, "export-planned-orders", format)
+    run = _get_run(db, plan_run_id)
+    if hit := plan_results.get(key):
+        return cached_response(request, hit)
+    return _export_response(
+        db,
+        key,
+        planned_orders_export_select(run),
+        PLANNED_ORDER_EXPORT_COLUMNS,
+        format,
+        f"planned_orders_{run.scenario_name}",
     )
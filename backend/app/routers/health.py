@@ -0,0 +1,29 @@
+from __future__ import annotations
+import logging
+
+from fastapi import APIRouter
+
+from app.config import settings
+from app.database import async_engine, background_engine, engine, replica_async_engine, replica_engine, replica_fresh_async, replica_lag
+from app.schemas import DbHealth, DbPoolStats
+from app.services.pool_stats import pool_status
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+@router.get("/db", response_model=DbHealth)
+async def db_health() -> DbHealth:
+    """Pool occupancy and connection wait figures of this process; async so it answers while the threadpool is busy."""
+    max_overflow = settings.db_max_overflow
+    health = DbHealth(
+        sync_pool=DbPoolStats(**pool_status(engine.pool, max_overflow)),
+        async_pool=DbPoolStats(**pool_status(async_engine.pool, max_overflow)),
+        background_pool=DbPoolStats(**pool_status(background_engine.pool, max_overflow)),
+    )
+    if replica_engine is not None and replica_async_engine is not None:
+        health.replica_in_use = await replica_fresh_async()
+        health.replica_lag_s = replica_lag()
+        health.replica_sync_pool = DbPoolStats(**pool_status(replica_engine.pool, max_overflow))
+        health.replica_async_pool = DbPoolStats(**pool_status(replica_async_engine.pool, max_overflow))
+    return health
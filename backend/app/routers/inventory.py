@@ -3,9 +3,10 @@ import logging
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_async_read_db
 from app.models import InventorySnapshotWeekly
 from app.schemas import InventorySnapshot
 
@@ -14,17 +15,17 @@ router = APIRouter()
 
 
 @router.get("/", response_model=list[InventorySnapshot])
-def list_inventory_snapshots(
+async def list_inventory_snapshots(
     week_start: str | None = Query(None),
     sku: str | None = Query(None),
     warehouse_code: str | None = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ) -> list[InventorySnapshotWeekly]:
-    q = db.query(InventorySnapshotWeekly)
+    q = select(InventorySnapshotWeekly)
     if week_start:
-        q = q.filter(InventorySnapshotWeekly.week_start == datetime.fromisoformat(week_start).date())
+        q = q.where(InventorySnapshotWeekly.week_start == datetime.fromisoformat(week_start).date())
     if sku:
-        q = q.filter(InventorySnapshotWeekly.sku == sku)
+        q = q.where(InventorySnapshotWeekly.sku == sku)
     if warehouse_code:
-        q = q.filter(InventorySnapshotWeekly.warehouse_code == warehouse_code)
-    return q.order_by(InventorySnapshotWeekly.week_start, InventorySnapshotWeekly.sku).all()
+        q = q.where(InventorySnapshotWeekly.warehouse_code == warehouse_code)
+    return list(await db.scalars(q.order_by(InventorySnapshotWeekly.week_start, InventorySnapshotWeekly.sku)))
@@ -1,26 +1,28 @@
 from __future__ import annotations
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models import Lane as LaneModel
 from app.schemas import Lane, LaneCreate
+from app.services.master_data_cache import bump_versions, cached_list_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("/", response_model=list[Lane])
-def list_lanes(db: Session = Depends(get_db)) -> list[LaneModel]:
-    return db.query(LaneModel).all()
+def list_lanes(request: Request, db: Session = Depends(get_db)) -> Response:
+    return cached_list_response(request, db, "lanes", Lane, db.query(LaneModel).all)
 
 
 @router.post("/", response_model=Lane)
 def create_lane(l: LaneCreate, db: Session = Depends(get_db)) -> LaneModel:
     obj = LaneModel(**l.model_dump())
     db.add(obj)
+    bump_versions(db, ["lanes"])
     db.commit()
     db.refresh(obj)
     return obj
@@ -40,5 +42,6 @@ def delete_lane(lane_id: int, db: Session = Depends(get_db)) -> dict[str, bool]:
     if not obj:
         raise HTTPException(status_code=404, detail="Lane not found")
     db.delete(obj)
+    bump_versions(db, ["lanes"])
     db.commit()
     return {"ok": True}
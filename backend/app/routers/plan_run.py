@@ -1,112 +1,428 @@
 from __future__ import annotations
 
 import logging
-from datetime import date
-from typing import Any, cast
+from collections.abc import Callable, Sequence
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Any, Literal, TypeVar
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import Subquery, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.database import get_db
-from app.models import PlanRun, PlannedOrder, PlanningPolicy, ProjectedInventory
+from app.database import get_async_db, get_async_read_db, get_db, on_replica, use_primary
+from app.models import JobStatus, MasterDataVersion, PlanJob, PlanRun, PlannedOrder, PlanningPolicy, ProjectedInventory
 from app.schemas import (
+    PlanJob as PlanJobSchema,
+    PlanRunBatchRequest,
     PlanRun as PlanRunSchema,
     PlannedOrder as PlannedOrderSchema,
     ProjectedInventory as ProjectedInventorySchema,
     SkuWeekExplanation,
     SkuWeekExplanationPolicy,
     SkuWeekExplanationProjection,
+    StockoutRisk,
+    StockoutRiskKey,
+    StockoutRiskWindow,
 )
-from app.services.planning import run_plan
+from app.services.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    InvalidCursor,
+    decode_cursor,
+    keyset_filter,
+    paginate,
+)
+from app.services.master_data_cache import list_adapter
+from app.services.plan_jobs import cancel_plan_job, submit_plan_job
+from app.services.plan_result_cache import REVALIDATE, CachedResult, CacheKey, cached_response, plan_results
+from app.services.plan_retention import purge_expired_plan_runs, purge_plan_run
+from app.services.plan_storage import STORAGE_SERIES, ProjectedWeek, series_weeks, series_weeks_select
+from app.services.planning import run_plan, run_plan_batch
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+T = TypeVar("T")
+
+# Keyset order of per-week results: (week_start, sku, warehouse_code, id)
+_WEEK_KEY_TYPES = (date.fromisoformat, str, str, int)
+# Keyset order of projected inventory by key, and always of a series-stored run: (sku, warehouse_code, week_start)
+_KEY_ORDER_TYPES = (str, str, date.fromisoformat)
+# The run's first weeks the stockout risk summary counts
+_RISK_WINDOWS = (8, 13)
+
+
+def _decode(cursor: str, types: Sequence[Callable[[Any], Any]]) -> tuple[Any, ...]:
+    try:
+        return decode_cursor(cursor, types)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+async def _get_run(db: AsyncSession, plan_run_id: int) -> PlanRun | None:
+    """The run; read from the primary if the replica has not replayed its commit yet.
+
+    A run commits with all of its results, so once the replica has the run it has them too.
+    """
+    run = await db.get(PlanRun, plan_run_id)
+    if run is None and on_replica(db):
+        use_primary(db)
+        run = await db.get(PlanRun, plan_run_id)
+    return run
+
+
+async def _lookup(db: AsyncSession, plan_run_id: int, key: CacheKey) -> tuple[PlanRun | None, CachedResult | None]:
+    """The run and its cached response for key; a run purged by another process is evicted here too."""
+    run = await _get_run(db, plan_run_id)
+    if run is None:
+        plan_results.evict_run(plan_run_id)
+        return None, None
+    return run, await plan_results.lookup(key)
+
+
+def _page(response: Response, rows: list[T], limit: int, key: Callable[[T], Sequence[Any]]) -> list[T]:
+    """One page of a limit + 1 fetch, with the next cursor in a header."""
+    page, next_cursor = paginate(rows, limit, key)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return page
+
+
+async def _cached_page(
+    request: Request,
+    response: Response,
+    key: CacheKey,
+    schema: type[BaseModel],
+    run: PlanRun | None,
+    rows: Sequence[Any],
+) -> Response:
+    """A page of a run's results as JSON, kept in the plan result cache; nothing is cached for a missing run."""
+    adapter = list_adapter(schema)
+    body = adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    headers = {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]} if NEXT_CURSOR_HEADER in response.headers else {}
+    if run is None:
+        return Response(body, media_type="application/json", headers=headers)
+    return cached_response(request, await plan_results.store(key, body, "application/json", headers))
+
 
 @router.post("/run", response_model=PlanRunSchema)
 def run_planning(
     scenario_name: str = Query(..., description="Scenario name for this run"),
     run_at: str | None = Query(None, description="Date to use as run date (YYYY-MM-DD)"),
+    incremental: bool = Query(False, description="Recompute only SKU/warehouses changed since the scenario's last run"),
     db: Session = Depends(get_db),
 ) -> PlanRun:
     run_date = date.fromisoformat(run_at) if run_at else date.today()
-    plan_run = run_plan(db, scenario_name=scenario_name, run_at=run_date)
+    plan_run = run_plan(db, scenario_name=scenario_name, run_at=run_date, incremental=incremental)
     return plan_run
 
 
+@router.post("/run-batch", response_model=list[PlanRunSchema])
+def run_planning_batch(body: PlanRunBatchRequest, db: Session = Depends(get_db)) -> list[PlanRun]:
+    """Run several scenarios (policy overrides) from one input load; one PlanRun each."""
+    names = [o.scenario_name for o in body.scenarios]
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="Scenario names must be unique within a batch")
+    return run_plan_batch(db, body.scenarios, run_at=body.run_at)
+
+
+@router.post("/jobs", response_model=PlanJobSchema, status_code=202)
+def submit_planning_job(
+    scenario_name: str = Query(..., description="Scenario name for this run"),
+    run_at: str | None = Query(None, description="Date to use as run date (YYYY-MM-DD)"),
+    incremental: bool = Query(False, description="Recompute only SKU/warehouses changed since the scenario's last run"),
+    db: Session = Depends(get_db),
+) -> PlanJob:
+    """Queue a plan run in the background; poll /jobs/{job_id} for progress."""
+    run_date = date.fromisoformat(run_at) if run_at else date.today()
+    return submit_plan_job(db, scenario_name=scenario_name, run_at=run_date, incremental=incremental)
+
+
+@router.get("/jobs", response_model=list[PlanJobSchema])
+async def list_plan_jobs(
+    status: JobStatus | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+) -> list[PlanJob]:
+    q = select(PlanJob)
+    if status is not None:
+        q = q.where(PlanJob.status == status)
+    return list(await db.scalars(q.order_by(PlanJob.id.desc()).limit(limit)))
+
+
+@router.get("/jobs/{job_id}", response_model=PlanJobSchema)
+async def get_plan_job(job_id: int, db: AsyncSession = Depends(get_async_db)) -> PlanJob:
+    job = await db.get(PlanJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Plan job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=PlanJobSchema)
+def cancel_planning_job(job_id: int, db: Session = Depends(get_db)) -> PlanJob:
+    job = db.query(PlanJob).filter(PlanJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Plan job not found")
+    if job.status not in (JobStatus.QUEUED, JobStatus.RUNNING):
+        raise HTTPException(status_code=409, detail=f"Plan job already {job.status.value}")
+    return cancel_plan_job(db, job)
+
+
 @router.get("/runs", response_model=list[PlanRunSchema])
-def list_plan_runs(db: Session = Depends(get_db)) -> list[PlanRun]:
-    return db.query(PlanRun).order_by(PlanRun.created_at.desc()).all()
+async def list_plan_runs(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> list[PlanRun]:
+    order = (PlanRun.created_at, PlanRun.id)
+    q = select(PlanRun)
+    if cursor:
+        q = q.where(keyset_filter(order, _decode(cursor, (date.fromisoformat, int)), descending=True))
+    q = q.order_by(*(c.desc() for c in order)).limit(limit + 1)
+    return _page(response, list(await db.scalars(q)), limit, lambda r: (r.created_at, r.id))
+
+
+@router.post("/runs/purge")
+def purge_plan_runs(
+    older_than_days: int | None = Query(None, ge=1, description="Defaults to the configured retention window"),
+    db: Session = Depends(get_db),
+) -> dict[str, list[int]]:
+    """Purge runs older than the retention window, keeping each scenario's latest runs."""
+    return {"purged": purge_expired_plan_runs(db, retention_days=older_than_days)}
 
 
 @router.get("/runs/{plan_run_id}", response_model=PlanRunSchema)
-def get_plan_run(plan_run_id: int, db: Session = Depends(get_db)) -> PlanRun:
-    run = db.query(PlanRun).filter(PlanRun.id == plan_run_id).first()
+async def get_plan_run(plan_run_id: int, db: AsyncSession = Depends(get_async_read_db)) -> PlanRun:
+    run = await _get_run(db, plan_run_id)
     if not run:
         raise HTTPException(status_code=404, detail="Plan run not found")
     return run
 
 
+@router.delete("/runs/{plan_run_id}")
+def delete_plan_run(plan_run_id: int, db: Session = Depends(get_db)) -> dict[str, bool]:
+    run = db.query(PlanRun).filter(PlanRun.id == plan_run_id).first()
+    if not run:
+        raise HTTPException(status_code=404, detail="Plan run not found")
+    purge_plan_run(db, plan_run_id)
+    db.commit()
+    return {"ok": True}
+
+
 @router.get("/runs/{plan_run_id}/projected-inventory", response_model=list[ProjectedInventorySchema])
-def get_projected_inventory(
+async def get_projected_inventory(
     plan_run_id: int,
+    request: Request,
+    response: Response,
     sku: str | None = None,
     warehouse_code: str | None = None,
-    db: Session = Depends(get_db),
-) -> list[ProjectedInventory]:
-    q = db.query(ProjectedInventory).filter(ProjectedInventory.plan_run_id == plan_run_id)
+    order: Literal["week", "key"] = Query("week", description="week: by week_start first; key: by sku, warehouse_code"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size; exports return every row"),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Response:
+    """Pages in (week_start, sku, warehouse_code) order, or (sku, warehouse_code, week_start) with order=key.
+
+    A series-stored run always pages in (sku, warehouse_code, week_start) order, so a page reads only its own series.
+    """
+    key: CacheKey = (plan_run_id, "projected-inventory", sku, warehouse_code, order, limit, cursor)
+    run, hit = await _lookup(db, plan_run_id, key)
+    if hit:
+        return cached_response(request, hit)
+    rows: list[ProjectedInventory] | list[ProjectedWeek]
+    if run is not None and run.projection_storage == STORAGE_SERIES:
+        after = _decode(cursor, _KEY_ORDER_TYPES) if cursor else None
+        weeks = await series_weeks(db, plan_run_id, sku=sku, warehouse_code=warehouse_code, after=after, limit=limit + 1)
+        rows = _page(response, weeks, limit, lambda w: (w["sku"], w["warehouse_code"], w["week_start"]))
+        return await _cached_page(request, response, key, ProjectedInventorySchema, run, rows)
+    p = ProjectedInventory
+    if order == "key":
+        # (sku, warehouse_code, week_start) is unique within a run
+        columns: tuple[Any, ...] = (p.sku, p.warehouse_code, p.week_start)
+        row_key: Callable[[ProjectedInventory], Sequence[Any]] = lambda r: (r.sku, r.warehouse_code, r.week_start)
+        types: Sequence[Callable[[Any], Any]] = _KEY_ORDER_TYPES
+    else:
+        columns = (p.week_start, p.sku, p.warehouse_code, p.id)
+        row_key = lambda r: (r.week_start, r.sku, r.warehouse_code, r.id)
+        types = _WEEK_KEY_TYPES
+    q = select(p).where(p.plan_run_id == plan_run_id)
     if sku:
-        q = q.filter(ProjectedInventory.sku == sku)
+        q = q.where(p.sku == sku)
     if warehouse_code:
-        q = q.filter(ProjectedInventory.warehouse_code == warehouse_code)
-    return q.order_by(ProjectedInventory.week_start, ProjectedInventory.sku).all()
+        q = q.where(p.warehouse_code == warehouse_code)
+    if cursor:
+        q = q.where(keyset_filter(columns, _decode(cursor, types)))
+    q = q.order_by(*columns).limit(limit + 1)
+    rows = _page(response, list(await db.scalars(q)), limit, row_key)
+    return await _cached_page(request, response, key, ProjectedInventorySchema, run, rows)
+
+
+def _projected_weeks(run: PlanRun) -> Subquery:
+    """The run's projected weeks (week_start, sku, warehouse_code, weeks_of_cover, stockout) in either storage layout."""
+    if run.projection_storage == STORAGE_SERIES:
+        return series_weeks_select(run.id).order_by(None).subquery()
+    p = ProjectedInventory
+    return (
+        select(p.week_start, p.sku, p.warehouse_code, p.weeks_of_cover, p.stockout)
+        .where(p.plan_run_id == run.id)
+        .subquery()
+    )
+
+
+@router.get("/runs/{plan_run_id}/stockout-risk", response_model=StockoutRisk)
+async def get_stockout_risk(
+    plan_run_id: int,
+    request: Request,
+    top: int = Query(20, ge=1, le=100, description="Keys with the most stockout weeks to list"),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Response:
+    """Stockouts in the run's first 8 and 13 weeks and the keys with the most stockout weeks, aggregated in SQL.
+
+    Lets the dashboard summarize a run of any size without loading its rows.
+    """
+    key: CacheKey = (plan_run_id, "stockout-risk", top)
+    run, hit = await _lookup(db, plan_run_id, key)
+    if hit:
+        return cached_response(request, hit)
+    if not run:
+        raise HTTPException(status_code=404, detail="Plan run not found")
+    w = _projected_weeks(run)
+    first_week = await db.scalar(select(func.min(w.c.week_start)))
+    windows = [StockoutRiskWindow(weeks=n, stockouts=0, keys_at_risk=0) for n in _RISK_WINDOWS]
+    top_keys: list[StockoutRiskKey] = []
+    if first_week is not None:
+        # Every key is projected for the same consecutive weeks, so a run's first n weeks end n weeks after its first
+        window_stockouts = [
+            func.count().filter(w.c.stockout, w.c.week_start < first_week + timedelta(weeks=n)).label(f"s{n}")
+            for n in _RISK_WINDOWS
+        ]
+        per_key = (
+            select(
+                w.c.sku,
+                w.c.warehouse_code,
+                func.count().filter(w.c.stockout).label("stockout_weeks"),
+                func.min(w.c.weeks_of_cover).label("min_weeks_of_cover"),
+                *window_stockouts,
+            )
+            .group_by(w.c.sku, w.c.warehouse_code)
+            .subquery()
+        )
+        # Keys without stockouts add nothing to the windows' totals, so one pass over the at-risk keys gives both
+        totals = [
+            c
+            for n in _RISK_WINDOWS
+            for c in (
+                func.sum(per_key.c[f"s{n}"]).over().label(f"stockouts{n}"),
+                func.count().filter(per_key.c[f"s{n}"] > 0).over().label(f"keys{n}"),
+            )
+        ]
+        ranked = (
+            await db.execute(
+                select(per_key.c.sku, per_key.c.warehouse_code, per_key.c.stockout_weeks, per_key.c.min_weeks_of_cover, *totals)
+                .where(per_key.c.stockout_weeks > 0)
+                .order_by(per_key.c.stockout_weeks.desc(), per_key.c.sku, per_key.c.warehouse_code)
+                .limit(top)
+            )
+        ).all()
+        if ranked:
+            first = ranked[0]._mapping
+            windows = [
+                StockoutRiskWindow(weeks=n, stockouts=first[f"stockouts{n}"], keys_at_risk=first[f"keys{n}"])
+                for n in _RISK_WINDOWS
+            ]
+        top_keys = [
+            StockoutRiskKey(
+                sku=r.sku,
+                warehouse_code=r.warehouse_code,
+                stockout_weeks=r.stockout_weeks,
+                min_weeks_of_cover=r.min_weeks_of_cover,
+            )
+            for r in ranked
+        ]
+    risk = StockoutRisk(plan_run_id=plan_run_id, windows=windows, top=top_keys)
+    return cached_response(request, await plan_results.store(key, risk.model_dump_json().encode(), "application/json"))
 
 
 @router.get("/runs/{plan_run_id}/planned-orders", response_model=list[PlannedOrderSchema])
-def get_planned_orders(
+async def get_planned_orders(
     plan_run_id: int,
+    request: Request,
+    response: Response,
     sku: str | None = None,
     warehouse_code: str | None = None,
-    db: Session = Depends(get_db),
-) -> list[PlannedOrder]:
-    q = db.query(PlannedOrder).filter(PlannedOrder.plan_run_id == plan_run_id)
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size; exports return every row"),
+    cursor: str | None = Query(None, description="X-Next-Cursor of the previous page"),
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Response:
+    key: CacheKey = (plan_run_id, "planned-orders", sku, warehouse_code, limit, cursor)
+    run, hit = await _lookup(db, plan_run_id, key)
+    if hit:
+        return cached_response(request, hit)
+    o = PlannedOrder
+    order = (o.week_start, o.sku, o.warehouse_code, o.id)
+    q = select(o).where(o.plan_run_id == plan_run_id)
     if sku:
-        q = q.filter(PlannedOrder.sku == sku)
+        q = q.where(o.sku == sku)
     if warehouse_code:
-        q = q.filter(PlannedOrder.warehouse_code == warehouse_code)
-    return q.order_by(PlannedOrder.week_start, PlannedOrder.sku).all()
+        q = q.where(o.warehouse_code == warehouse_code)
+    if cursor:
+        q = q.where(keyset_filter(order, _decode(cursor, _WEEK_KEY_TYPES)))
+    q = q.order_by(*order).limit(limit + 1)
+    rows = _page(response, list(await db.scalars(q)), limit, lambda r: (r.week_start, r.sku, r.warehouse_code, r.id))
+    return await _cached_page(request, response, key, PlannedOrderSchema, run, rows)
 
 
 @router.get("/runs/{plan_run_id}/explanation", response_model=SkuWeekExplanation)
-def get_sku_week_explanation(
+async def get_sku_week_explanation(
     plan_run_id: int,
+    request: Request,
     sku: str = Query(..., description="SKU"),
     warehouse_code: str = Query(..., description="Warehouse code"),
     week_start: str = Query(..., description="Week start (YYYY-MM-DD)"),
-    db: Session = Depends(get_db),
-) -> SkuWeekExplanation:
-    """Explain-the-forecast: policy + projection for one SKU/week. Used by RightPanel drill-down."""
-    run = db.query(PlanRun).filter(PlanRun.id == plan_run_id).first()
+    db: AsyncSession = Depends(get_async_read_db),
+) -> Response:
+    """Explain-the-forecast: policy + projection for one SKU/week. Used by RightPanel drill-down.
+
+    The policy is the current one, so the cached response is keyed by the planning_policies version
+    and revalidated by clients.
+    """
+    policies_version = await db.scalar(
+        select(MasterDataVersion.version).where(MasterDataVersion.table_name == "planning_policies")
+    )
+    key: CacheKey = (plan_run_id, "explanation", sku, warehouse_code, week_start, policies_version or 0)
+    run, hit = await _lookup(db, plan_run_id, key)
+    if hit:
+        return cached_response(request, hit, REVALIDATE)
     if not run:
         raise HTTPException(status_code=404, detail="Plan run not found")
     week = date.fromisoformat(week_start)
-    proj = (
-        db.query(ProjectedInventory)
-        .filter(
-            ProjectedInventory.plan_run_id == plan_run_id,
-            ProjectedInventory.sku == sku,
-            ProjectedInventory.warehouse_code == warehouse_code,
-            ProjectedInventory.week_start == week,
+    proj: Any
+    if run.projection_storage == STORAGE_SERIES:
+        found = await series_weeks(db, plan_run_id, sku=sku, warehouse_code=warehouse_code, week_start=week)
+        proj = SimpleNamespace(**found[0]) if found else None
+    else:
+        proj = await db.scalar(
+            select(ProjectedInventory)
+            .where(
+                ProjectedInventory.plan_run_id == plan_run_id,
+                ProjectedInventory.sku == sku,
+                ProjectedInventory.warehouse_code == warehouse_code,
+                ProjectedInventory.week_start == week,
+            )
+            .limit(1)
         )
-        .first()
-    )
-    policy_row = (
-        db.query(PlanningPolicy)
-        .filter(
+    policy_row = await db.scalar(
+        select(PlanningPolicy)
+        .where(
             PlanningPolicy.sku == sku,
             PlanningPolicy.warehouse_code == warehouse_code,
         )
-        .first()
+        .limit(1)
     )
     policy: SkuWeekExplanationPolicy | None = None
     if policy_row:
@@ -136,7 +452,7 @@ def get_sku_week_explanation(
             weeks_of_cover=_r.weeks_of_cover,
             stockout=bool(_r.stockout),
         )
-    return SkuWeekExplanation(
+    explanation = SkuWeekExplanation(
         sku=sku,
         warehouse_code=warehouse_code,
         plan_run_id=plan_run_id,
@@ -144,3 +460,5 @@ def get_sku_week_explanation(
         projection=projection,
         forecast_method="trailing_mean",
     )
+    result = await plan_results.store(key, explanation.model_dump_json().encode(), "application/json")
+    return cached_response(request, result, REVALIDATE)
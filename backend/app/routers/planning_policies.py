@@ -1,12 +1,14 @@
 from __future__ import annotations
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models import PlanningPolicy as PlanningPolicyModel
 from app.schemas import PlanningPolicy, PlanningPolicyCreate
+from app.services.master_data_cache import bump_versions, cached_list_response
+from app.services.plan_changes import mark_dirty
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -14,16 +16,19 @@ router = APIRouter()
 
 @router.get("/", response_model=list[PlanningPolicy])
 def list_planning_policies(
+    request: Request,
     sku: str | None = Query(None),
     warehouse_code: str | None = Query(None),
     db: Session = Depends(get_db),
-) -> list[PlanningPolicyModel]:
+) -> Response:
     q = db.query(PlanningPolicyModel)
     if sku:
         q = q.filter(PlanningPolicyModel.sku == sku)
     if warehouse_code:
         q = q.filter(PlanningPolicyModel.warehouse_code == warehouse_code)
-    return q.all()
+    return cached_list_response(
+        request, db, "planning_policies", PlanningPolicy, q.all, sku=sku or None, warehouse_code=warehouse_code or None
+    )
 
 
 @router.post("/", response_model=PlanningPolicy)
@@ -40,6 +45,8 @@ def create_planning_policy(p: PlanningPolicyCreate, db: Session = Depends(get_db
         raise HTTPException(status_code=400, detail="Policy for this SKU/warehouse already exists")
     obj = PlanningPolicyModel(**p.model_dump())
     db.add(obj)
+    mark_dirty(db, [(p.sku, p.warehouse_code)])
+    bump_versions(db, ["planning_policies"])
     db.commit()
     db.refresh(obj)
     return obj
@@ -58,8 +65,10 @@ def update_planning_policy(policy_id: int, p: PlanningPolicyCreate, db: Session
     obj = db.query(PlanningPolicyModel).filter(PlanningPolicyModel.id == policy_id).first()
     if not obj:
         raise HTTPException(status_code=404, detail="Planning policy not found")
+    mark_dirty(db, [(obj.sku, obj.warehouse_code), (p.sku, p.warehouse_code)])
     for k, v in p.model_dump().items():
         setattr(obj, k, v)
+    bump_versions(db, ["planning_policies"])
     db.commit()
     db.refresh(obj)
     return obj
@@ -70,6 +79,8 @@ def delete_planning_policy(policy_id: int, db: Session = Depends(get_db)) -> dic
     obj = db.query(PlanningPolicyModel).filter(PlanningPolicyModel.id == policy_id).first()
     if not obj:
         raise HTTPException(status_code=404, detail="Planning policy not found")
+    mark_dirty(db, [(obj.sku, obj.warehouse_code)])
     db.delete(obj)
+    bump_versions(db, ["planning_policies"])
     db.commit()
     return {"ok": True}
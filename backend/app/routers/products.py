@@ -1,20 +1,21 @@
 from __future__ import annotations
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models import Product as ProductModel
 from app.schemas import Product, ProductCreate
+from app.services.master_data_cache import bump_versions, cached_list_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("/", response_model=list[Product])
-def list_products(db: Session = Depends(get_db)) -> list[ProductModel]:
-    return db.query(ProductModel).all()
+def list_products(request: Request, db: Session = Depends(get_db)) -> Response:
+    return cached_list_response(request, db, "products", Product, db.query(ProductModel).all)
 
 
 @router.post("/", response_model=Product)
@@ -24,6 +25,7 @@ def create_product(p: ProductCreate, db: Session = Depends(get_db)) -> ProductMo
         raise HTTPException(status_code=400, detail="SKU already exists")
     obj = ProductModel(**p.model_dump())
     db.add(obj)
+    bump_versions(db, ["products"])
     db.commit()
     db.refresh(obj)
     return obj
@@ -43,5 +45,6 @@ def delete_product(product_id: int, db: Session = Depends(get_db)) -> dict[str,
     if not obj:
         raise HTTPException(status_code=404, detail="Product not found")
     db.delete(obj)
+    bump_versions(db, ["products"])
     db.commit()
     return {"ok": True}
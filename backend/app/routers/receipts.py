@@ -3,9 +3,10 @@ import logging
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import get_async_read_db
 from app.models import Receipt as ReceiptModel
 from app.schemas import Receipt
 
@@ -14,17 +15,17 @@ router = APIRouter()
 
 
 @router.get("/", response_model=list[Receipt])
-def list_receipts(
+async def list_receipts(
     week_start: str | None = Query(None),
     sku: str | None = Query(None),
     warehouse_code: str | None = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
 ) -> list[ReceiptModel]:
-    q = db.query(ReceiptModel)
+    q = select(ReceiptModel)
     if week_start:
-        q = q.filter(ReceiptModel.week_start == datetime.fromisoformat(week_start).date())
+        q = q.where(ReceiptModel.week_start == datetime.fromisoformat(week_start).date())
     if sku:
-        q = q.filter(ReceiptModel.sku == sku)
+        q = q.where(ReceiptModel.sku == sku)
     if warehouse_code:
-        q = q.filter(ReceiptModel.warehouse_code == warehouse_code)
-    return q.order_by(ReceiptModel.week_start, ReceiptModel.sku).all()
+        q = q.where(ReceiptModel.warehouse_code == warehouse_code)
+    return list(await db.scalars(q.order_by(ReceiptModel.week_start, ReceiptModel.sku)))
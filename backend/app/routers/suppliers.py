@@ -1,20 +1,21 @@
 from __future__ import annotations
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models import Supplier as SupplierModel
 from app.schemas import Supplier, SupplierCreate
+from app.services.master_data_cache import bump_versions, cached_list_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("/", response_model=list[Supplier])
-def list_suppliers(db: Session = Depends(get_db)) -> list[SupplierModel]:
-    return db.query(SupplierModel).all()
+def list_suppliers(request: Request, db: Session = Depends(get_db)) -> Response:
+    return cached_list_response(request, db, "suppliers", Supplier, db.query(SupplierModel).all)
 
 
 @router.post("/", response_model=Supplier)
@@ -24,6 +25,7 @@ def create_supplier(s: SupplierCreate, db: Session = Depends(get_db)) -> Supplie
         raise HTTPException(status_code=400, detail="Supplier code already exists")
     obj = SupplierModel(**s.model_dump())
     db.add(obj)
+    bump_versions(db, ["suppliers"])
     db.commit()
     db.refresh(obj)
     return obj
@@ -43,5 +45,6 @@ def delete_supplier(supplier_id: int, db: Session = Depends(get_db)) -> dict[str
     if not obj:
         raise HTTPException(status_code=404, detail="Supplier not found")
     db.delete(obj)
+    bump_versions(db, ["suppliers"])
     db.commit()
     return {"ok": True}
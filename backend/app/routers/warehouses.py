@@ -1,20 +1,21 @@
 from __future__ import annotations
 import logging
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.database import get_db
 from app.models import Warehouse as WarehouseModel
 from app.schemas import Warehouse, WarehouseCreate
+from app.services.master_data_cache import bump_versions, cached_list_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
 @router.get("/", response_model=list[Warehouse])
-def list_warehouses(db: Session = Depends(get_db)) -> list[WarehouseModel]:
-    return db.query(WarehouseModel).all()
+def list_warehouses(request: Request, db: Session = Depends(get_db)) -> Response:
+    return cached_list_response(request, db, "warehouses", Warehouse, db.query(WarehouseModel).all)
 
 
 @router.post("/", response_model=Warehouse)
@@ -24,6 +25,7 @@ def create_warehouse(w: WarehouseCreate, db: Session = Depends(get_db)) -> Wareh
         raise HTTPException(status_code=400, detail="Warehouse code already exists")
     obj = WarehouseModel(**w.model_dump())
     db.add(obj)
+    bump_versions(db, ["warehouses"])
     db.commit()
     db.refresh(obj)
     return obj
@@ -43,5 +45,6 @@ def delete_warehouse(warehouse_id: int, db: Session = Depends(get_db)) -> dict[s
     if not obj:
         raise HTTPException(status_code=404, detail="Warehouse not found")
     db.delete(obj)
+    bump_versions(db, ["warehouses"])
     db.commit()
     return {"ok": True}
@@ -1,12 +1,12 @@
 from __future__ import annotations
 import logging
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
 from typing import Any, Optional
 
 from pydantic import BaseModel, Field
 
-from app.models import DemandType, PlanningMode, SafetyStockMethod
+from app.models import DemandType, JobStatus, PlanningMode, SafetyStockMethod
 
 logger = logging.getLogger(__name__)
 
@@ -157,6 +157,41 @@ class PlanRunBase(BaseModel):
 
 class PlanRun(PlanRunBase):
     id: int
+    base_plan_run_id: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ScenarioOverrides(BaseModel):
+    """One scenario of a batch run; unset fields keep each policy's own value."""
+    scenario_name: str
+    target_weeks: Optional[Decimal] = Field(None, ge=0)
+    safety_stock_weeks: Optional[Decimal] = Field(None, ge=0)
+    forecast_window_weeks: Optional[int] = Field(None, gt=0)
+    demand_uplift: Optional[Decimal] = Field(None, gt=0, description="Multiplier on forecast demand, e.g. 1.15")
+
+
+class PlanRunBatchRequest(BaseModel):
+    run_at: Optional[date] = None
+    scenarios: list[ScenarioOverrides] = Field(..., min_length=1)
+
+
+class PlanJob(BaseModel):
+    id: int
+    scenario_name: str
+    run_at: date
+    status: JobStatus
+    stage: Optional[str] = None
+    stage_progress: Decimal
+    progress: Decimal
+    cancel_requested: bool
+    incremental: bool
+    error: Optional[str] = None
+    plan_run_id: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -234,6 +269,27 @@ class SkuWeekExplanation(BaseModel):
     forecast_method: str = "trailing_mean"
 
 
+class StockoutRiskWindow(BaseModel):
+    """Stockouts in a run's first weeks."""
+    weeks: int
+    stockouts: int  # stockout weeks summed over keys
+    keys_at_risk: int  # sku/warehouse keys with at least one stockout
+
+
+class StockoutRiskKey(BaseModel):
+    sku: str
+    warehouse_code: str
+    stockout_weeks: int
+    min_weeks_of_cover: Optional[Decimal] = None
+
+
+class StockoutRisk(BaseModel):
+    """Stockout risk of a plan run, for the dashboard."""
+    plan_run_id: int
+    windows: list[StockoutRiskWindow]
+    top: list[StockoutRiskKey]  # keys with the most stockout weeks
+
+
 # Import validation
 class ImportRowError(BaseModel):
     row: int
@@ -246,3 +302,75 @@ class ImportDryRunResult(BaseModel):
     valid_rows: int
     errors: list[ImportRowError] = Field(default_factory=list)
     preview: Optional[list[dict[str, Any]]] = None
+    # Set after a confirmed (dry_run=false) import. Counted per batch upsert: a key repeated within a
+    # batch counts once, but a key in two batches counts as inserted by the first and updated by the
+    # second, so inserted_rows + updated_rows can exceed the number of distinct rows written.
+    inserted_rows: Optional[int] = Field(
+        None, description="Rows the import's batch upserts inserted, summed over batches"
+    )
+    updated_rows: Optional[int] = Field(
+        None,
+        description="Rows the import's batch upserts updated, summed over batches; includes rows an earlier batch of the same file inserted",
+    )
+    error_count: Optional[int] = None  # all row errors; errors holds at most import_error_limit
+    error_report_id: Optional[str] = None  # full error CSV at /api/import/error-reports/{id} when truncated
+
+
+class ImportBundleResult(BaseModel):
+    valid: bool  # every file valid; otherwise nothing was loaded
+    applied: bool  # all files loaded and committed in one transaction
+    files: dict[str, ImportDryRunResult]  # by dataset, in load order
+
+
+class ImportJob(BaseModel):
+    id: int
+    kind: str
+    filename: Optional[str] = None
+    status: JobStatus
+    file_size: int
+    rows_done: int
+    valid_rows: int
+    error_count: int
+    inserted_rows: int  # per batch upsert so far, as ImportDryRunResult.inserted_rows
+    updated_rows: int
+    progress: Decimal
+    error_report_id: Optional[str] = None  # every row error so far, at /api/import/error-reports/{id}
+    cancel_requested: bool
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Database health
+class DbPoolStats(BaseModel):
+    size: int
+    max_overflow: int
+    timeout_s: float
+    checked_out: int  # connections in use now
+    idle: int
+    overflow: int  # connections open beyond size now
+    peak_checked_out: int
+    peak_overflow: int
+    checkouts: int
+    connects: int  # new connections opened
+    invalidations: int
+    timeouts: int  # checkouts that gave up after timeout_s
+    waits: int
+    wait_ms_mean: float
+    wait_ms_p50: float  # p50/p99 over the most recent waits
+    wait_ms_p99: float
+    wait_ms_max: float
+
+
+class DbHealth(BaseModel):
+    sync_pool: DbPoolStats  # request handlers: imports, plan runs, master data
+    async_pool: DbPoolStats  # read-only list endpoints
+    background_pool: DbPoolStats  # plan and import jobs, import workers, run purges; no statement timeout
+    replica_sync_pool: Optional[DbPoolStats] = None  # exports, when a read replica is configured
+    replica_async_pool: Optional[DbPoolStats] = None
+    replica_lag_s: Optional[float] = None  # at the last check; None if unknown or unreachable
+    replica_in_use: Optional[bool] = None  # reads currently routed to the replica
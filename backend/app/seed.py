@@ -23,6 +23,8 @@ from app.models import (
     Supplier,
     Warehouse,
 )
+from app.services.master_data_cache import MASTER_TABLES, bump_versions
+from app.services.plan_changes import mark_dirty
 
 logger = logging.getLogger(__name__)
 
@@ -58,10 +60,14 @@ def seed() -> None:
                 db.add(Lane(supplier_id=s.id, warehouse_id=wh1.id, code="SUP1-WH1"))
         db.flush()
 
+        # (sku, warehouse) keys given new plan inputs below, for incremental runs
+        dirty: set[tuple[str, str]] = set()
+
         # Planning policies
         for sku in ["SKU001", "SKU002", "SKU003"]:
             for wcode in ["WH1", "WH2"]:
                 if not db.query(PlanningPolicy).filter(PlanningPolicy.sku == sku, PlanningPolicy.warehouse_code == wcode).first():
+                    dirty.add((sku, wcode))
                     db.add(
                         PlanningPolicy(
                             sku=sku,
@@ -85,6 +91,7 @@ def seed() -> None:
                     InventorySnapshotWeekly.sku == sku,
                     InventorySnapshotWeekly.warehouse_code == wcode,
                 ).first():
+                    dirty.add((sku, wcode))
                     db.add(
                         InventorySnapshotWeekly(
                             week_start=base,
@@ -99,6 +106,7 @@ def seed() -> None:
             w = base + timedelta(days=7 * i)
             for sku in ["SKU001", "SKU002"]:
                 if not db.query(Receipt).filter(Receipt.week_start == w, Receipt.sku == sku, Receipt.warehouse_code == "WH1").first():
+                    dirty.add((sku, "WH1"))
                     db.add(
                         Receipt(
                             week_start=w,
@@ -120,6 +128,7 @@ def seed() -> None:
                         DemandActual.warehouse_code == wcode,
                         DemandActual.demand_type == DemandType.CUSTOMER,
                     ).first():
+                        dirty.add((sku, wcode))
                         db.add(
                             DemandActual(
                                 week_start=w,
@@ -135,6 +144,7 @@ def seed() -> None:
                         DemandActual.warehouse_code == wcode,
                         DemandActual.demand_type == DemandType.SAMPLES,
                     ).first():
+                        dirty.add((sku, wcode))
                         db.add(
                             DemandActual(
                                 week_start=w,
@@ -145,6 +155,8 @@ def seed() -> None:
                             )
                         )
 
+        bump_versions(db, MASTER_TABLES)
+        mark_dirty(db, dirty)
         db.commit()
         print("Seed completed.")
     finally:
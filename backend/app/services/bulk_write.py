@@ -0,0 +1,280 @@
+"""
+Bulk inserts and upserts that bypass the ORM unit of work.
+
+On Postgres + psycopg2 rows are streamed through COPY ... FROM STDIN on the
+session's own connection, so they commit or roll back with the session.
+Other drivers fall back to batched executemany inserts.
+
+bulk_upsert COPYs rows into a temporary staging table and merges them with a
+single INSERT ... SELECT ... ON CONFLICT DO UPDATE; without COPY it sends
+batched multi-row INSERT ... ON CONFLICT statements instead.
+"""
+from __future__ import annotations
+
+import enum
+import logging
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Any, TypedDict
+
+from sqlalchemy import ColumnElement, Table, TableClause, column, func, insert, literal_column, select, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 5000
+UPSERT_BATCH_SIZE = 1000
+COPY_CHUNK_SIZE = 1 << 16
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+class BulkWriteStats(TypedDict):
+    table: str
+    method: str
+    rows: int
+    seconds: float
+    rows_per_sec: float
+
+
+class UpsertStats(TypedDict):
+    table: str
+    method: str
+    rows: int
+    inserted: int
+    updated: int
+    seconds: float
+
+
+def _copy_text(v: str) -> str:
+    return v.translate(_COPY_ESCAPES)
+
+
+def _copy_other(v: object) -> str:
+    if isinstance(v, enum.Enum):
+        v = v.value
+    if isinstance(v, str):
+        return _copy_text(v)
+    return str(v)
+
+
+def _array_element(v: object) -> str:
+    if v is None:
+        return "NULL"
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, str):
+        return '"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return str(v)
+
+
+_PLAIN_ARRAY_TYPES = frozenset((Decimal, int))
+
+
+def _copy_array(v: list[Any]) -> str:
+    """Postgres array literal ({a,b,...}) for a one-dimensional list."""
+    if v and type(v[0]) in _PLAIN_ARRAY_TYPES and all(type(x) is type(v[0]) for x in v):
+        # Numbers need neither quoting nor COPY escaping.
+        return "{" + ",".join(map(str, v)) + "}"
+    return _copy_text("{" + ",".join([_array_element(x) for x in v]) + "}")
+
+
+# Exact-type dispatch keeps the per-value cost low on the hot path.
+_COPY_FORMATTERS: dict[type, Callable[[Any], str]] = {
+    type(None): lambda v: "\\N",
+    bool: lambda v: "t" if v else "f",
+    str: _copy_text,
+    int: str,
+    Decimal: str,
+    date: str,
+    list: _copy_array,
+}
+
+
+def _copy_line(row: Sequence[Any]) -> str:
+    get = _COPY_FORMATTERS.get
+    return "\t".join([get(type(v), _copy_other)(v) for v in row]) + "\n"
+
+
+class _CopyStream:
+    """Read-only file object over COPY text rows, consumed in chunks by copy_expert."""
+
+    def __init__(self, rows: Iterable[Sequence[Any]]) -> None:
+        self._rows: Iterator[Sequence[Any]] = iter(rows)
+        self._pending = ""
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        parts: list[str] = [self._pending]
+        length = len(self._pending)
+        for row in self._rows:
+            line = _copy_line(row)
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+            if 0 <= size <= length:
+                break
+        data = "".join(parts)
+        if 0 <= size < len(data):
+            data, self._pending = data[:size], data[size:]
+        else:
+            self._pending = ""
+        return data
+
+    def readline(self, size: int = -1) -> str:
+        return self.read(size)
+
+
+def _supports_copy(db: Session) -> bool:
+    bind = db.get_bind()
+    return bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2"
+
+
+def copy_rows(db: Session, table: TableClause, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """COPY rows (tuples in `columns` order) into table inside the session's transaction."""
+    stream = _CopyStream(rows)
+    dbapi_conn: Any = db.connection().connection.dbapi_connection
+    with dbapi_conn.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", stream, size=COPY_CHUNK_SIZE
+        )
+    return stream.count
+
+
+def insert_rows(
+    db: Session,
+    table: TableClause,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    batch_size: int = INSERT_BATCH_SIZE,
+) -> int:
+    """executemany fallback: insert rows in batches of batch_size."""
+    it = iter(rows)
+    count = 0
+    while batch := [dict(zip(columns, row)) for row in islice(it, batch_size)]:
+        db.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+def bulk_insert(
+    db: Session, table: TableClause, columns: Sequence[str], rows: Iterable[Sequence[Any]]
+) -> BulkWriteStats:
+    """Insert rows via COPY when available, else executemany; logs rows/sec."""
+    started = time.perf_counter()
+    if _supports_copy(db):
+        method = "copy"
+        count = copy_rows(db, table, columns, rows)
+    else:
+        method = "executemany"
+        count = insert_rows(db, table, columns, rows)
+    seconds = time.perf_counter() - started
+    rate = count / seconds if seconds > 0 else 0.0
+    logger.info("Bulk %s into %s: %d rows in %.2fs (%.0f rows/sec)", method, table.name, count, seconds, rate)
+    return BulkWriteStats(table=table.name, method=method, rows=count, seconds=seconds, rows_per_sec=rate)
+
+
+def _upsert_counts(db: Session, stmt: Any) -> tuple[int, int]:
+    """Run an INSERT ... ON CONFLICT DO UPDATE; (inserted, updated) from xmax = 0 on the returned rows."""
+    up = stmt.returning(literal_column("(xmax = 0)").label("inserted")).cte("up")
+    q = select(
+        func.count().filter(up.c.inserted),
+        func.count().filter(up.c.inserted.is_(False)),
+    )
+    inserted, updated = db.execute(q).one()
+    return int(inserted), int(updated)
+
+
+def _upsert_statement(stmt: Any, conflict: Sequence[str | ColumnElement[Any]], update: Sequence[str]) -> Any:
+    return stmt.on_conflict_do_update(
+        index_elements=list(conflict), set_={c: stmt.excluded[c] for c in update}
+    )
+
+
+def _copy_upsert(
+    db: Session,
+    target: Table,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    key: Sequence[str],
+    conflict: Sequence[str | ColumnElement[Any]],
+    update: Sequence[str],
+) -> tuple[int, int, int]:
+    name = f"_upsert_{target.name}"
+    cols = ", ".join(columns)
+    db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    db.execute(
+        text(f"CREATE TEMP TABLE {name} ON COMMIT DROP AS SELECT {cols} FROM {target.name} WITH NO DATA")
+    )
+    # File order, so the last row of a duplicated key wins as it would row by row.
+    db.execute(text(f"ALTER TABLE {name} ADD COLUMN _ord bigserial"))
+    count = copy_rows(db, table(name), columns, rows)
+    stage = table(name, *(column(c) for c in columns), column("_ord"))
+    latest = (
+        select(*(stage.c[c] for c in columns))
+        .distinct(*(stage.c[k] for k in key))
+        .order_by(*(stage.c[k] for k in key), stage.c._ord.desc())
+    )
+    stmt = _upsert_statement(pg_insert(target).from_select(list(columns), latest), conflict, update)
+    inserted, updated = _upsert_counts(db, stmt)
+    return count, inserted, updated
+
+
+def _batched_upsert(
+    db: Session,
+    target: Table,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    key: Sequence[str],
+    conflict: Sequence[str | ColumnElement[Any]],
+    update: Sequence[str],
+    batch_size: int = UPSERT_BATCH_SIZE,
+) -> tuple[int, int, int]:
+    key_idx = [columns.index(k) for k in key]
+    it = iter(rows)
+    count = inserted = updated = 0
+    while batch := list(islice(it, batch_size)):
+        count += len(batch)
+        # ON CONFLICT cannot touch a row twice in one statement; keep each key's last row.
+        latest = {tuple(r[i] for i in key_idx): r for r in batch}
+        stmt = pg_insert(target).values([dict(zip(columns, r)) for r in latest.values()])
+        i, u = _upsert_counts(db, _upsert_statement(stmt, conflict, update))
+        inserted += i
+        updated += u
+    return count, inserted, updated
+
+
+def bulk_upsert(
+    db: Session,
+    target: Table,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    key: Sequence[str],
+    update: Sequence[str],
+    conflict: Sequence[str | ColumnElement[Any]] | None = None,
+) -> UpsertStats:
+    """Insert rows, updating the `update` columns of rows that already exist.
+
+    key: columns identifying a row; duplicates within rows resolve to the last one.
+    conflict: ON CONFLICT target (unique index columns/expressions); defaults to key.
+    Must be backed by a unique index or constraint. Counts come back in the stats.
+    """
+    started = time.perf_counter()
+    conflict = list(conflict) if conflict is not None else list(key)
+    if _supports_copy(db):
+        method = "copy"
+        count, inserted, updated = _copy_upsert(db, target, columns, rows, key, conflict, update)
+    else:
+        method = "insert"
+        count, inserted, updated = _batched_upsert(db, target, columns, rows, key, conflict, update)
+    seconds = time.perf_counter() - started
+    logger.info(
+        "Bulk upsert (%s) into %s: %d rows, %d inserted, %d updated in %.2fs",
+        method, target.name, count, inserted, updated, seconds,
+    )
+    return UpsertStats(
+        table=target.name, method=method, rows=count, inserted=inserted, updated=updated, seconds=seconds
+    )
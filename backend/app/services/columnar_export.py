@@ -0,0 +1,120 @@
+"""
+Parquet and Arrow IPC encoding for exports.
+
+Rows arrive in batches from a server-side cursor and are written as one
+record batch (Parquet row group) each, so memory is bounded by the batch size.
+The Arrow schema is derived from the SQLAlchemy column types of the query:
+Numeric(p, s) -> decimal128(p, s), Date -> date32, Boolean -> bool,
+String -> string. pyarrow is optional and only imported for these formats.
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, Any, Literal
+
+from sqlalchemy import Boolean, Date, Integer, Numeric, Select, String
+from sqlalchemy.types import TypeEngine
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+ColumnarFormat = Literal["parquet", "arrow"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+COMPRESSION = "zstd"
+
+
+def columnar_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_type(t: TypeEngine[Any]) -> pa.DataType:
+    import pyarrow as pa
+
+    if isinstance(t, Numeric) and t.precision is not None:
+        return pa.decimal128(t.precision, t.scale or 0)
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, Date):
+        return pa.date32()
+    if isinstance(t, Integer):
+        return pa.int64()
+    if isinstance(t, String):
+        return pa.string()
+    raise TypeError(f"No Arrow type for column type {t!r}")
+
+
+def arrow_schema(stmt: Select[Any]) -> pa.Schema:
+    import pyarrow as pa
+
+    return pa.schema([(c.key, _arrow_type(c.type)) for c in stmt.selected_columns])
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data: Any) -> int:
+        b = bytes(data)
+        self.chunks.append(b)
+        self.pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+
+def stream_columnar(
+    fmt: ColumnarFormat, schema: pa.Schema, batches: Iterable[Sequence[Sequence[Any]]]
+) -> Iterator[bytes]:
+    """Encode row batches as a Parquet or Arrow IPC file, yielding bytes after each batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    if fmt == "parquet":
+        writer: Any = pq.ParquetWriter(sink, schema, compression=COMPRESSION)
+    else:
+        writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression=COMPRESSION))
+    rows = 0
+    try:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_batch(
+                pa.record_batch(
+                    [pa.array(col, type=f.type) for col, f in zip(columns, schema)], schema=schema
+                )
+            )
+            rows += len(batch)
+            if data := sink.drain():
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+    logger.debug("Encoded %d rows as %s", rows, fmt)
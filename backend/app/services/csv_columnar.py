@@ -0,0 +1,237 @@
+"""
+Columnar CSV validation with pandas.
+
+The upload is parsed by pandas' C reader in frames of import_columnar_batch_rows
+rows, every column as text. Each column of a frame is dictionary-encoded
+(pd.factorize) and only its distinct values go through the scalar checks of
+csv_import (parse_date, parse_decimal, the strip/required rules), so a frame of
+50,000 demand rows costs a few thousand scalar parses instead of 250,000. Row
+validity, per-row errors and parsed values are then gathered through the codes
+with numpy. Errors are listed in the row validators' order, so results (row
+numbers, messages, parsed tuples, preview) match validate_* exactly.
+
+Uploads the C reader would split into rows differently than csv.DictReader
+(whitespace-only lines, lone CR line breaks, NUL bytes, duplicate header names)
+are detected up front by columnar_header, and validated row by row instead.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import re
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from typing import IO, Any
+
+import numpy as np
+import pandas as pd
+
+from app.models import DemandType
+from app.schemas import ImportDryRunResult, ImportRowError
+from app.services.csv_import import (
+    DEMAND_COLUMNS,
+    INVENTORY_COLUMNS,
+    PRODUCT_COLUMNS,
+    RECEIPT_COLUMNS,
+    ValidatedRows,
+    parse_date,
+    parse_decimal,
+    validate_demand_actuals,
+    validate_inventory_snapshots,
+    validate_products,
+    validate_receipts,
+    validate_samples_withdrawals,
+)
+
+logger = logging.getLogger(__name__)
+
+_SCAN_BYTES = 1 << 20
+_PREVIEW_ROWS = 5
+
+# Lines csv.DictReader and the pandas C reader disagree on: DictReader keeps a
+# whitespace-only line as a row and fails on a lone CR or NUL; pandas skips or splits them.
+_BLANK_LINE = re.compile(rb"\n[ \t\f\v]+\r?\n")
+_LONE_CR = re.compile(rb"\r(?=[^\n])")
+_BLANK_FIRST_LINE = re.compile(rb"(?:\xef\xbb\xbf)?[ \t\f\v]*\r?\n?")
+_BLANK_TAIL = re.compile(rb"\n[ \t\f\v]*\r?")
+
+# A check maps one raw cell to (error or None, parsed value), with the row validators' semantics
+Check = Callable[[str], tuple[str | None, Any]]
+
+
+def _week(s: str) -> tuple[str | None, Any]:
+    ok, v = parse_date(s)
+    return (None, v) if ok else (str(v), None)
+
+
+def _qty(s: str) -> tuple[str | None, Any]:
+    ok, v = parse_decimal(s)
+    return (None, v) if ok else (str(v), None)
+
+
+def _required(name: str) -> Check:
+    def check(s: str) -> tuple[str | None, Any]:
+        s = s.strip()
+        return (None, s) if s else (f"{name} required", None)
+
+    return check
+
+
+def _optional(s: str) -> tuple[str | None, Any]:
+    return None, s.strip() or None
+
+
+def _demand_type(s: str) -> tuple[str | None, Any]:
+    dt = s.strip().upper()
+    if dt in DemandType.__members__:
+        return None, DemandType[dt]
+    return "demand_type must be CUSTOMER, SAMPLES, or ADJUSTMENT", None
+
+
+@dataclass(frozen=True)
+class ColumnarSchema:
+    columns: tuple[str, ...]  # parsed tuple order (the dataset's *_COLUMNS)
+    checks: tuple[tuple[str, Check], ...]  # in the order the row validator reports errors
+    validate_rows: Callable[[list[dict[str, Any]], int], ValidatedRows]  # builds the preview
+    constants: dict[str, Any] = field(default_factory=dict)  # parsed columns not read from the file
+    min_columns: int = 0  # fewer header names: the row validator flags every row
+
+
+_SKU = ("sku", _required("sku"))
+_WAREHOUSE = ("warehouse_code", _required("warehouse_code"))
+
+INVENTORY_SCHEMA = ColumnarSchema(
+    INVENTORY_COLUMNS,
+    (("week_start", _week), ("on_hand_qty", _qty), _SKU, _WAREHOUSE),
+    validate_inventory_snapshots,
+    min_columns=4,
+)
+RECEIPT_SCHEMA = ColumnarSchema(
+    RECEIPT_COLUMNS,
+    (("week_start", _week), ("qty", _qty), _SKU, _WAREHOUSE, ("source_type", _optional)),
+    validate_receipts,
+)
+DEMAND_SCHEMA = ColumnarSchema(
+    DEMAND_COLUMNS,
+    (("week_start", _week), ("qty", _qty), _SKU, _WAREHOUSE, ("demand_type", _demand_type)),
+    validate_demand_actuals,
+)
+SAMPLES_SCHEMA = ColumnarSchema(
+    DEMAND_COLUMNS,
+    (("week_start", _week), ("qty", _qty), _SKU, _WAREHOUSE),
+    validate_samples_withdrawals,
+    constants={"demand_type": DemandType.SAMPLES},
+)
+PRODUCT_SCHEMA = ColumnarSchema(
+    PRODUCT_COLUMNS,
+    (_SKU, ("name", _optional), ("description", _optional)),
+    validate_products,
+)
+
+
+def _regular(file: IO[bytes]) -> bool:
+    """Whether pandas will split the upload into the same rows as csv.DictReader."""
+    tail = b""
+    first_line = True
+    for chunk in iter(lambda: file.read(_SCAN_BYTES), b""):
+        buf = tail + chunk
+        if _BLANK_LINE.search(buf) or _LONE_CR.search(buf) or b"\x00" in buf:
+            return False
+        nl = buf.find(b"\n")
+        if first_line:
+            if nl < 0:
+                tail = buf
+                continue
+            if _BLANK_FIRST_LINE.fullmatch(buf, 0, nl + 1):
+                return False
+            first_line = False
+        # Carry an unfinished, possibly blank line (or a trailing CR) into the next chunk
+        tail = buf[buf.rfind(b"\n"):] if nl >= 0 else buf
+        if not _BLANK_TAIL.fullmatch(tail):
+            tail = buf[-1:]
+    if first_line:
+        return not _BLANK_FIRST_LINE.fullmatch(tail)
+    return not (_BLANK_TAIL.fullmatch(tail) and tail.strip(b"\r\n"))
+
+
+def columnar_header(schema: ColumnarSchema, file: IO[bytes]) -> list[str] | None:
+    """The upload's header if it can be validated columnar, else None. Rewinds file."""
+    try:
+        if not _regular(file):
+            return None
+        file.seek(0)
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        try:
+            header = next(csv.reader(text), [])
+        finally:
+            text.detach()
+    except (UnicodeDecodeError, csv.Error):
+        return None  # the row reader reports it as before
+    finally:
+        file.seek(0)
+    if len(set(header)) != len(header) or len(header) < schema.min_columns:
+        return None
+    return header
+
+
+def read_frames(file: IO[bytes], header: list[str], batch_rows: int) -> Iterator[pd.DataFrame]:
+    """Data rows as text frames of batch_rows rows; short rows are padded with "", extra fields dropped."""
+    return pd.read_csv(
+        file,
+        header=0,
+        names=header,
+        usecols=header,
+        index_col=False,
+        dtype=str,
+        keep_default_na=False,
+        na_filter=False,
+        encoding="utf-8-sig",
+        chunksize=batch_rows,
+    )
+
+
+def validate_frame(schema: ColumnarSchema, frame: pd.DataFrame, start: int = 2, parse: bool = True) -> ValidatedRows:
+    """Validate a frame numbered from start; parsed rows are only built when parse is set."""
+    n = len(frame)
+    bad = np.zeros(n, dtype=bool)
+    codes: dict[str, np.ndarray[Any, Any]] = {}
+    values: dict[str, np.ndarray[Any, Any]] = {}
+    failing: list[tuple[np.ndarray[Any, Any], list[str | None], np.ndarray[Any, Any]]] = []  # (row failed, message per unique, codes)
+    for column, check in schema.checks:
+        raw = frame[column].to_numpy() if column in frame.columns else np.full(n, "", dtype=object)
+        codes[column], uniques = pd.factorize(raw)
+        checked = [check(u) for u in uniques]
+        values[column] = np.empty(len(checked), dtype=object)
+        values[column][:] = [v for _, v in checked]
+        failed = np.array([e is not None for e, _ in checked], dtype=bool)
+        if failed.any():
+            row_failed = failed[codes[column]]
+            bad |= row_failed
+            failing.append((row_failed, [e for e, _ in checked], codes[column]))
+
+    errors = [
+        ImportRowError(row=start + i, errors=[messages[c[i]] for failed, messages, c in failing if failed[i]])
+        for i in np.flatnonzero(bad).tolist()
+    ]
+    good = np.flatnonzero(~bad)
+    preview_rows = [dict(zip(frame.columns, frame.iloc[i].tolist())) for i in good[:_PREVIEW_ROWS].tolist()]
+    preview = schema.validate_rows(preview_rows, start).result.preview if preview_rows else None
+
+    parsed: list[tuple[Any, ...]] = []
+    if parse and len(good):
+        columns = [
+            [schema.constants[c]] * len(good) if c in schema.constants else values[c].take(codes[c][good]).tolist()
+            for c in schema.columns
+        ]
+        parsed = list(zip(*columns))
+    return ValidatedRows(
+        ImportDryRunResult(
+            valid=not errors,
+            total_rows=n,
+            valid_rows=len(good),
+            errors=errors,
+            preview=preview,
+        ),
+        parsed,
+    )
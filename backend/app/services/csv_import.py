@@ -1,16 +1,35 @@
-"""CSV import with validation and dry-run."""
+"""CSV import with validation and dry-run.
+
+Validators take a list of rows and number them from `start` (2 = the first
+data row after the header), so a large file can be validated batch by batch.
+Besides the dry-run result they return the valid rows already parsed into
+typed tuples (the *_COLUMNS order), ready to upsert without parsing again.
+"""
 from __future__ import annotations
+import codecs
 import csv
 import io
 import logging
+from collections.abc import Iterable, Iterator
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from typing import Any
+from typing import Any, NamedTuple
 
+from app.models import DemandType
 from app.schemas import ImportDryRunResult, ImportRowError
 
 logger = logging.getLogger(__name__)
 
+INVENTORY_COLUMNS = ("week_start", "sku", "warehouse_code", "on_hand_qty")
+RECEIPT_COLUMNS = ("week_start", "sku", "warehouse_code", "source_type", "qty")
+DEMAND_COLUMNS = ("week_start", "sku", "warehouse_code", "demand_type", "qty")
+PRODUCT_COLUMNS = ("sku", "name", "description")
+
+
+class ValidatedRows(NamedTuple):
+    result: ImportDryRunResult
+    rows: list[tuple[Any, ...]]  # valid rows, parsed, in the dataset's *_COLUMNS order
+
 
 def parse_date(s: str) -> tuple[bool, Any]:
     """Parse YYYY-MM-DD; return (ok, date or error)."""
@@ -34,10 +53,11 @@ def parse_decimal(s: str) -> tuple[bool, Decimal | str]:
         return False, "Invalid number"
 
 
-def validate_inventory_snapshots(rows: list[dict[str, Any]]) -> ImportDryRunResult:
+def validate_inventory_snapshots(rows: list[dict[str, Any]], start: int = 2) -> ValidatedRows:
     errors: list[ImportRowError] = []
     preview: list[dict[str, Any]] = []
-    for i, row in enumerate(rows, start=2):  # row 2 = header+1
+    parsed: list[tuple[Any, ...]] = []
+    for i, row in enumerate(rows, start=start):  # row 2 = header+1
         errs: list[str] = []
         if len(row) < 4:
             errs.append("Missing columns")
@@ -57,22 +77,27 @@ def validate_inventory_snapshots(rows: list[dict[str, Any]]) -> ImportDryRunResu
         if errs:
             errors.append(ImportRowError(row=i, errors=errs))
         else:
+            parsed.append((week_val, sku, wh, qty_val))
             if len(preview) < 5:
                 preview.append({**row, "week_start": str(week_val) if week_ok else row.get("week_start"), "on_hand_qty": str(qty_val) if qty_ok else row.get("on_hand_qty")})
     valid_rows = len(rows) - len(errors)
-    return ImportDryRunResult(
-        valid=len(errors) == 0,
-        total_rows=len(rows),
-        valid_rows=valid_rows,
-        errors=errors,
-        preview=preview[:5] if preview else None,
+    return ValidatedRows(
+        ImportDryRunResult(
+            valid=len(errors) == 0,
+            total_rows=len(rows),
+            valid_rows=valid_rows,
+            errors=errors,
+            preview=preview[:5] if preview else None,
+        ),
+        parsed,
     )
 
 
-def validate_receipts(rows: list[dict[str, Any]]) -> ImportDryRunResult:
+def validate_receipts(rows: list[dict[str, Any]], start: int = 2) -> ValidatedRows:
     errors: list[ImportRowError] = []
     preview: list[dict[str, Any]] = []
-    for i, row in enumerate(rows, start=2):
+    parsed: list[tuple[Any, ...]] = []
+    for i, row in enumerate(rows, start=start):
         errs: list[str] = []
         week_ok, week_val = parse_date(row.get("week_start", ""))
         if not week_ok:
@@ -89,22 +114,27 @@ def validate_receipts(rows: list[dict[str, Any]]) -> ImportDryRunResult:
         if errs:
             errors.append(ImportRowError(row=i, errors=errs))
         else:
+            parsed.append((week_val, sku, wh, (row.get("source_type") or "").strip() or None, qty_val))
             if len(preview) < 5:
                 preview.append({**row, "week_start": str(week_val), "qty": str(qty_val)})
-    return ImportDryRunResult(
-        valid=len(errors) == 0,
-        total_rows=len(rows),
-        valid_rows=len(rows) - len(errors),
-        errors=errors,
-        preview=preview[:5] if preview else None,
+    return ValidatedRows(
+        ImportDryRunResult(
+            valid=len(errors) == 0,
+            total_rows=len(rows),
+            valid_rows=len(rows) - len(errors),
+            errors=errors,
+            preview=preview[:5] if preview else None,
+        ),
+        parsed,
     )
 
 
-def validate_demand_actuals(rows: list[dict[str, Any]]) -> ImportDryRunResult:
+def validate_demand_actuals(rows: list[dict[str, Any]], start: int = 2) -> ValidatedRows:
     allowed: set[str] = {"CUSTOMER", "SAMPLES", "ADJUSTMENT"}
     errors: list[ImportRowError] = []
     preview: list[dict[str, Any]] = []
-    for i, row in enumerate(rows, start=2):
+    parsed: list[tuple[Any, ...]] = []
+    for i, row in enumerate(rows, start=start):
         errs: list[str] = []
         week_ok, week_val = parse_date(row.get("week_start", ""))
         if not week_ok:
@@ -124,22 +154,27 @@ def validate_demand_actuals(rows: list[dict[str, Any]]) -> ImportDryRunResult:
         if errs:
             errors.append(ImportRowError(row=i, errors=errs))
         else:
+            parsed.append((week_val, sku, wh, DemandType[dt], qty_val))
             if len(preview) < 5:
                 preview.append({**row, "week_start": str(week_val), "qty": str(qty_val), "demand_type": dt})
-    return ImportDryRunResult(
-        valid=len(errors) == 0,
-        total_rows=len(rows),
-        valid_rows=len(rows) - len(errors),
-        errors=errors,
-        preview=preview[:5] if preview else None,
+    return ValidatedRows(
+        ImportDryRunResult(
+            valid=len(errors) == 0,
+            total_rows=len(rows),
+            valid_rows=len(rows) - len(errors),
+            errors=errors,
+            preview=preview[:5] if preview else None,
+        ),
+        parsed,
     )
 
 
-def validate_samples_withdrawals(rows: list[dict[str, Any]]) -> ImportDryRunResult:
+def validate_samples_withdrawals(rows: list[dict[str, Any]], start: int = 2) -> ValidatedRows:
     """Same as demand_actuals but demand_type fixed to SAMPLES."""
     errors: list[ImportRowError] = []
     preview: list[dict[str, Any]] = []
-    for i, row in enumerate(rows, start=2):
+    parsed: list[tuple[Any, ...]] = []
+    for i, row in enumerate(rows, start=start):
         errs: list[str] = []
         week_ok, week_val = parse_date(row.get("week_start", ""))
         if not week_ok:
@@ -156,21 +191,26 @@ def validate_samples_withdrawals(rows: list[dict[str, Any]]) -> ImportDryRunResu
         if errs:
             errors.append(ImportRowError(row=i, errors=errs))
         else:
+            parsed.append((week_val, sku, wh, DemandType.SAMPLES, qty_val))
             if len(preview) < 5:
                 preview.append({**row, "week_start": str(week_val), "qty": str(qty_val), "demand_type": "SAMPLES"})
-    return ImportDryRunResult(
-        valid=len(errors) == 0,
-        total_rows=len(rows),
-        valid_rows=len(rows) - len(errors),
-        errors=errors,
-        preview=preview[:5] if preview else None,
+    return ValidatedRows(
+        ImportDryRunResult(
+            valid=len(errors) == 0,
+            total_rows=len(rows),
+            valid_rows=len(rows) - len(errors),
+            errors=errors,
+            preview=preview[:5] if preview else None,
+        ),
+        parsed,
     )
 
 
-def validate_products(rows: list[dict[str, Any]]) -> ImportDryRunResult:
+def validate_products(rows: list[dict[str, Any]], start: int = 2) -> ValidatedRows:
     errors: list[ImportRowError] = []
     preview: list[dict[str, Any]] = []
-    for i, row in enumerate(rows, start=2):
+    parsed: list[tuple[Any, ...]] = []
+    for i, row in enumerate(rows, start=start):
         errs: list[str] = []
         sku = (row.get("sku") or "").strip()
         if not sku:
@@ -178,14 +218,18 @@ def validate_products(rows: list[dict[str, Any]]) -> ImportDryRunResult:
         if errs:
             errors.append(ImportRowError(row=i, errors=errs))
         else:
+            parsed.append((sku, (row.get("name") or "").strip() or None, (row.get("description") or "").strip() or None))
             if len(preview) < 5:
                 preview.append(row)
-    return ImportDryRunResult(
-        valid=len(errors) == 0,
-        total_rows=len(rows),
-        valid_rows=len(rows) - len(errors),
-        errors=errors,
-        preview=preview[:5] if preview else None,
+    return ValidatedRows(
+        ImportDryRunResult(
+            valid=len(errors) == 0,
+            total_rows=len(rows),
+            valid_rows=len(rows) - len(errors),
+            errors=errors,
+            preview=preview[:5] if preview else None,
+        ),
+        parsed,
     )
 
 
@@ -193,3 +237,22 @@ def read_csv(file_content: bytes) -> list[dict[str, Any]]:
     text = file_content.decode("utf-8-sig")
     reader = csv.DictReader(io.StringIO(text))
     return list(reader)
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode byte chunks incrementally into "\n"-terminated lines (as io.StringIO iteration would)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_csv(chunks: Iterable[bytes]) -> Iterator[dict[str, Any]]:
+    """Parse a CSV upload as it is read: one dict per data row, like read_csv, in bounded memory."""
+    return csv.DictReader(_iter_lines(chunks))
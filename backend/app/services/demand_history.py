@@ -0,0 +1,70 @@
+"""
+Per-(sku, warehouse) demand history index for forecasting.
+
+Built in one pass over the demand rows: for every key and DemandType it holds
+week-sorted arrays of week ordinals and quantities, so a trailing mean over
+the last N weeks up to a given week is a searchsorted + slice instead of a
+scan of all demand.
+"""
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import numpy.typing as npt
+
+from app.models import DemandType
+
+logger = logging.getLogger(__name__)
+
+_Series = tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]
+
+
+class DemandHistoryIndex:
+    """Week-sorted demand per (sku, warehouse_code, DemandType)."""
+
+    def __init__(self, series: Mapping[tuple[str, str, DemandType], _Series]) -> None:
+        self._series: dict[tuple[str, str, DemandType], _Series] = dict(series)
+
+    @classmethod
+    def from_rows(
+        cls, rows: Iterable[tuple[date, str, str, DemandType, Decimal]]
+    ) -> DemandHistoryIndex:
+        """Build from (week_start, sku, warehouse_code, demand_type, qty); one row per week and type."""
+        grouped: defaultdict[tuple[str, str, DemandType], list[tuple[int, float]]] = defaultdict(list)
+        for week, sku, wh_code, demand_type, qty in rows:
+            grouped[(sku, wh_code, demand_type)].append((week.toordinal(), float(qty)))
+        series: dict[tuple[str, str, DemandType], _Series] = {}
+        for key, points in grouped.items():
+            points.sort(key=lambda p: p[0])
+            series[key] = (
+                np.fromiter((p[0] for p in points), dtype=np.int64, count=len(points)),
+                np.fromiter((p[1] for p in points), dtype=np.float64, count=len(points)),
+            )
+        return cls(series)
+
+    @classmethod
+    def from_demand_by_type(
+        cls, demand_by_type: Mapping[tuple[date, str, str, DemandType], Decimal]
+    ) -> DemandHistoryIndex:
+        return cls.from_rows((w, s, wc, dt, q) for (w, s, wc, dt), q in demand_by_type.items())
+
+    def trailing_mean(
+        self, sku: str, warehouse_code: str, demand_type: DemandType, window: int, as_of: date
+    ) -> Decimal:
+        """Mean of the last `window` weeks with history at or before as_of, rounded to 4 dp."""
+        found = self._series.get((sku, warehouse_code, demand_type))
+        if found is None:
+            return Decimal("0")
+        weeks, qtys = found
+        end = int(np.searchsorted(weeks, as_of.toordinal(), side="right"))
+        last_n = qtys[:end][-window:].tolist()
+        if not last_n:
+            return Decimal("0")
+        # Plain left-to-right float sum, as the original per-key loop did.
+        avg = sum(last_n) / len(last_n)
+        return Decimal(str(round(avg, 4)))
@@ -0,0 +1,148 @@
+"""
+Bundle imports: a zip of dataset CSVs validated together and loaded in one transaction.
+
+Members are named after the import endpoints (products.csv, receipts.csv,
+demand-actuals.csv, ...; underscores work too) and any subset may be present.
+Besides each file's own checks, plan input rows must reference a sku that is
+in products or in the bundle's products.csv. Nothing is loaded unless every
+file is valid; then all files are upserted, products first, and committed
+together, so a refresh either lands completely or not at all.
+"""
+from __future__ import annotations
+
+import logging
+import shutil
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+from typing import IO, cast
+
+from sqlalchemy import select
+
+from app.database import BackgroundSessionLocal, SessionLocal
+from app.models import Product
+from app.schemas import ImportDryRunResult, ImportRowError
+from app.services.csv_import import ValidatedRows
+from app.services.import_pipeline import IMPORT_SPECS, ImportKind, run_import
+
+logger = logging.getLogger(__name__)
+
+# Load order: products first, so plan inputs never reference a sku that is not loaded yet
+BUNDLE_ORDER: tuple[ImportKind, ...] = (
+    "products",
+    "inventory-snapshots",
+    "receipts",
+    "demand-actuals",
+    "samples-withdrawals",
+)
+
+_COPY_BYTES = 1 << 20
+
+
+class BundleError(Exception):
+    """The upload is not a readable zip of dataset CSVs."""
+
+
+def bundle_kind(filename: str) -> ImportKind | None:
+    """The dataset a zip member is named after, e.g. demand_actuals.csv -> demand-actuals."""
+    name = PurePosixPath(filename).name.lower()
+    if not name.endswith(".csv"):
+        return None
+    kind = name[: -len(".csv")].replace("_", "-")
+    return cast(ImportKind, kind) if kind in IMPORT_SPECS else None
+
+
+def extract_bundle(upload: IO[bytes], directory: Path) -> dict[ImportKind, Path]:
+    """Write each dataset CSV of the zip to directory as <kind>.csv."""
+    try:
+        zf = zipfile.ZipFile(upload)
+    except zipfile.BadZipFile:
+        raise BundleError("Not a zip file")
+    paths: dict[ImportKind, Path] = {}
+    with zf:
+        for info in zf.infolist():
+            name = PurePosixPath(info.filename).name
+            if info.is_dir() or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            kind = bundle_kind(info.filename)
+            if kind is None:
+                expected = ", ".join(f"{k}.csv" for k in BUNDLE_ORDER)
+                raise BundleError(f"Unexpected file {info.filename!r}; expected any of {expected}")
+            if kind in paths:
+                raise BundleError(f"More than one {kind} file")
+            paths[kind] = directory / f"{kind}.csv"
+            try:
+                with zf.open(info) as src, open(paths[kind], "wb") as out:
+                    shutil.copyfileobj(src, out, _COPY_BYTES)
+            except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, RuntimeError) as e:
+                raise BundleError(f"Cannot read {info.filename!r}: {e}")
+    if not paths:
+        raise BundleError("No CSV files in the zip")
+    return paths
+
+
+def product_skus() -> frozenset[str]:
+    with SessionLocal() as s:
+        return frozenset(s.scalars(select(Product.sku)))
+
+
+def check_skus(batch: ValidatedRows, start: int, skus: frozenset[str]) -> ValidatedRows:
+    """Reject the batch's valid plan input rows whose sku is not in skus."""
+    result, rows = batch
+    unknown = [i for i, r in enumerate(rows) if r[1] not in skus]
+    if not unknown:
+        return batch
+    # Valid rows are the batch's rows without errors, in order
+    failed = {e.row for e in result.errors}
+    row_numbers = [r for r in range(start, start + result.total_rows) if r not in failed]
+    errors = result.errors + [
+        ImportRowError(row=row_numbers[i], errors=[f"sku {rows[i][1]} not found in products"]) for i in unknown
+    ]
+    errors.sort(key=lambda e: e.row)
+    unknown_set = set(unknown)
+    preview = [p for p in result.preview or [] if (p.get("sku") or "").strip() in skus]
+    return ValidatedRows(
+        result.model_copy(
+            update={
+                "valid": False,
+                "valid_rows": result.valid_rows - len(unknown),
+                "errors": errors,
+                "preview": preview or None,
+            }
+        ),
+        [r for i, r in enumerate(rows) if i not in unknown_set],
+    )
+
+
+def validate_bundle_file(
+    kind: ImportKind, path: Path, skus: frozenset[str]
+) -> tuple[ImportDryRunResult, frozenset[str]]:
+    """Dry-run one member, checking plan input skus against skus; also the skus of its valid product rows."""
+    found: set[str] = set()
+
+    def check(batch: ValidatedRows, start: int) -> ValidatedRows:
+        if kind == "products":
+            found.update(r[0] for r in batch.rows)
+            return batch
+        return check_skus(batch, start, skus)
+
+    with BackgroundSessionLocal() as db, open(path, "rb") as f:
+        result = run_import(db, kind, f, dry_run=True, check=check)
+    return result, frozenset(found)
+
+
+def load_bundle(paths: dict[ImportKind, Path]) -> dict[ImportKind, ImportDryRunResult]:
+    """Upsert every member, products first, in one transaction."""
+    results: dict[ImportKind, ImportDryRunResult] = {}
+    with BackgroundSessionLocal() as db:
+        try:
+            for kind in BUNDLE_ORDER:
+                if kind in paths:
+                    with open(paths[kind], "rb") as f:
+                        results[kind] = run_import(db, kind, f, dry_run=False, commit=False)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            raise
+    logger.info("Bundle import committed: %s", ", ".join(f"{k} {r.total_rows} rows" for k, r in results.items()))
+    return results
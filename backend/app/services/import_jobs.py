@@ -0,0 +1,330 @@
+"""
+Background CSV imports.
+
+An import job spools its upload to import_job_dir and is run by a per-process
+thread pool. Unlike a synchronous import, every batch is applied and committed
+together with the job's counters and rows_done, the high-water mark of data
+rows already imported, so progress is visible while the job runs and a crash
+loses at most one batch. All row errors go to the job's error report, whose
+length is committed alongside.
+
+A job interrupted by a restart (or stopped by shutdown) is re-queued on startup
+and resumes after rows_done: earlier rows are parsed again but neither
+validated nor applied, and the report is cut back to its committed length.
+Cancelling stops a job after its current batch; batches already committed
+stay imported.
+
+Jobs are shared by every process using the database: a claim takes a lease
+(see job_leases). Each batch commits only while its process still holds the
+job, checked under a lock on the job row before the batch's errors are
+written, so a job is never applied or reported by two processes. A RUNNING
+job whose lease expired is re-queued by whichever process notices first and
+resumes after rows_done. A process only runs jobs whose upload is in its
+import_job_dir.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import IO, Any, cast
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import BackgroundSessionLocal, SessionLocal
+from app.models import ImportJob, JobStatus
+from app.services.job_leases import Heartbeat, claim_values, lease_expired, owned, renew
+from app.services.import_pipeline import IMPORT_SPECS, ErrorReport, ImportKind, validated_batches
+
+logger = logging.getLogger(__name__)
+
+_COPY_BYTES = 1 << 20
+_COUNTERS = ("rows_done", "valid_rows", "error_count", "inserted_rows", "updated_rows")
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_cancel_events: dict[int, threading.Event] = {}
+_stopping = threading.Event()
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+class _Stopped(Exception):
+    """The pool is shutting down; the job is re-queued and resumes on the next startup."""
+
+
+class _LeaseLost(Exception):
+    """Another process recovered the job; this one leaves it alone."""
+
+
+def import_job_dir() -> Path:
+    return Path(settings.import_job_dir or os.path.join(tempfile.gettempdir(), "import_jobs"))
+
+
+def _upload_path(job_id: int) -> Path:
+    return import_job_dir() / f"{job_id}.csv"
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _stopping.clear()
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.import_job_workers), thread_name_prefix="import-job"
+            )
+        return _executor
+
+
+def _cancel_event(job_id: int) -> threading.Event:
+    with _lock:
+        return _cancel_events.setdefault(job_id, threading.Event())
+
+
+def _update_job(job_id: int, values: dict[str, Any]) -> bool:
+    """Apply values to the job row if this process still holds the job; whether it did."""
+    with SessionLocal() as s:
+        updated = s.query(ImportJob).filter(ImportJob.id == job_id, owned(ImportJob)).update(values)
+        s.commit()
+    return bool(updated)
+
+
+def _finish(job_id: int, values: dict[str, Any]) -> None:
+    """Record a final status and delete the spooled upload."""
+    if _update_job(job_id, {**values, "finished_at": datetime.now()}):
+        _upload_path(job_id).unlink(missing_ok=True)
+
+
+def _claim(job_id: int) -> dict[str, Any] | None:
+    """QUEUED -> RUNNING under this process's lease, atomically.
+
+    Returns the job's kind, size, counters and report, or None if it was cancelled or taken.
+    """
+    columns = ("kind", "file_size", "error_report_id", "error_report_bytes", *_COUNTERS)
+    with SessionLocal() as s:
+        claimed = s.execute(
+            update(ImportJob)
+            .where(
+                ImportJob.id == job_id,
+                ImportJob.status == JobStatus.QUEUED,
+                ImportJob.cancel_requested.is_(False),
+            )
+            .values(**claim_values(), started_at=datetime.now())
+            .returning(*(getattr(ImportJob, c) for c in columns))
+        ).first()
+        s.commit()
+    return dict(zip(columns, claimed)) if claimed is not None else None
+
+
+def _run_job(job_id: int) -> None:
+    # Uploads are spooled locally: leave a job submitted elsewhere to a process that has its file
+    job = _claim(job_id) if _upload_path(job_id).is_file() else None
+    if job is None:
+        with _lock:
+            _cancel_events.pop(job_id, None)
+        return
+    path = _upload_path(job_id)
+    if not path.is_file():
+        _finish(job_id, {"status": JobStatus.FAILED, "error": "Upload file missing; submit the import again"})
+        return
+    spec = IMPORT_SPECS[job["kind"]]
+    cancel = _cancel_event(job_id)
+    counts = {c: cast(int, job[c]) for c in _COUNTERS}
+    committed_report: tuple[str | None, int] = (job["error_report_id"], job["error_report_bytes"])
+    report = ErrorReport(0)  # every error goes to the report
+    if counts["rows_done"]:
+        logger.info("Import job %d resuming after row %d", job_id, counts["rows_done"] + 1)
+    size = max(cast(int, job["file_size"]), 1)
+    db = BackgroundSessionLocal()
+    try:
+        if job["error_report_id"] is not None:
+            report.resume(job["error_report_id"], job["error_report_bytes"])
+        with open(path, "rb") as f:
+            for n, (result, parsed) in validated_batches(spec, f, parse=True, start=2 + counts["rows_done"]):
+                if parsed:
+                    stats = spec.apply(parsed, db)
+                    counts["inserted_rows"] += stats["inserted"]
+                    counts["updated_rows"] += stats["updated"]
+                # Locks the job row until the commit, so no other process can recover it meanwhile
+                cancel_requested = db.execute(
+                    select(ImportJob.cancel_requested).where(ImportJob.id == job_id, owned(ImportJob)).with_for_update()
+                ).scalar()
+                if cancel_requested is None:
+                    raise _LeaseLost()
+                report.add(result.errors)
+                counts["rows_done"] += n
+                counts["valid_rows"] += result.valid_rows
+                counts["error_count"] += len(result.errors)
+                report_bytes = report.size()
+                db.query(ImportJob).filter(ImportJob.id == job_id).update(
+                    {
+                        **counts,
+                        "progress": Decimal(str(round(min(f.tell() / size, 0.9999), 4))),
+                        "error_report_id": report.report_id,
+                        "error_report_bytes": report_bytes,
+                        "heartbeat_at": func.now(),
+                    }
+                )
+                db.commit()
+                committed_report = (report.report_id, report_bytes)
+                if cancel_requested or cancel.is_set():
+                    raise ImportCancelled()
+                if _stopping.is_set():
+                    raise _Stopped()
+        report.close()
+        _finish(job_id, {"status": JobStatus.SUCCEEDED, "progress": Decimal("1")})
+        logger.info(
+            "Import job %d (%s) succeeded: %d rows, %d errors, %d inserted, %d updated",
+            job_id, job["kind"], counts["rows_done"], counts["error_count"],
+            counts["inserted_rows"], counts["updated_rows"],
+        )
+    except _LeaseLost:
+        db.rollback()
+        logger.warning("Import job %d was taken over by another process after row %d", job_id, counts["rows_done"])
+    except Exception as e:  # noqa: BLE001 - job status records the failure
+        db.rollback()
+        # Errors of a batch that did not commit are not part of the job's report
+        if committed_report[0] is None:
+            report.discard()
+        else:
+            report.truncate(committed_report[1])
+            report.close()
+        if isinstance(e, _Stopped):
+            _update_job(job_id, {"status": JobStatus.QUEUED, "claimed_by": None})
+            logger.info("Import job %d stopped at row %d; it resumes on the next startup", job_id, counts["rows_done"])
+        elif isinstance(e, ImportCancelled):
+            _finish(job_id, {"status": JobStatus.CANCELLED})
+            logger.info("Import job %d cancelled after %d rows", job_id, counts["rows_done"])
+        else:
+            logger.exception("Import job %d failed", job_id)
+            _finish(job_id, {"status": JobStatus.FAILED, "error": str(e)})
+    finally:
+        db.close()
+        with _lock:
+            _cancel_events.pop(job_id, None)
+
+
+def _enqueue(job_id: int) -> None:
+    _cancel_event(job_id)
+    _get_executor().submit(_run_job, job_id)
+
+
+def _recover(s: Session, queued_before: datetime | None) -> list[int]:
+    """Re-queue RUNNING jobs whose lease expired; QUEUED jobs not yet enqueued here, in submission order.
+
+    With queued_before, only jobs created before it or just re-queued. Not committed.
+    """
+    requeued = s.execute(
+        update(ImportJob)
+        .where(lease_expired(ImportJob))
+        .values(status=JobStatus.QUEUED, claimed_by=None)
+        .returning(ImportJob.id)
+    ).scalars().all()
+    if requeued:
+        logger.info("Import jobs %s lost their process; re-queued", sorted(requeued))
+    q = s.query(ImportJob.id).filter(ImportJob.status == JobStatus.QUEUED, ImportJob.cancel_requested.is_(False))
+    if queued_before is not None:
+        q = q.filter((ImportJob.created_at < queued_before) | ImportJob.id.in_(requeued))
+    with _lock:
+        local = set(_cancel_events)
+    return [cast(int, job_id) for (job_id,) in q.order_by(ImportJob.id) if job_id not in local]
+
+
+def _heartbeat() -> None:
+    """Renew this process's leases; take over jobs of processes that stopped."""
+    with SessionLocal() as s:
+        renew(s, ImportJob)
+        queued = _recover(s, datetime.now() - timedelta(seconds=settings.job_lease_s))
+        s.commit()
+    for job_id in queued:
+        _enqueue(job_id)
+
+
+_heartbeat_thread = Heartbeat("import-job", _heartbeat)
+
+
+def submit_import_job(db: Session, kind: ImportKind, filename: str | None, upload: IO[bytes]) -> ImportJob:
+    """Spool the upload to import_job_dir and queue it."""
+    job = ImportJob(
+        kind=kind,
+        filename=filename,
+        status=JobStatus.QUEUED,
+        progress=Decimal("0"),
+        cancel_requested=False,
+        created_at=datetime.now(),
+    )
+    db.add(job)
+    db.flush()
+    job_id = cast(int, job.id)
+    path = _upload_path(job_id)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as out:
+            shutil.copyfileobj(upload, out, _COPY_BYTES)
+        db.query(ImportJob).filter(ImportJob.id == job_id).update({"file_size": path.stat().st_size})
+        db.commit()
+    except BaseException:
+        db.rollback()
+        path.unlink(missing_ok=True)
+        raise
+    db.refresh(job)
+    _enqueue(job_id)
+    return job
+
+
+def cancel_import_job(db: Session, job: ImportJob) -> ImportJob:
+    """Cancel a QUEUED job outright; ask a RUNNING one to stop after its current batch."""
+    job_id = cast(int, job.id)
+    queued = (
+        db.query(ImportJob)
+        .filter(ImportJob.id == job_id, ImportJob.status == JobStatus.QUEUED)
+        .update({"status": JobStatus.CANCELLED, "cancel_requested": True, "finished_at": datetime.now()})
+    )
+    if queued:
+        _upload_path(job_id).unlink(missing_ok=True)
+    else:
+        db.query(ImportJob).filter(ImportJob.id == job_id, ImportJob.status == JobStatus.RUNNING).update(
+            {"cancel_requested": True}
+        )
+        with _lock:
+            event = _cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def recover_import_jobs() -> None:
+    """On startup: re-queue jobs whose process stopped, enqueue the QUEUED ones and start renewing leases.
+
+    Jobs other live processes are running keep their lease; a QUEUED job enqueued by
+    several processes is run by the one whose claim succeeds.
+    """
+    with SessionLocal() as s:
+        queued = _recover(s, None)
+        s.commit()
+    for job_id in queued:
+        _enqueue(job_id)
+    _heartbeat_thread.start()
+
+
+def shutdown_import_jobs() -> None:
+    """Stop the pool: running jobs stop after their current batch and stay queued for the next startup."""
+    global _executor
+    _heartbeat_thread.stop()
+    with _lock:
+        executor, _executor = _executor, None
+        _stopping.set()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,330 @@
+"""
+Streaming CSV import pipeline.
+
+An upload is parsed incrementally and validated (and, unless dry_run, upserted)
+a batch at a time, so memory does not grow with the file. Batches are pandas
+frames of import_columnar_batch_rows rows validated column-wise (csv_columnar);
+with the "rows" engine, or for uploads the columnar reader would split into
+rows differently, they are import_batch_rows csv.DictReader rows checked one by
+one. All batches of an import share one transaction, committed at the end. The
+first import_error_limit row errors are returned inline; past that, every error
+is also written to a CSV report that can be downloaded by id.
+"""
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import IO, Any, Literal, cast
+
+from pandas.errors import ParserError
+from sqlalchemy import Table, func, literal_column
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import DemandActual, InventorySnapshotWeekly, Product, Receipt
+from app.schemas import ImportDryRunResult, ImportRowError
+from app.services.bulk_write import UpsertStats, bulk_upsert
+from app.services.csv_columnar import (
+    DEMAND_SCHEMA,
+    INVENTORY_SCHEMA,
+    PRODUCT_SCHEMA,
+    RECEIPT_SCHEMA,
+    SAMPLES_SCHEMA,
+    ColumnarSchema,
+    columnar_header,
+    read_frames,
+    validate_frame,
+)
+from app.services.csv_import import (
+    DEMAND_COLUMNS,
+    INVENTORY_COLUMNS,
+    PRODUCT_COLUMNS,
+    RECEIPT_COLUMNS,
+    ValidatedRows,
+    iter_csv,
+    validate_demand_actuals,
+    validate_inventory_snapshots,
+    validate_products,
+    validate_receipts,
+    validate_samples_withdrawals,
+)
+from app.services.master_data_cache import bump_versions
+from app.services.plan_changes import mark_dirty
+
+logger = logging.getLogger(__name__)
+
+ImportKind = Literal["inventory-snapshots", "receipts", "demand-actuals", "samples-withdrawals", "products"]
+
+PREVIEW_ROWS = 5
+_READ_CHUNK_BYTES = 1 << 20
+_REPORT_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _upsert_plan_inputs(
+    db: Session,
+    target: Table,
+    columns: tuple[str, ...],
+    rows: list[tuple[Any, ...]],
+    key: tuple[str, ...],
+    conflict: tuple[Any, ...] | None = None,
+) -> UpsertStats:
+    """Upsert parsed plan input rows (week_start, sku, warehouse_code, ...) and mark their keys dirty.
+
+    Columns outside key are overwritten on existing rows.
+    """
+    update = tuple(c for c in columns if c not in key)
+    stats = bulk_upsert(db, target, columns, rows, key=key, update=update, conflict=conflict)
+    mark_dirty(db, {(r[1], r[2]) for r in rows})
+    return stats
+
+
+def apply_inventory(rows: list[tuple[Any, ...]], db: Session) -> UpsertStats:
+    return _upsert_plan_inputs(
+        db,
+        cast(Table, InventorySnapshotWeekly.__table__),
+        INVENTORY_COLUMNS,
+        rows,
+        key=("week_start", "sku", "warehouse_code"),
+    )
+
+
+def apply_receipts(rows: list[tuple[Any, ...]], db: Session) -> UpsertStats:
+    receipts = cast(Table, Receipt.__table__)
+    return _upsert_plan_inputs(
+        db,
+        receipts,
+        RECEIPT_COLUMNS,
+        rows,
+        key=("week_start", "sku", "warehouse_code", "source_type"),
+        # uq_receipts_week_sku_wh_source: a blank source_type matches the NULL-source receipt
+        conflict=(
+            "week_start",
+            "sku",
+            "warehouse_code",
+            func.coalesce(receipts.c.source_type, literal_column("''")),
+        ),
+    )
+
+
+def apply_demand(rows: list[tuple[Any, ...]], db: Session) -> UpsertStats:
+    return _upsert_plan_inputs(
+        db,
+        cast(Table, DemandActual.__table__),
+        DEMAND_COLUMNS,
+        rows,
+        key=("week_start", "sku", "warehouse_code", "demand_type"),
+    )
+
+
+def apply_products(rows: list[tuple[Any, ...]], db: Session) -> UpsertStats:
+    stats = bulk_upsert(
+        db,
+        cast(Table, Product.__table__),
+        PRODUCT_COLUMNS,
+        rows,
+        key=("sku",),
+        update=("name", "description"),
+    )
+    bump_versions(db, ["products"])
+    return stats
+
+
+@dataclass(frozen=True)
+class ImportSpec:
+    validate: Callable[[list[dict[str, Any]], int], ValidatedRows]
+    apply: Callable[[list[tuple[Any, ...]], Session], UpsertStats]
+    columnar: ColumnarSchema
+
+
+IMPORT_SPECS: dict[ImportKind, ImportSpec] = {
+    "inventory-snapshots": ImportSpec(validate_inventory_snapshots, apply_inventory, INVENTORY_SCHEMA),
+    "receipts": ImportSpec(validate_receipts, apply_receipts, RECEIPT_SCHEMA),
+    "demand-actuals": ImportSpec(validate_demand_actuals, apply_demand, DEMAND_SCHEMA),
+    "samples-withdrawals": ImportSpec(validate_samples_withdrawals, apply_demand, SAMPLES_SCHEMA),
+    "products": ImportSpec(validate_products, apply_products, PRODUCT_SCHEMA),
+}
+
+
+def error_report_dir() -> Path:
+    return Path(settings.import_error_report_dir or os.path.join(tempfile.gettempdir(), "import_error_reports"))
+
+
+def error_report_path(report_id: str) -> Path | None:
+    """Path of a downloadable error report, or None for an unknown or malformed id."""
+    if not _REPORT_ID.match(report_id):
+        return None
+    path = error_report_dir() / f"{report_id}.csv"
+    return path if path.is_file() else None
+
+
+def _prune_error_reports(directory: Path) -> None:
+    cutoff = time.time() - settings.import_error_report_ttl_s
+    for path in directory.glob("*.csv"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+class ErrorReport:
+    """Keeps the first `limit` row errors; once exceeded, spills every error to a report file."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.inline: list[ImportRowError] = []
+        self.count = 0
+        self.report_id: str | None = None
+        self._file: IO[str] | None = None
+        self._writer: Any = None
+
+    def add(self, errors: Iterable[ImportRowError]) -> None:
+        for e in errors:
+            self.count += 1
+            if self._writer is not None:
+                self._writer.writerow((e.row, "; ".join(e.errors)))
+            elif len(self.inline) < self.limit:
+                self.inline.append(e)
+            else:
+                self._open()
+                self._writer.writerow((e.row, "; ".join(e.errors)))
+
+    def _open(self) -> None:
+        directory = error_report_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        _prune_error_reports(directory)
+        self.report_id = uuid.uuid4().hex
+        self._file = open(directory / f"{self.report_id}.csv", "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(("row", "errors"))
+        for e in self.inline:
+            self._writer.writerow((e.row, "; ".join(e.errors)))
+
+    def resume(self, report_id: str, size: int) -> None:
+        """Append to an existing report, dropping whatever follows its first size bytes."""
+        self.report_id = report_id
+        self._file = open(error_report_dir() / f"{report_id}.csv", "r+", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self.truncate(size)
+
+    def truncate(self, size: int) -> None:
+        """Drop what was written after the first size bytes (e.g. errors of a rolled-back batch)."""
+        if self._file is not None:
+            self._file.truncate(size)
+            self._file.seek(0, os.SEEK_END)
+
+    def size(self) -> int:
+        """Bytes written so far (flushed)."""
+        if self._file is None:
+            return 0
+        self._file.flush()
+        return self._file.tell()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        self.close()
+        if self.report_id is not None:
+            (error_report_dir() / f"{self.report_id}.csv").unlink(missing_ok=True)
+            self.report_id = None
+
+
+def validated_batches(
+    spec: ImportSpec, file: IO[bytes], parse: bool, start: int = 2
+) -> Iterator[tuple[int, ValidatedRows]]:
+    """(rows in batch, validation) per batch of the upload, from data row start on (2 = the first)."""
+    row = 2  # row 1 is the header
+    header = columnar_header(spec.columnar, file) if settings.import_engine == "columnar" else None
+    if header is not None:
+        try:
+            for frame in read_frames(file, header, settings.import_columnar_batch_rows):
+                if row + len(frame) <= start:
+                    row += len(frame)
+                    continue
+                if row < start:
+                    frame, row = frame.iloc[start - row :], start
+                yield len(frame), validate_frame(spec.columnar, frame, row, parse)
+                row += len(frame)
+            return
+        except ParserError as e:
+            # e.g. a quote left open at EOF, which csv.reader accepts: the rows
+            # engine takes over after the rows already validated
+            logger.info("Columnar CSV reader stopped at row %d (%s); continuing row by row", row, e)
+            file.seek(0)
+    row = max(row, start)
+    rows = islice(iter_csv(iter(partial(file.read, _READ_CHUNK_BYTES), b"")), row - 2, None)
+    while batch := list(islice(rows, settings.import_batch_rows)):
+        yield len(batch), spec.validate(batch, row)
+        row += len(batch)
+
+
+def run_import(
+    db: Session,
+    kind: ImportKind,
+    file: IO[bytes],
+    dry_run: bool,
+    check: Callable[[ValidatedRows, int], ValidatedRows] | None = None,
+    commit: bool = True,
+) -> ImportDryRunResult:
+    """Validate (and unless dry_run, apply) a CSV upload read from a binary file, batch by batch.
+
+    check, given each batch and its first row number, can reject more rows; its
+    batches are parsed even on a dry run. With commit unset the caller commits.
+    Inserted and updated rows are summed over the batch upserts, so a key that
+    appears in two batches counts as inserted once and updated once.
+    """
+    spec = IMPORT_SPECS[kind]
+    report = ErrorReport(settings.import_error_limit)
+    preview: list[dict[str, Any]] = []
+    total = valid = inserted = updated = 0
+    applied = False
+    try:
+        for n, batch in validated_batches(spec, file, parse=not dry_run or check is not None):
+            result, parsed = batch if check is None else check(batch, 2 + total)
+            total += n
+            valid += result.valid_rows
+            report.add(result.errors)
+            if result.preview and len(preview) < PREVIEW_ROWS:
+                preview.extend(result.preview[: PREVIEW_ROWS - len(preview)])
+            if not dry_run and parsed:
+                stats = spec.apply(parsed, db)
+                inserted += stats["inserted"]
+                updated += stats["updated"]
+                applied = True
+        if applied and commit:
+            db.commit()
+    except BaseException:
+        db.rollback()
+        report.discard()
+        raise
+    report.close()
+    if total == 0:
+        return ImportDryRunResult(valid=False, total_rows=0, valid_rows=0, errors=[ImportRowError(row=1, errors=["No data rows"])])
+    logger.info(
+        "Import %s: %d rows, %d valid, %d errors%s",
+        kind, total, valid, report.count, "" if dry_run else f", {inserted} inserted, {updated} updated",
+    )
+    return ImportDryRunResult(
+        valid=report.count == 0,
+        total_rows=total,
+        valid_rows=valid,
+        errors=report.inline,
+        preview=preview or None,
+        inserted_rows=inserted if applied else None,
+        updated_rows=updated if applied else None,
+        error_count=report.count,
+        error_report_id=report.report_id,
+    )
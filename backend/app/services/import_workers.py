@@ -0,0 +1,105 @@
+"""
+Synchronous imports in worker processes.
+
+The import endpoints run in FastAPI's threadpool, so the event loop keeps
+serving while a file is imported; but a thread validating and upserting a
+large file holds the GIL for most of the import and slows every other request
+of the process. With import_workers > 0 the upload is copied to a temporary
+file and imported by a spawned worker process with its own database session;
+the request thread only waits for the result. The plan input files of a
+bundle are validated in parallel, import_workers at a time.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Callable
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import IO, Any, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import BackgroundSessionLocal
+from app.schemas import ImportBundleResult, ImportDryRunResult
+from app.services.import_bundle import BUNDLE_ORDER, extract_bundle, load_bundle, product_skus, validate_bundle_file
+from app.services.import_pipeline import ImportKind, run_import
+from app.services.process_pools import SpawnPool
+
+logger = logging.getLogger(__name__)
+
+_COPY_BYTES = 1 << 20
+_T = TypeVar("_T")
+
+# Import workers open their own session (BackgroundSessionLocal in _import_file and the bundle steps)
+_pool = SpawnPool()
+
+
+def _run_all(fn: Callable[..., _T], calls: list[tuple[Any, ...]]) -> list[_T]:
+    """fn(*args) for each args: at once in the worker processes, or in turn in this thread."""
+    workers = settings.import_workers
+    if workers <= 0:
+        return [fn(*args) for args in calls]
+    pool = _pool.get(workers)
+    futures = [pool.submit(fn, *args) for args in calls]
+    try:
+        return [future.result() for future in futures]
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the next import starts a fresh pool
+        _pool.discard(pool)
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _import_file(kind: ImportKind, path: str, dry_run: bool) -> ImportDryRunResult:
+    with BackgroundSessionLocal() as db, open(path, "rb") as f:
+        return run_import(db, kind, f, dry_run)
+
+
+def import_upload(db: Session, kind: ImportKind, file: IO[bytes], dry_run: bool) -> ImportDryRunResult:
+    """run_import in a worker process, or on db in the calling thread when import_workers is 0."""
+    if settings.import_workers <= 0:
+        return run_import(db, kind, file, dry_run)
+    fd, path = tempfile.mkstemp(prefix="import_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(file, out, _COPY_BYTES)
+        return _run_all(_import_file, [(kind, path, dry_run)])[0]
+    finally:
+        os.unlink(path)
+
+
+def import_bundle_upload(upload: IO[bytes], dry_run: bool) -> ImportBundleResult:
+    """Validate a zip of dataset CSVs and, unless dry_run, load it in one transaction if every file is valid.
+
+    Products are validated first; the plan input files then in parallel, against
+    the products table and the bundle's products. Raises BundleError for a bad zip.
+    """
+    with tempfile.TemporaryDirectory(prefix="import_bundle_") as directory:
+        paths = extract_bundle(upload, Path(directory))
+        results: dict[ImportKind, ImportDryRunResult] = {}
+        skus = product_skus()
+        if "products" in paths:
+            results["products"], bundle_skus = _run_all(validate_bundle_file, [("products", paths["products"], skus)])[0]
+            skus |= bundle_skus
+        inputs = [kind for kind in BUNDLE_ORDER if kind in paths and kind != "products"]
+        checked = _run_all(validate_bundle_file, [(kind, paths[kind], skus) for kind in inputs])
+        results.update((kind, result) for kind, (result, _) in zip(inputs, checked))
+        valid = all(r.valid for r in results.values())
+        if valid and not dry_run:
+            results = _run_all(load_bundle, [(paths,)])[0]
+    return ImportBundleResult(
+        valid=valid,
+        applied=valid and not dry_run,
+        files={kind: results[kind] for kind in BUNDLE_ORDER if kind in results},
+    )
+
+
+def shutdown_import_workers() -> None:
+    # Requests in flight have finished by the time the app shuts down
+    _pool.shutdown(wait=True)
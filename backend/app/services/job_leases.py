@@ -0,0 +1,81 @@
+"""
+Leases on background jobs (plan_jobs, import_jobs) shared by several processes.
+
+A worker claims a QUEUED job with one conditional UPDATE that sets it RUNNING,
+claimed_by to this process's WORKER_ID and heartbeat_at to the database's
+clock, so exactly one claim succeeds. While the process lives, a heartbeat
+thread renews heartbeat_at of its RUNNING jobs every job_heartbeat_s; a
+RUNNING job whose heartbeat is older than job_lease_s lost its worker and may
+be recovered by any process. Every later write of a job by its worker is
+conditional on still holding the claim (owned), so a worker that lost its
+lease cannot overwrite a recovered job.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from collections.abc import Callable
+from datetime import timedelta
+from typing import Any
+
+from sqlalchemy import ColumnElement, and_, func, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import JobStatus
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_values() -> dict[str, Any]:
+    """Values that move a QUEUED job to RUNNING under this process's lease."""
+    return {"status": JobStatus.RUNNING, "claimed_by": WORKER_ID, "heartbeat_at": func.now()}
+
+
+def owned(model: Any) -> ColumnElement[bool]:
+    """The job is RUNNING under this process's lease."""
+    return and_(model.status == JobStatus.RUNNING, model.claimed_by == WORKER_ID)
+
+
+def renew(s: Session, model: Any) -> None:
+    """Renew this process's leases on its RUNNING jobs (not committed)."""
+    s.execute(update(model).where(owned(model)).values(heartbeat_at=func.now()))
+
+
+def lease_expired(model: Any) -> ColumnElement[bool]:
+    """The job is RUNNING but its worker stopped renewing the lease (or it predates leases)."""
+    cutoff = func.now() - timedelta(seconds=settings.job_lease_s)
+    return and_(model.status == JobStatus.RUNNING, or_(model.heartbeat_at.is_(None), model.heartbeat_at < cutoff))
+
+
+class Heartbeat:
+    """Thread calling beat every job_heartbeat_s: renew this process's leases and recover expired jobs."""
+
+    def __init__(self, name: str, beat: Callable[[], None]) -> None:
+        self._name = name
+        self._beat = beat
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(settings.job_heartbeat_s):
+            try:
+                self._beat()
+            except Exception:
+                logger.exception("%s heartbeat failed", self._name)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"{self._name}-heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
@@ -0,0 +1,125 @@
+"""
+Cached master-data list responses (products, warehouses, suppliers, lanes,
+planning policies).
+
+Every writer of a master-data table calls bump_versions inside its own
+transaction, which increments the table's counter in master_data_versions; the
+counter lives in the database so writes made by import workers or other
+processes are seen too. A list request reads the table's version (a primary
+key lookup) and serves the JSON body cached for that version and query, or
+queries and serializes the table and caches the result. Bodies carry a
+content-hash ETag and a request whose If-None-Match matches gets 304 Not
+Modified. Each process keeps the master_data_cache_entries most recently used
+responses.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Sequence
+from functools import cache
+from typing import Any, Literal, cast
+
+from fastapi import Request, Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Table, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import MasterDataVersion
+
+logger = logging.getLogger(__name__)
+
+MasterTable = Literal["products", "warehouses", "suppliers", "lanes", "planning_policies"]
+MASTER_TABLES: tuple[MasterTable, ...] = ("products", "warehouses", "suppliers", "lanes", "planning_policies")
+
+_CacheKey = tuple[MasterTable, tuple[tuple[str, Any], ...]]
+
+
+def bump_versions(db: Session, tables: Iterable[MasterTable]) -> None:
+    """Bump the version of each table (not committed; rides on the caller's transaction)."""
+    table = cast(Table, MasterDataVersion.__table__)
+    stmt = pg_insert(table).values([{"table_name": t, "version": 1} for t in sorted(set(tables))])
+    db.execute(stmt.on_conflict_do_update(index_elements=["table_name"], set_={"version": table.c.version + 1}))
+
+
+def table_version(db: Session, table: MasterTable) -> int:
+    """0 for a table never written through the app."""
+    return db.scalar(select(MasterDataVersion.version).where(MasterDataVersion.table_name == table)) or 0
+
+
+class ResponseCache:
+    """LRU of (etag, body) by table and query, each valid for one table version."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[_CacheKey, tuple[int, str, bytes]] = OrderedDict()
+
+    def get(self, key: _CacheKey, version: int) -> tuple[str, bytes] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key: _CacheKey, version: int, etag: str, body: bytes) -> None:
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[0] > version:
+                return  # a concurrent request already cached a newer version
+            self._entries[key] = (version, etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(settings.master_data_cache_entries, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+@cache
+def list_adapter(schema: type[BaseModel]) -> TypeAdapter[list[Any]]:
+    return TypeAdapter(list[schema])  # type: ignore[valid-type]
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def cached_list_response(
+    request: Request,
+    db: Session,
+    table: MasterTable,
+    schema: type[BaseModel],
+    load: Callable[[], Sequence[Any]],
+    **params: Any,
+) -> Response:
+    """load()'s rows as a JSON list of schema, from the cache while table's version is unchanged.
+
+    params are the query's filters, part of the cache key.
+    """
+    # Version first: rows loaded after it are at least that new, so nothing stale is cached under it
+    version = table_version(db, table)
+    key: _CacheKey = (table, tuple(sorted(params.items())))
+    cached = response_cache.get(key, version)
+    if cached is None:
+        adapter = list_adapter(schema)
+        body = adapter.dump_json(adapter.validate_python(load(), from_attributes=True))
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        response_cache.put(key, version, etag, body)
+    else:
+        etag, body = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
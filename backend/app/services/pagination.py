@@ -0,0 +1,70 @@
+"""
+Keyset (cursor) pagination for large result endpoints.
+
+A page is the first `limit` rows after the cursor in a total order whose last
+column is unique. The cursor is the sort key of the previous page's last row,
+JSON-encoded as an opaque URL-safe token and returned in the X-Next-Cursor
+response header (absent on the last page). Each page is an index range scan
+starting at the cursor, so page N costs the same as page 1, unlike OFFSET.
+Pages hold DEFAULT_PAGE_SIZE rows unless the request asks for up to
+MAX_PAGE_SIZE; full result sets are served by the export endpoints.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import logging
+from collections.abc import Callable, Sequence
+from datetime import date
+from typing import Any, TypeVar
+
+from sqlalchemy import ColumnElement, tuple_
+
+logger = logging.getLogger(__name__)
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 10000
+
+T = TypeVar("T")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, date):
+        return v.isoformat()
+    raise TypeError(f"Cannot encode {type(v).__name__} in a cursor")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), default=_json_default, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, types: Sequence[Callable[[Any], Any]]) -> tuple[Any, ...]:
+    """Parse a cursor back into typed values (types: one parser per sort column, e.g. date.fromisoformat)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError("wrong arity")
+        return tuple(parse(v) for parse, v in zip(types, values))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {token!r}") from e
+
+
+def keyset_filter(columns: Sequence[ColumnElement[Any]], values: Sequence[Any], descending: bool = False) -> ColumnElement[bool]:
+    """Row-value comparison (a, b, c) > (x, y, z); matches a composite index on the same columns."""
+    if descending:
+        return tuple_(*columns) < tuple_(*values)
+    return tuple_(*columns) > tuple_(*values)
+
+
+def paginate(rows: Sequence[T], limit: int, key: Callable[[T], Sequence[Any]]) -> tuple[list[T], str | None]:
+    """Trim a limit + 1 fetch to one page; the cursor is set only when another page exists."""
+    page = list(rows[:limit])
+    if len(rows) <= limit:
+        return page, None
+    return page, encode_cursor(key(page[-1]))
@@ -0,0 +1,101 @@
+"""
+Change tracking for incremental plan runs.
+
+Writers of snapshots, receipts, demand and planning policies call mark_dirty
+for the (sku, warehouse) keys they touched, inside their own transaction, which
+bumps each key's counter in plan_input_versions. Every plan run records the
+version of each key it considered in plan_run_input_versions; the next
+incremental run of the scenario recomputes only keys whose version moved and
+copies the rest forward from that run.
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Collection, Iterable, Mapping
+from itertools import islice
+from typing import cast
+
+from sqlalchemy import Table, TableClause, insert, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models import PlanInputVersion, PlanRunInputVersion
+from app.services.bulk_write import bulk_insert
+
+logger = logging.getLogger(__name__)
+
+_MARK_BATCH_SIZE = 1000
+
+Key = tuple[str, str]
+RUN_VERSION_COLUMNS = ("plan_run_id", "sku", "warehouse_code", "version")
+
+
+def mark_dirty(db: Session, keys: Iterable[Key]) -> None:
+    """Bump the input version of each key (not committed; rides on the caller's transaction)."""
+    # Sorted so concurrent writers lock version rows in the same order.
+    it = iter(sorted(set(keys)))
+    table = cast(Table, PlanInputVersion.__table__)
+    while batch := list(islice(it, _MARK_BATCH_SIZE)):
+        stmt = pg_insert(table).values(
+            [{"sku": sku, "warehouse_code": wh, "version": 1} for sku, wh in batch]
+        )
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_plan_input_versions_sku_wh",
+                set_={"version": table.c.version + 1},
+            )
+        )
+
+
+def current_versions(db: Session) -> dict[Key, int]:
+    v = PlanInputVersion
+    return {
+        (sku, wh): version
+        for sku, wh, version in db.execute(select(v.sku, v.warehouse_code, v.version)).tuples()
+    }
+
+
+def run_versions(db: Session, plan_run_id: int) -> dict[Key, int]:
+    v = PlanRunInputVersion
+    q = select(v.sku, v.warehouse_code, v.version).where(v.plan_run_id == plan_run_id)
+    return {(sku, wh): version for sku, wh, version in db.execute(q).tuples()}
+
+
+def changed_keys(previous: Mapping[Key, int], current: Mapping[Key, int]) -> set[Key]:
+    """Keys whose version differs between a run and now (untracked keys are version 0)."""
+    return {k for k in previous.keys() | current.keys() if previous.get(k, 0) != current.get(k, 0)}
+
+
+def record_run_versions(
+    db: Session,
+    plan_run_id: int,
+    keys: Iterable[Key],
+    versions: Mapping[Key, int],
+    target: TableClause | None = None,
+) -> None:
+    """Write plan_run_input_versions rows (into target, e.g. the run's staged partition)."""
+    bulk_insert(
+        db,
+        target if target is not None else cast(Table, PlanRunInputVersion.__table__),
+        RUN_VERSION_COLUMNS,
+        ((plan_run_id, sku, wh, versions.get((sku, wh), 0)) for sku, wh in sorted(set(keys))),
+    )
+
+
+def copy_forward(
+    db: Session,
+    table: Table,
+    columns: Collection[str],
+    base_run_id: int,
+    plan_run_id: int,
+    exclude: Collection[Key],
+    target: TableClause | None = None,
+) -> int:
+    """INSERT ... SELECT the base run's rows of table into plan_run_id (in target), skipping keys in exclude."""
+    src = [table.c[c] for c in columns if c != "plan_run_id"]
+    q = select(literal(plan_run_id), *src).where(table.c.plan_run_id == base_run_id)
+    if exclude:
+        q = q.where(tuple_(table.c.sku, table.c.warehouse_code).not_in(list(exclude)))
+    names = ["plan_run_id", *(c.name for c in src)]
+    into = target if target is not None else table
+    return db.execute(insert(into).from_select(names, q)).rowcount
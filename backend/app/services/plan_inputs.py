@@ -0,0 +1,160 @@
+"""
+Load run_plan inputs with the aggregation pushed down to Postgres.
+
+Only what the projection needs crosses the wire, as plain tuples:
+- latest snapshot per (sku, warehouse) at or before run_week (DISTINCT ON);
+- receipts summed per (week, sku, warehouse) inside each key's 53-week horizon;
+- demand summed per (week, sku, warehouse, type) that is either inside the
+  horizon or among the last max_forecast_window weeks of history.
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Collection, Iterable, Mapping
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import cast
+
+from sqlalchemy import Subquery, func, select, tuple_, union
+from sqlalchemy.orm import Session
+
+from app.models import DemandActual, DemandType, InventorySnapshotWeekly, PlanningPolicy, Receipt
+from app.services.planning_kernel import HORIZON_WEEKS
+
+logger = logging.getLogger(__name__)
+
+_HORIZON_DAYS = HORIZON_WEEKS * 7
+
+
+@dataclass
+class PlanInputs:
+    """Everything run_plan reads from the database, keyed the way the engine uses it."""
+    run_week: date
+    starting_inv: dict[tuple[str, str], tuple[date, Decimal]]
+    receipts: dict[tuple[date, str, str], Decimal]
+    demand_by_type: dict[tuple[date, str, str, DemandType], Decimal]
+    policy_by_key: dict[tuple[str, str], PlanningPolicy]
+
+
+def _latest_snapshots(run_week: date, keys: Collection[tuple[str, str]] | None) -> Subquery:
+    inv = InventorySnapshotWeekly
+    q = select(inv.sku, inv.warehouse_code, inv.week_start, inv.on_hand_qty).where(
+        inv.week_start <= run_week
+    )
+    if keys is not None:
+        q = q.where(tuple_(inv.sku, inv.warehouse_code).in_(list(keys)))
+    return (
+        q.distinct(inv.sku, inv.warehouse_code)
+        .order_by(inv.sku, inv.warehouse_code, inv.week_start.desc())
+        .subquery("latest")
+    )
+
+
+def _max_forecast_window(
+    policy_by_key: Mapping[tuple[str, str], PlanningPolicy], extra_windows: Iterable[int] = ()
+) -> int | None:
+    """Largest trailing window any policy (or override) uses; None when a window is unbounded (<= 0)."""
+    windows = [cast(int | None, p.forecast_window_weeks) or 8 for p in policy_by_key.values()]
+    windows.extend(extra_windows)
+    if any(w <= 0 for w in windows):
+        return None
+    return max(windows, default=8)
+
+
+def load_plan_inputs(
+    db: Session,
+    run_week: date,
+    keys: Collection[tuple[str, str]] | None = None,
+    forecast_windows: Iterable[int] = (),
+) -> PlanInputs:
+    """Load inputs for every key, or only for `keys` (incremental runs).
+
+    forecast_windows: extra trailing windows (scenario overrides) the history must cover.
+    """
+    policy_q = db.query(PlanningPolicy)
+    if keys is not None:
+        policy_q = policy_q.filter(
+            tuple_(PlanningPolicy.sku, PlanningPolicy.warehouse_code).in_(list(keys))
+        )
+    policies = policy_q.all()
+    policy_by_key: dict[tuple[str, str], PlanningPolicy] = {
+        (cast(str, p.sku), cast(str, p.warehouse_code)): p for p in policies
+    }
+    latest = _latest_snapshots(run_week, keys)
+
+    starting_inv: dict[tuple[str, str], tuple[date, Decimal]] = {}
+    for sku, wh_code, week, qty in db.execute(select(latest)).tuples():
+        starting_inv[(sku, wh_code)] = (week, qty or Decimal("0"))
+
+    r = Receipt
+    receipts_q = (
+        select(r.week_start, r.sku, r.warehouse_code, func.sum(r.qty))
+        .join(latest, (latest.c.sku == r.sku) & (latest.c.warehouse_code == r.warehouse_code))
+        .where(
+            r.week_start >= latest.c.week_start,
+            r.week_start < latest.c.week_start + _HORIZON_DAYS,
+        )
+        .group_by(r.week_start, r.sku, r.warehouse_code)
+    )
+    receipts: dict[tuple[date, str, str], Decimal] = {
+        (week, sku, wh_code): qty
+        for week, sku, wh_code, qty in db.execute(receipts_q).tuples()
+    }
+
+    d = DemandActual
+    on_key = (latest.c.sku == d.sku) & (latest.c.warehouse_code == d.warehouse_code)
+    history = (
+        select(
+            d.week_start,
+            d.sku,
+            d.warehouse_code,
+            d.demand_type,
+            func.sum(d.qty).label("qty"),
+            func.row_number()
+            .over(
+                partition_by=(d.sku, d.warehouse_code, d.demand_type),
+                order_by=d.week_start.desc(),
+            )
+            .label("rn"),
+        )
+        .join(latest, on_key)
+        .where(d.week_start <= run_week)
+        .group_by(d.week_start, d.sku, d.warehouse_code, d.demand_type)
+        .subquery("history")
+    )
+    max_window = _max_forecast_window(policy_by_key, forecast_windows)
+    history_q = select(
+        history.c.week_start,
+        history.c.sku,
+        history.c.warehouse_code,
+        history.c.demand_type,
+        history.c.qty,
+    )
+    if max_window is not None:
+        history_q = history_q.where(history.c.rn <= max_window)
+    horizon_q = (
+        select(d.week_start, d.sku, d.warehouse_code, d.demand_type, func.sum(d.qty))
+        .join(latest, on_key)
+        .where(
+            d.week_start >= latest.c.week_start,
+            d.week_start < latest.c.week_start + _HORIZON_DAYS,
+        )
+        .group_by(d.week_start, d.sku, d.warehouse_code, d.demand_type)
+    )
+    demand_by_type: dict[tuple[date, str, str, DemandType], Decimal] = {
+        (week, sku, wh_code, demand_type): qty
+        for week, sku, wh_code, demand_type, qty in db.execute(union(history_q, horizon_q)).tuples()
+    }
+
+    logger.info(
+        "Plan inputs for %s: %d snapshots, %d receipt weeks, %d demand weeks, %d policies",
+        run_week, len(starting_inv), len(receipts), len(demand_by_type), len(policy_by_key),
+    )
+    return PlanInputs(
+        run_week=run_week,
+        starting_inv=starting_inv,
+        receipts=receipts,
+        demand_by_type=demand_by_type,
+        policy_by_key=policy_by_key,
+    )
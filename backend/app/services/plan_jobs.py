@@ -0,0 +1,310 @@
+"""
+Background plan runs.
+
+A job is a plan_jobs row executed by a per-process thread pool. The worker
+claims a QUEUED row atomically, runs run_plan in its own session and writes
+stage progress through short separate sessions so it is visible while the
+run's transaction is still open. Cancelling sets cancel_requested; the worker
+raises PlanCancelled at the next progress checkpoint and rolls back, so a
+cancelled run leaves no plan_runs / projected_inventory / planned_orders rows.
+Only a user's cancel makes a job CANCELLED: stopping the pool (shutdown or
+redeploy) rolls running jobs back the same way but re-queues them, so they run
+again from the start on the next startup.
+
+Jobs are shared by every process using the database: a claim takes a lease
+(see job_leases), and a RUNNING job whose lease expired (its process died) is
+marked FAILED by whichever process notices first; its run had rolled back.
+Every process also picks up QUEUED jobs left over by a process that stopped
+before running them.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, cast
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import BackgroundSessionLocal, SessionLocal
+from app.models import JobStatus, PlanJob
+from app.services.job_leases import Heartbeat, claim_values, lease_expired, owned, renew
+from app.services.planning import PLAN_STAGES, PlanCancelled, run_plan
+
+logger = logging.getLogger(__name__)
+
+# Share of overall progress per stage; persisting dominates large runs.
+STAGE_WEIGHTS: dict[str, float] = {
+    "loading": 0.15,
+    "forecasting": 0.10,
+    "projecting": 0.25,
+    "persisting": 0.50,
+}
+_PROGRESS_MIN_INTERVAL_S = 0.5
+
+_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_cancel_events: dict[int, threading.Event] = {}
+_stopping = threading.Event()
+
+
+class _Stopped(Exception):
+    """The pool is shutting down; the job is rolled back and re-queued."""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _stopping.clear()
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.plan_job_workers), thread_name_prefix="plan-job"
+            )
+        return _executor
+
+
+def _cancel_event(job_id: int) -> threading.Event:
+    with _lock:
+        return _cancel_events.setdefault(job_id, threading.Event())
+
+
+def _overall_progress(stage: str, fraction: float) -> Decimal:
+    done = 0.0
+    for s in PLAN_STAGES:
+        if s == stage:
+            done += STAGE_WEIGHTS[s] * fraction
+            break
+        done += STAGE_WEIGHTS[s]
+    return Decimal(str(round(min(done, 1.0), 4)))
+
+
+def _update_job(job_id: int, values: dict[str, Any]) -> bool:
+    """Apply values to the job row in its own transaction, if this process still holds the job.
+
+    Returns whether the job should stop: cancel was requested or the job is no longer ours.
+    """
+    with SessionLocal() as s:
+        cancel = s.execute(
+            update(PlanJob)
+            .where(PlanJob.id == job_id, owned(PlanJob))
+            .values(values)
+            .returning(PlanJob.cancel_requested)
+        ).scalar()
+        s.commit()
+    return cancel is not False
+
+
+class _JobProgress:
+    """PlanProgress for one job: throttled progress writes, PlanCancelled on cancel, _Stopped on shutdown."""
+
+    def __init__(self, job_id: int, cancel: threading.Event) -> None:
+        self._job_id = job_id
+        self._cancel = cancel
+        self._stage: str | None = None
+        self._last = 0.0
+
+    def __call__(self, stage: str, fraction: float) -> None:
+        if self._cancel.is_set():
+            raise PlanCancelled()
+        if _stopping.is_set():
+            raise _Stopped()
+        now = time.monotonic()
+        if stage == self._stage and fraction < 1.0 and now - self._last < _PROGRESS_MIN_INTERVAL_S:
+            return
+        self._stage, self._last = stage, now
+        cancel = _update_job(
+            self._job_id,
+            {
+                "stage": stage,
+                "stage_progress": Decimal(str(round(fraction, 4))),
+                "progress": _overall_progress(stage, fraction),
+            },
+        )
+        if cancel:
+            self._cancel.set()
+            raise PlanCancelled()
+
+
+def _claim(job_id: int) -> tuple[str, date, bool] | None:
+    """QUEUED -> RUNNING under this process's lease, atomically; None if the job was cancelled or taken."""
+    with SessionLocal() as s:
+        claimed = s.execute(
+            update(PlanJob)
+            .where(
+                PlanJob.id == job_id,
+                PlanJob.status == JobStatus.QUEUED,
+                PlanJob.cancel_requested.is_(False),
+            )
+            .values(**claim_values(), started_at=datetime.now())
+            .returning(PlanJob.scenario_name, PlanJob.run_at, PlanJob.incremental)
+        ).first()
+        s.commit()
+    if claimed is None:
+        return None
+    return cast(str, claimed[0]), cast(date, claimed[1]), cast(bool, claimed[2])
+
+
+def _run_job(job_id: int) -> None:
+    claimed = _claim(job_id)
+    if claimed is None:
+        with _lock:
+            _cancel_events.pop(job_id, None)
+        return
+    scenario_name, run_at, incremental = claimed
+    cancel = _cancel_event(job_id)
+    db = BackgroundSessionLocal()
+    try:
+        plan_run = run_plan(
+            db,
+            scenario_name,
+            run_at=run_at,
+            progress=_JobProgress(job_id, cancel),
+            incremental=incremental,
+        )
+        _update_job(
+            job_id,
+            {
+                "status": JobStatus.SUCCEEDED,
+                "plan_run_id": plan_run.id,
+                "progress": Decimal("1"),
+                "finished_at": datetime.now(),
+            },
+        )
+        logger.info("Plan job %d succeeded: plan run %s", job_id, plan_run.id)
+    except Exception as e:  # noqa: BLE001 - job status records the failure
+        db.rollback()
+        # A cancel or stop can surface wrapped by the driver (e.g. raised inside COPY).
+        if isinstance(e, PlanCancelled) or cancel.is_set():
+            _update_job(job_id, {"status": JobStatus.CANCELLED, "finished_at": datetime.now()})
+            logger.info("Plan job %d cancelled", job_id)
+        elif isinstance(e, _Stopped) or _stopping.is_set():
+            _update_job(
+                job_id,
+                {
+                    "status": JobStatus.QUEUED,
+                    "claimed_by": None,
+                    "stage": None,
+                    "stage_progress": Decimal("0"),
+                    "progress": Decimal("0"),
+                    "started_at": None,
+                },
+            )
+            logger.info("Plan job %d stopped; it runs again on the next startup", job_id)
+        else:
+            logger.exception("Plan job %d failed", job_id)
+            _update_job(
+                job_id,
+                {"status": JobStatus.FAILED, "error": str(e), "finished_at": datetime.now()},
+            )
+    finally:
+        db.close()
+        with _lock:
+            _cancel_events.pop(job_id, None)
+
+
+def _enqueue(job_id: int) -> None:
+    _cancel_event(job_id)
+    _get_executor().submit(_run_job, job_id)
+
+
+def _recover(s: Session, queued_before: datetime | None) -> list[int]:
+    """Fail RUNNING jobs whose lease expired; QUEUED jobs (created before queued_before) not yet enqueued here.
+
+    Not committed.
+    """
+    s.execute(
+        update(PlanJob)
+        .where(lease_expired(PlanJob))
+        .values(status=JobStatus.FAILED, error="Interrupted: its server process stopped", finished_at=datetime.now())
+    )
+    q = s.query(PlanJob.id).filter(PlanJob.status == JobStatus.QUEUED, PlanJob.cancel_requested.is_(False))
+    if queued_before is not None:
+        q = q.filter(PlanJob.created_at < queued_before)
+    with _lock:
+        local = set(_cancel_events)
+    return [cast(int, job_id) for (job_id,) in q.order_by(PlanJob.id) if job_id not in local]
+
+
+def _heartbeat() -> None:
+    """Renew this process's leases; take over jobs of processes that stopped."""
+    with SessionLocal() as s:
+        renew(s, PlanJob)
+        queued = _recover(s, datetime.now() - timedelta(seconds=settings.job_lease_s))
+        s.commit()
+    for job_id in queued:
+        _enqueue(job_id)
+
+
+_heartbeat_thread = Heartbeat("plan-job", _heartbeat)
+
+
+def submit_plan_job(
+    db: Session, scenario_name: str, run_at: date, incremental: bool = False
+) -> PlanJob:
+    job = PlanJob(
+        scenario_name=scenario_name,
+        run_at=run_at,
+        incremental=incremental,
+        status=JobStatus.QUEUED,
+        stage_progress=Decimal("0"),
+        progress=Decimal("0"),
+        cancel_requested=False,
+        created_at=datetime.now(),
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    _enqueue(cast(int, job.id))
+    return job
+
+
+def cancel_plan_job(db: Session, job: PlanJob) -> PlanJob:
+    """Cancel a QUEUED job outright; ask a RUNNING one to stop at its next checkpoint."""
+    job_id = cast(int, job.id)
+    now = datetime.now()
+    queued = (
+        db.query(PlanJob)
+        .filter(PlanJob.id == job_id, PlanJob.status == JobStatus.QUEUED)
+        .update({"status": JobStatus.CANCELLED, "cancel_requested": True, "finished_at": now})
+    )
+    if not queued:
+        db.query(PlanJob).filter(PlanJob.id == job_id, PlanJob.status == JobStatus.RUNNING).update(
+            {"cancel_requested": True}
+        )
+        with _lock:
+            event = _cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def recover_plan_jobs() -> None:
+    """On startup: fail jobs whose process stopped, enqueue QUEUED ones and start renewing leases.
+
+    Jobs other live processes are running keep their lease; a QUEUED job enqueued by
+    several processes is run by the one whose claim succeeds.
+    """
+    with SessionLocal() as s:
+        queued = _recover(s, None)
+        s.commit()
+    for job_id in queued:
+        _enqueue(job_id)
+    _heartbeat_thread.start()
+
+
+def shutdown_plan_jobs() -> None:
+    """Stop the pool: queued futures are dropped, running jobs roll back; all stay QUEUED for the next startup."""
+    global _executor
+    _heartbeat_thread.stop()
+    with _lock:
+        executor, _executor = _executor, None
+        _stopping.set()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
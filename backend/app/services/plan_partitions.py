@@ -0,0 +1,146 @@
+"""
+Per-run partitions of the plan output tables.
+
+projected_inventory, projected_inventory_series, planned_orders and
+plan_run_input_versions are RANGE-partitioned on plan_run_id with one
+partition per run ([id, id + 1)); runs created before partitioning live in a
+single legacy partition. A run writes into a standalone table carrying the
+partition's CHECK constraint and attaches it just before commit, so the load
+does not lock the parent tables and indexes are built once over the loaded
+rows. Attaching a partition locks plan_runs against writes (for the foreign
+key), so a run holds no plan_runs row lock until then: its id comes from the
+sequence and its plan_runs row is inserted only when attaching, under a
+transaction advisory lock that serializes attaches. Purging a run detaches its partitions concurrently,
+which does not block readers of the parents, then drops them instead of
+deleting rows.
+
+Partitioning is created by migration 007; a database whose plan output tables
+were created unpartitioned fails require_partitioned_tables at startup.
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Sequence
+from typing import cast
+
+from sqlalchemy import Table, TableClause, column, table, text
+from sqlalchemy.orm import Session
+
+from app.database import background_engine
+from app.models import PlannedOrder, PlanRun, PlanRunInputVersion, ProjectedInventory, ProjectedInventorySeries
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES: tuple[Table, ...] = tuple(
+    cast(Table, m.__table__)
+    for m in (ProjectedInventory, ProjectedInventorySeries, PlannedOrder, PlanRunInputVersion)
+)
+
+# pg_advisory_xact_lock key serializing ATTACH PARTITION of plan output tables
+_ATTACH_LOCK_KEY = 0x706C616E  # "plan"
+
+
+class PlanOutputsNotPartitioned(RuntimeError):
+    pass
+
+
+def require_partitioned_tables(db: Session) -> None:
+    """Raise PlanOutputsNotPartitioned if a plan output table exists but is not partitioned."""
+    names = [t.name for t in PARTITIONED_TABLES]
+    plain = db.execute(
+        text(
+            "SELECT c.relname FROM pg_class c"
+            " LEFT JOIN pg_partitioned_table p ON p.partrelid = c.oid"
+            " WHERE c.relname = ANY(:names) AND c.relnamespace = 'public'::regnamespace AND p.partrelid IS NULL"
+        ),
+        {"names": names},
+    ).scalars().all()
+    if plain:
+        raise PlanOutputsNotPartitioned(
+            f"Plan output tables {', '.join(sorted(plain))} are not partitioned by plan_run_id, so plan runs "
+            "cannot attach their results. Run `alembic upgrade head` (migration 007 partitions them)."
+        )
+
+
+def partition_name(parent: str, plan_run_id: int) -> str:
+    return f"{parent}_r{int(plan_run_id)}"
+
+
+def partition_exists(db: Session, name: str) -> bool:
+    return db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar_one()
+
+
+def stage_run_partitions(db: Session, plan_run_id: int) -> dict[str, TableClause]:
+    """Create the run's (not yet attached) partition tables; returns parent name -> insert target."""
+    lo, hi = int(plan_run_id), int(plan_run_id) + 1
+    staged: dict[str, TableClause] = {}
+    for parent in PARTITIONED_TABLES:
+        name = partition_name(parent.name, plan_run_id)
+        if partition_exists(db, name):
+            # A fresh run id has no rows anywhere (FK), so this is an orphan left by a reset sequence.
+            db.execute(text(f"DROP TABLE {name}"))
+        db.execute(
+            text(
+                f"CREATE TABLE {name} (LIKE {parent.name} INCLUDING DEFAULTS, "
+                f"CHECK (plan_run_id >= {lo} AND plan_run_id < {hi}))"
+            )
+        )
+        staged[parent.name] = table(name, *(column(c.name) for c in parent.columns))
+    return staged
+
+
+def next_plan_run_id(db: Session) -> int:
+    """An id for a new run, taken from plan_runs' sequence without inserting (or locking) anything."""
+    return db.execute(text("SELECT nextval(pg_get_serial_sequence('plan_runs', 'id'))")).scalar_one()
+
+
+def attach_run_partitions(db: Session, plan_runs: Sequence[PlanRun]) -> None:
+    """Insert the runs' plan_runs rows and attach their staged tables.
+
+    The CHECK constraints let Postgres skip the validation scan. Holds the attach lock until
+    the caller's transaction ends; the caller must not have written plan_runs before.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _ATTACH_LOCK_KEY})
+    db.add_all(plan_runs)
+    db.flush()
+    for plan_run in plan_runs:
+        lo, hi = int(plan_run.id), int(plan_run.id) + 1
+        for parent in PARTITIONED_TABLES:
+            db.execute(
+                text(
+                    f"ALTER TABLE {parent.name} ATTACH PARTITION {partition_name(parent.name, lo)} "
+                    f"FOR VALUES FROM ({lo}) TO ({hi})"
+                )
+            )
+
+
+def detach_run_partitions(plan_run_id: int) -> None:
+    """Detach the run's attached partitions with DETACH ... CONCURRENTLY, each in its own transactions.
+
+    Unlike a plain DETACH or DROP, this takes no ACCESS EXCLUSIVE lock on the parent, so
+    readers of plan results are not blocked. It waits for transactions using the parent,
+    so the caller must not hold one open. A detach interrupted earlier is finalized.
+    """
+    with background_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for parent in PARTITIONED_TABLES:
+            name = partition_name(parent.name, plan_run_id)
+            pending = conn.execute(
+                text(
+                    "SELECT i.inhdetachpending FROM pg_inherits i"
+                    " WHERE i.inhrelid = to_regclass(:name) AND i.inhparent = to_regclass(:parent)"
+                ),
+                {"name": name, "parent": parent.name},
+            ).scalar()
+            if pending is None:
+                continue  # not attached (or no such partition)
+            mode = "FINALIZE" if pending else "CONCURRENTLY"
+            conn.execute(text(f"ALTER TABLE {parent.name} DETACH PARTITION {name} {mode}"))
+
+
+def drop_run_partitions(db: Session, plan_run_id: int) -> bool:
+    """Drop the run's (detached) partitions; False when the run predates partitioning (rows are in legacy)."""
+    names = [partition_name(p.name, plan_run_id) for p in PARTITIONED_TABLES]
+    existing = [n for n in names if partition_exists(db, n)]
+    for name in existing:
+        db.execute(text(f"DROP TABLE {name}"))
+    return bool(existing)
@@ -0,0 +1,245 @@
+"""
+Cache of plan result responses.
+
+A run's projected inventory and planned orders never change once run_plan has
+committed them, so a response for (run, endpoint, query) can be served again as
+is: from an in-process LRU bounded by plan_result_cache_mb, and, with
+plan_result_cache_dir set, from files there (bounded by
+plan_result_cache_disk_mb, shared by the processes using the directory).
+Exports are kept on disk only. Cached bodies carry a strong ETag (a hash of the
+body). Purging a run evicts its entries here and from the disk tier; since
+other processes' memory tiers still hold them, handlers check that the run
+exists (a plan_runs primary key lookup) before serving a hit and evict a
+missing run's entries. Clients may reuse a response for plan_result_max_age_s,
+then revalidate, so they too stop seeing a purged run.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+REVALIDATE = "no-cache"
+
+# (plan_run_id, endpoint, query params...)
+CacheKey = tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    etag: str
+    media_type: str
+    headers: dict[str, str] = field(default_factory=dict)
+    body: bytes | None = None  # in memory, or
+    path: Path | None = None  # on disk
+
+
+def _etag(digest: Any) -> str:
+    return f'"{digest.hexdigest()}"'
+
+
+def _discard(tmp: IO[bytes]) -> None:
+    tmp.close()
+    Path(tmp.name).unlink(missing_ok=True)
+
+
+def _key_name(key: CacheKey) -> str:
+    return hashlib.sha256(json.dumps(key[1:], default=str).encode()).hexdigest()
+
+
+class PlanResultCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[CacheKey, CachedResult] = OrderedDict()
+        self._bytes = 0
+
+    def _memory_limit(self) -> int:
+        return max(settings.plan_result_cache_mb, 0) << 20
+
+    def get_memory(self, key: CacheKey) -> CachedResult | None:
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            return result
+
+    def _put_memory(self, key: CacheKey, result: CachedResult) -> None:
+        assert result.body is not None
+        size = len(result.body)
+        limit = self._memory_limit()
+        if not limit or size > limit // 4:
+            return  # one large response must not flush the rest
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None and old.body is not None:
+                self._bytes -= len(old.body)
+            self._entries[key] = result
+            self._bytes += size
+            while self._bytes > limit:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body or b"")
+
+    def _disk_base(self, key: CacheKey) -> Path | None:
+        """<dir>/<plan_run_id>/<hash of the rest of the key>, without suffix; None without a disk tier."""
+        if not settings.plan_result_cache_dir:
+            return None
+        return Path(settings.plan_result_cache_dir) / str(key[0]) / _key_name(key)
+
+    def get_disk(self, key: CacheKey) -> CachedResult | None:
+        """The entry from the disk tier, touched for LRU; small bodies are read and also kept in memory."""
+        base = self._disk_base(key)
+        if base is None:
+            return None
+        path = base.with_suffix(".bin")
+        try:
+            meta = json.loads(base.with_suffix(".json").read_text())
+            os.utime(path)
+            if path.stat().st_size > self._memory_limit() // 4:
+                return CachedResult(meta["etag"], meta["media_type"], meta["headers"], path=path)
+            result = CachedResult(meta["etag"], meta["media_type"], meta["headers"], body=path.read_bytes())
+        except (OSError, ValueError, KeyError):
+            return None
+        self._put_memory(key, result)
+        return result
+
+    def get(self, key: CacheKey) -> CachedResult | None:
+        return self.get_memory(key) or self.get_disk(key)
+
+    async def lookup(self, key: CacheKey) -> CachedResult | None:
+        """get for async handlers: the disk tier is read in the threadpool."""
+        result = self.get_memory(key)
+        if result is None and settings.plan_result_cache_dir:
+            result = await run_in_threadpool(self.get_disk, key)
+        return result
+
+    def put(self, key: CacheKey, body: bytes, media_type: str, headers: dict[str, str] | None = None) -> CachedResult:
+        result = CachedResult(_etag(hashlib.blake2b(body, digest_size=16)), media_type, headers or {}, body=body)
+        self._put_memory(key, result)
+        for _ in self.tee(key, iter([body]), media_type, result.headers):
+            pass
+        return result
+
+    async def store(self, key: CacheKey, body: bytes, media_type: str, headers: dict[str, str] | None = None) -> CachedResult:
+        """put for async handlers: the disk tier is written in the threadpool."""
+        if not settings.plan_result_cache_dir:
+            return self.put(key, body, media_type, headers)
+        return await run_in_threadpool(self.put, key, body, media_type, headers)
+
+    def tee(
+        self, key: CacheKey, chunks: Iterator[str | bytes], media_type: str, headers: dict[str, str]
+    ) -> Iterator[str | bytes]:
+        """Yield chunks while writing them to the disk tier; the file is kept only if every chunk was yielded.
+
+        A failure to write the file only stops caching, never the response.
+        """
+        base = self._disk_base(key)
+        tmp: IO[bytes] | None = None
+        if base is not None:
+            try:
+                base.parent.mkdir(parents=True, exist_ok=True)
+                tmp = tempfile.NamedTemporaryFile(dir=base.parent, suffix=".tmp", delete=False)
+            except OSError as e:
+                logger.warning("Plan result cache: cannot write to %s: %s", base.parent, e)
+        if tmp is None or base is None:
+            yield from chunks
+            return
+        digest = hashlib.blake2b(digest_size=16)
+        try:
+            for chunk in chunks:
+                if tmp is not None:
+                    data = chunk.encode() if isinstance(chunk, str) else chunk
+                    try:
+                        tmp.write(data)
+                        digest.update(data)
+                    except OSError as e:
+                        logger.warning("Plan result cache: cannot write %s: %s", tmp.name, e)
+                        _discard(tmp)
+                        tmp = None
+                yield chunk
+        except BaseException:
+            # Includes GeneratorExit when the client goes away mid-download
+            if tmp is not None:
+                _discard(tmp)
+            raise
+        if tmp is None:
+            return
+        try:
+            tmp.close()
+            meta = {"etag": _etag(digest), "media_type": media_type, "headers": headers}
+            base.with_suffix(".json").write_text(json.dumps(meta))
+            os.replace(tmp.name, base.with_suffix(".bin"))
+        except OSError as e:
+            logger.warning("Plan result cache: cannot store %s: %s", base, e)
+            _discard(tmp)
+            return
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used files until the disk tier fits plan_result_cache_disk_mb."""
+        if not settings.plan_result_cache_dir:
+            return
+        directory = Path(settings.plan_result_cache_dir)
+        files = []
+        for path in directory.glob("*/*.bin"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        limit = max(settings.plan_result_cache_disk_mb, 0) << 20
+        for _, size, path in sorted(files):
+            if total <= limit:
+                break
+            path.unlink(missing_ok=True)
+            path.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
+
+    def evict_run(self, plan_run_id: int) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == plan_run_id]:
+                self._bytes -= len(self._entries.pop(key).body or b"")
+        if settings.plan_result_cache_dir:
+            shutil.rmtree(Path(settings.plan_result_cache_dir) / str(plan_run_id), ignore_errors=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+plan_results = PlanResultCache()
+
+
+def cached_response(request: Request, result: CachedResult, cache_control: str | None = None) -> Response:
+    """result as a response, or 304 Not Modified when the request's If-None-Match has its ETag.
+
+    cache_control defaults to private caching for plan_result_max_age_s.
+    """
+    if cache_control is None:
+        cache_control = f"private, max-age={settings.plan_result_max_age_s}"
+    headers = {**result.headers, "ETag": result.etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and any(t.strip().removeprefix("W/") in (result.etag, "*") for t in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    if result.body is not None:
+        return Response(result.body, media_type=result.media_type, headers=headers)
+    assert result.path is not None
+    return FileResponse(result.path, media_type=result.media_type, headers=headers)
@@ -0,0 +1,105 @@
+"""
+Plan-run retention and purge.
+
+purge_plan_run detaches a run's output partitions concurrently and drops them
+(catalog operations, no dead tuples) and deletes the plan_runs row; runs that
+predate partitioning fall back to indexed DELETEs on the legacy partition. With
+plan_run_retention_days set, a background thread purges runs older than the
+retention window every plan_run_purge_interval_s, always keeping each
+scenario's latest plan_run_retention_keep_latest runs. A purged run's cached
+responses are evicted once the purge commits.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import date, timedelta
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import BackgroundSessionLocal
+from app.models import PlanJob, PlanRun
+from app.services.plan_partitions import PARTITIONED_TABLES, detach_run_partitions, drop_run_partitions
+from app.services.plan_result_cache import plan_results
+
+logger = logging.getLogger(__name__)
+
+_stop = threading.Event()
+_thread: threading.Thread | None = None
+
+
+def purge_plan_run(db: Session, plan_run_id: int) -> None:
+    """Remove a run and all of its outputs (committed by the caller).
+
+    The run's partitions are detached first, in their own transactions: db must not have read
+    the plan output tables in its open transaction. Should the caller roll back, the run stays
+    without results and purging it again drops the detached tables.
+    """
+    detach_run_partitions(plan_run_id)
+    db.execute(update(PlanJob).where(PlanJob.plan_run_id == plan_run_id).values(plan_run_id=None))
+    db.execute(
+        update(PlanRun).where(PlanRun.base_plan_run_id == plan_run_id).values(base_plan_run_id=None)
+    )
+    if not drop_run_partitions(db, plan_run_id):
+        for t in PARTITIONED_TABLES:
+            db.execute(t.delete().where(t.c.plan_run_id == plan_run_id))
+    db.query(PlanRun).filter(PlanRun.id == plan_run_id).delete()
+    event.listen(db, "after_commit", lambda _: plan_results.evict_run(plan_run_id), once=True)
+
+
+def expired_plan_runs(db: Session, retention_days: int, keep_latest: int, today: date) -> list[int]:
+    """Runs created before today - retention_days, other than each scenario's newest keep_latest."""
+    rank = (
+        func.row_number()
+        .over(partition_by=PlanRun.scenario_name, order_by=PlanRun.id.desc())
+        .label("rank")
+    )
+    ranked = select(PlanRun.id, PlanRun.created_at, rank).subquery()
+    q = (
+        select(ranked.c.id)
+        .where(ranked.c.created_at < today - timedelta(days=retention_days), ranked.c.rank > keep_latest)
+        .order_by(ranked.c.id)
+    )
+    return list(db.execute(q).scalars())
+
+
+def purge_expired_plan_runs(
+    db: Session, retention_days: int | None = None, today: date | None = None
+) -> list[int]:
+    """Purge expired runs one commit each, so a failure leaves earlier purges in place."""
+    days = settings.plan_run_retention_days if retention_days is None else retention_days
+    if days <= 0:
+        return []
+    expired = expired_plan_runs(db, days, settings.plan_run_retention_keep_latest, today or date.today())
+    for plan_run_id in expired:
+        purge_plan_run(db, plan_run_id)
+        db.commit()
+    if expired:
+        logger.info("Purged %d plan runs older than %d days", len(expired), days)
+    return expired
+
+
+def _purge_loop() -> None:
+    while not _stop.wait(settings.plan_run_purge_interval_s):
+        try:
+            with BackgroundSessionLocal() as db:
+                purge_expired_plan_runs(db)
+        except Exception:
+            logger.exception("Scheduled plan run purge failed")
+
+
+def start_purge_scheduler() -> None:
+    global _thread
+    if settings.plan_run_retention_days <= 0 or _thread is not None:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_purge_loop, name="plan-run-purge", daemon=True)
+    _thread.start()
+
+
+def stop_purge_scheduler() -> None:
+    global _thread
+    _stop.set()
+    _thread = None
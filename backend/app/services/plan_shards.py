@@ -0,0 +1,78 @@
+"""
+Multi-process execution of the projection kernel.
+
+Keys are independent once inputs are loaded, so KernelInputs is split into
+shards by a stable hash of (sku, warehouse_code), each shard's arrays are
+projected in a worker process and the results are scattered back into the
+original key order. Output is therefore identical to project() on the whole
+input, whatever the shard count.
+"""
+from __future__ import annotations
+
+import logging
+import zlib
+from collections.abc import Callable, Sequence
+from concurrent.futures import Future, as_completed
+
+import numpy as np
+
+from app.config import settings
+from app.services.planning_kernel import (
+    IntArray,
+    KernelInputs,
+    KernelResult,
+    merge_results,
+    project,
+    select_rows,
+)
+from app.services.process_pools import SpawnPool
+
+logger = logging.getLogger(__name__)
+
+_pool = SpawnPool()
+
+
+def shard_of(key: tuple[str, str], n_shards: int) -> int:
+    """Stable across processes and runs (unlike hash() on str)."""
+    sku, warehouse_code = key
+    return zlib.crc32(f"{sku}\x1f{warehouse_code}".encode()) % n_shards
+
+
+def shard_rows(keys: Sequence[tuple[str, str]], n_shards: int) -> list[IntArray]:
+    """Row indices of keys per shard, ascending; empty shards are dropped."""
+    shard = np.fromiter((shard_of(k, n_shards) for k in keys), dtype=np.int64, count=len(keys))
+    parts = [np.flatnonzero(shard == s) for s in range(n_shards)]
+    return [rows.astype(np.int64) for rows in parts if rows.size]
+
+
+def project_sharded(
+    inp: KernelInputs,
+    workers: int | None = None,
+    on_shard_done: Callable[[float], None] | None = None,
+) -> KernelResult:
+    """project() across `workers` processes; in-process when sharding would not pay off."""
+    workers = settings.plan_workers if workers is None else workers
+    n = len(inp.keys)
+    if workers <= 1 or n < max(settings.plan_shard_min_keys, 1):
+        return project(inp)
+
+    shards = shard_rows(inp.keys, workers)
+    pool = _pool.get(workers)
+    futures: dict[Future[KernelResult], IntArray] = {
+        pool.submit(project, select_rows(inp, rows)): rows for rows in shards
+    }
+    parts: list[tuple[IntArray, KernelResult]] = []
+    try:
+        for future in as_completed(futures):
+            parts.append((futures[future], future.result()))
+            if on_shard_done is not None:
+                on_shard_done(len(parts) / len(shards))
+    finally:
+        for future in futures:
+            future.cancel()
+    logger.info("Projected %d keys in %d shards on %d workers", n, len(shards), workers)
+    return merge_results(n, parts)
+
+
+def shutdown_plan_shards() -> None:
+    _pool.shutdown()
@@ -0,0 +1,170 @@
+"""
+Projection storage layouts.
+
+"rows" writes projected_inventory, one row per (run, sku, warehouse, week).
+"series" writes projected_inventory_series, one row per (run, sku, warehouse)
+whose array columns hold the HORIZON_WEEKS consecutive weeks from first_week;
+about 53x fewer rows and index entries. PlanRun.projection_storage records the
+layout of each run, and readers unpack series rows into the same per-week
+shape the rows layout returns.
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterator, Sequence
+from datetime import date
+from decimal import Decimal
+from typing import Any, TypedDict, cast
+
+from sqlalchemy import Select, Table, func, select, true, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ProjectedInventory, ProjectedInventorySeries
+from app.services.pagination import keyset_filter
+from app.services.planning_kernel import (
+    HORIZON_WEEKS,
+    PROJECTED_COLUMNS,
+    WOC_DECIMALS,
+    KernelInputs,
+    KernelResult,
+    from_scaled,
+)
+
+logger = logging.getLogger(__name__)
+
+STORAGE_ROWS = "rows"
+STORAGE_SERIES = "series"
+
+SERIES_COLUMNS = (
+    "plan_run_id",
+    "sku",
+    "warehouse_code",
+    "first_week",
+    "start_qty",
+    "receipts_qty",
+    "demand_qty",
+    "projected_qty",
+    "weeks_of_cover",
+    "stockout",
+)
+
+
+class ProjectedWeek(TypedDict):
+    """One unpacked week; same fields as a projected_inventory row."""
+    id: int
+    plan_run_id: int
+    week_start: date
+    sku: str
+    warehouse_code: str
+    start_qty: Decimal
+    receipts_qty: Decimal
+    demand_qty: Decimal
+    projected_qty: Decimal
+    weeks_of_cover: Decimal | None
+    stockout: bool
+
+
+def projection_table(storage: str) -> tuple[Table, tuple[str, ...]]:
+    if storage == STORAGE_SERIES:
+        return cast(Table, ProjectedInventorySeries.__table__), SERIES_COLUMNS
+    return cast(Table, ProjectedInventory.__table__), PROJECTED_COLUMNS
+
+
+def iter_series_rows(
+    inp: KernelInputs, res: KernelResult, plan_run_id: int
+) -> Iterator[tuple[Any, ...]]:
+    """Yield projected_inventory_series rows (SERIES_COLUMNS order) in key order."""
+    for i, (sku, wh_code) in enumerate(inp.keys):
+        yield (
+            plan_run_id,
+            sku,
+            wh_code,
+            inp.snapshot_weeks[i],
+            [from_scaled(v) for v in res.start_qty[i].tolist()],
+            [from_scaled(v) for v in res.receipts_qty[i].tolist()],
+            [from_scaled(v) for v in res.demand_qty[i].tolist()],
+            [from_scaled(v) for v in res.end_qty[i].tolist()],
+            [from_scaled(v, WOC_DECIMALS) for v in res.weeks_of_cover[i].tolist()],
+            res.stockout[i].tolist(),
+        )
+
+
+def _unnested_series(plan_run_id: int, with_ids: bool, series: Any = None) -> Select[Any]:
+    """One row per week of the run's series rows, or of series (a subquery of them) when given."""
+    s = series if series is not None else cast(Table, ProjectedInventorySeries.__table__)
+    steps = (
+        func.generate_series(1, func.cardinality(s.c.projected_qty))
+        .table_valued("j")
+        .render_derived(name="steps")
+        .lateral()
+    )
+    j = steps.c.j
+    week_start = (s.c.first_week + (j - 1) * 7).label("week_start")
+    # Ids are unique within the run: series row id x week offset.
+    ids = [(s.c.id * HORIZON_WEEKS + j - 1).label("id"), s.c.plan_run_id] if with_ids else []
+    return (
+        select(
+            *ids,
+            week_start,
+            s.c.sku,
+            s.c.warehouse_code,
+            s.c.start_qty[j].label("start_qty"),
+            s.c.receipts_qty[j].label("receipts_qty"),
+            s.c.demand_qty[j].label("demand_qty"),
+            s.c.projected_qty[j].label("projected_qty"),
+            s.c.weeks_of_cover[j].label("weeks_of_cover"),
+            s.c.stockout[j].label("stockout"),
+        )
+        .select_from(s.join(steps, true()))
+        .where(s.c.plan_run_id == plan_run_id)
+    )
+
+
+async def series_weeks(
+    db: AsyncSession,
+    plan_run_id: int,
+    sku: str | None = None,
+    warehouse_code: str | None = None,
+    week_start: date | None = None,
+    after: Sequence[Any] | None = None,
+    limit: int | None = None,
+) -> list[ProjectedWeek]:
+    """Unpacked weeks of a series-stored run, ordered by (sku, warehouse_code, week_start).
+
+    after/limit select a keyset page: rows whose (sku, warehouse_code, week_start) sorts after `after`.
+    The keyset is applied to the series rows first, over the (plan_run_id, sku, warehouse_code)
+    unique index, so a page unnests only the few series it covers, whatever the run's size.
+    """
+    s = cast(Table, ProjectedInventorySeries.__table__)
+    series = select(s).where(s.c.plan_run_id == plan_run_id)
+    if sku:
+        series = series.where(s.c.sku == sku)
+    if warehouse_code:
+        series = series.where(s.c.warehouse_code == warehouse_code)
+    if after is not None:
+        series = series.where(tuple_(s.c.sku, s.c.warehouse_code) >= tuple_(after[0], after[1]))
+    if limit is not None:
+        # Every series row holds HORIZON_WEEKS weeks; +1 for the series the cursor is inside
+        series = series.order_by(s.c.sku, s.c.warehouse_code).limit(-(-limit // HORIZON_WEEKS) + 1)
+    q = _unnested_series(plan_run_id, with_ids=True, series=series.subquery("s"))
+    c = q.selected_columns
+    if week_start is not None:
+        q = q.where(c.week_start == week_start)
+    order = (c.sku, c.warehouse_code, c.week_start)
+    if after is not None:
+        q = q.where(keyset_filter(order, after))
+    q = q.order_by(*order)
+    if limit is not None:
+        q = q.limit(limit)
+    return [cast(ProjectedWeek, dict(row._mapping)) for row in await db.execute(q)]
+
+
+def series_weeks_select(plan_run_id: int) -> Select[Any]:
+    """Unpack a series-stored run in SQL: one row per week (week_start, sku, warehouse_code,
+    start_qty, receipts_qty, demand_qty, projected_qty, weeks_of_cover, stockout), in rows-layout order.
+
+    Lets callers stream a series run from a server-side cursor instead of unpacking it in memory.
+    """
+    q = _unnested_series(plan_run_id, with_ids=False)
+    c = q.selected_columns
+    return q.order_by(c.week_start, c.sku, c.warehouse_code)
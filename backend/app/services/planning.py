@@ -6,33 +6,87 @@ Weekly supply planning logic (corrected):
 - WOS_TARGET: order to reach target weeks of cover.
 - ROP: order_qty = ROP - position when position < ROP; ROP = (avg_weekly_demand * lt_weeks_int) + safety_stock_qty.
 - Lead time: ceil(sum(components)) weeks to arrival.
+Projection and order sizing run column-wise over (key x week) arrays in
+app.services.planning_kernel.
+Incremental runs recompute only keys whose inputs changed since the scenario's
+previous run for the same week (app.services.plan_changes) and copy the rest.
 """
 from __future__ import annotations
 
 import logging
 import math
-from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
 from datetime import date, timedelta
 from decimal import Decimal
-from typing import Any, cast
+from typing import TypeVar, cast
 
+from sqlalchemy import Table, TableClause
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.models import (
-    DemandActual,
     DemandType,
-    InventorySnapshotWeekly,
     PlannedOrder,
     PlanRun,
+    PlanRunInputVersion,
     PlanningMode,
     PlanningPolicy,
-    ProjectedInventory,
-    Receipt,
     SafetyStockMethod,
 )
+from app.schemas import ScenarioOverrides
+from app.services.bulk_write import bulk_insert
+from app.services.demand_history import DemandHistoryIndex
+from app.services.plan_changes import (
+    RUN_VERSION_COLUMNS,
+    Key,
+    changed_keys,
+    copy_forward,
+    current_versions,
+    record_run_versions,
+    run_versions,
+)
+from app.services.plan_inputs import load_plan_inputs
+from app.services.plan_partitions import attach_run_partitions, next_plan_run_id, stage_run_partitions
+from app.services.plan_shards import project_sharded
+from app.services.plan_storage import STORAGE_SERIES, iter_series_rows, projection_table
+from app.services.planning_kernel import (
+    HORIZON_WEEKS,
+    PLANNED_ORDER_COLUMNS,
+    KernelInputs,
+    KernelResult,
+    PolicyParams,
+    build_kernel_inputs,
+    iter_planned_order_rows,
+    iter_projected_rows,
+    with_policies,
+)
 
 logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+# Progress callback: (stage, fraction of that stage done). Stages run in PLAN_STAGES order.
+PlanProgress = Callable[[str, float], None]
+PLAN_STAGES = ("loading", "forecasting", "projecting", "persisting")
+_PROGRESS_EVERY_ROWS = 50_000
+
+
+class PlanCancelled(Exception):
+    """Raised from a PlanProgress callback to abort run_plan before it commits."""
+
+
+def _no_progress(stage: str, fraction: float) -> None:
+    return None
+
+
+def _with_progress(
+    rows: Iterable[_T], total: int, stage: str, progress: PlanProgress
+) -> Iterator[_T]:
+    for n, row in enumerate(rows, start=1):
+        if n % _PROGRESS_EVERY_ROWS == 0:
+            progress(stage, min(n / total, 1.0) if total else 1.0)
+        yield row
+
 
 def _monday_before(d: date) -> date:
     """Return Monday of the week containing d (ISO week)."""
@@ -43,220 +97,289 @@ def _next_monday(d: date) -> date:
     return _monday_before(d) + timedelta(days=7)
 
 
-def run_plan(db: Session, scenario_name: str, run_at: date | None = None) -> PlanRun:
+def _policy_params(policy: PlanningPolicy) -> PolicyParams:
+    lt_prod = float(cast(Decimal | None, policy.lead_time_production_weeks) or 0)
+    lt_slot = float(cast(Decimal | None, policy.lead_time_slot_wait_weeks) or 0)
+    lt_haul = float(cast(Decimal | None, policy.lead_time_haulage_weeks) or 0)
+    lt_put = float(cast(Decimal | None, policy.lead_time_putaway_weeks) or 0)
+    lt_pad = float(cast(Decimal | None, policy.lead_time_padding_weeks) or 0)
+    total_lt_float = lt_prod + lt_slot + lt_haul + lt_put + lt_pad
+    return PolicyParams(
+        mode=cast(PlanningMode | None, policy.mode) or PlanningMode.WOS_TARGET,
+        target_weeks=float(cast(Decimal | None, policy.target_weeks) or 4),
+        safety_stock_method=cast(SafetyStockMethod | None, policy.safety_stock_method)
+        or SafetyStockMethod.WEEKS,
+        safety_stock_weeks=float(cast(Decimal | None, policy.safety_stock_weeks) or 0),
+        forecast_window_weeks=cast(int | None, policy.forecast_window_weeks) or 8,
+        lead_time_weeks=max(0, math.ceil(total_lt_float)),
+        include_samples=cast(bool, getattr(policy, "include_samples", True)),
+    )
+
+
+def _forecasts(
+    history: DemandHistoryIndex,
+    keys: Sequence[Key],
+    params: Mapping[Key, PolicyParams],
+    run_week: date,
+) -> tuple[dict[Key, Decimal], dict[Key, Decimal]]:
+    """Trailing-mean customer and samples forecasts per key over each key's forecast window."""
+    forecast_customer: dict[Key, Decimal] = {}
+    forecast_samples: dict[Key, Decimal] = {}
+    for (sku, wh_code) in keys:
+        n = params[(sku, wh_code)].forecast_window_weeks
+        forecast_customer[(sku, wh_code)] = history.trailing_mean(
+            sku, wh_code, DemandType.CUSTOMER, n, run_week
+        )
+        forecast_samples[(sku, wh_code)] = history.trailing_mean(
+            sku, wh_code, DemandType.SAMPLES, n, run_week
+        )
+    return forecast_customer, forecast_samples
+
+
+def _persist_projection(
+    db: Session,
+    inp: KernelInputs,
+    result: KernelResult,
+    plan_run_id: int,
+    storage: str,
+    targets: Mapping[str, TableClause],
+    report: PlanProgress,
+) -> None:
+    """Write the run's projection and planned orders into its staged partitions (targets)."""
+    table, columns = projection_table(storage)
+    if storage == STORAGE_SERIES:
+        rows, total = iter_series_rows(inp, result, plan_run_id), len(inp.keys)
+    else:
+        rows, total = iter_projected_rows(inp, result, plan_run_id), len(inp.keys) * HORIZON_WEEKS
+    bulk_insert(db, targets[table.name], columns, _with_progress(rows, total, "persisting", report))
+    bulk_insert(
+        db,
+        targets[PlannedOrder.__tablename__],
+        PLANNED_ORDER_COLUMNS,
+        iter_planned_order_rows(inp, result, plan_run_id),
+    )
+
+
+def _incremental_base(
+    db: Session, scenario_name: str, run_week: date, versions: dict[Key, int]
+) -> tuple[PlanRun, set[Key]] | None:
+    """The scenario's latest run and the keys changed since, or None when a full run is needed."""
+    base = (
+        db.query(PlanRun)
+        .filter(PlanRun.scenario_name == scenario_name)
+        .order_by(PlanRun.id.desc())
+        .first()
+    )
+    if base is None or _monday_before(cast(date, base.run_at)) != run_week:
+        logger.info("Incremental plan for %s: no previous run for week %s, running in full", scenario_name, run_week)
+        return None
+    if base.projection_storage != settings.plan_projection_storage:
+        logger.info("Incremental plan for %s: run %s uses %s storage, running in full", scenario_name, base.id, base.projection_storage)
+        return None
+    base_versions = run_versions(db, cast(int, base.id))
+    if not base_versions:
+        logger.info("Incremental plan for %s: run %s has no input versions, running in full", scenario_name, base.id)
+        return None
+    dirty = changed_keys(base_versions, versions)
+    if len(dirty) > settings.plan_incremental_max_dirty_ratio * len(base_versions):
+        logger.info("Incremental plan for %s: %d of %d keys changed, running in full", scenario_name, len(dirty), len(base_versions))
+        return None
+    return base, dirty
+
+
+def run_plan(
+    db: Session,
+    scenario_name: str,
+    run_at: date | None = None,
+    progress: PlanProgress | None = None,
+    incremental: bool = False,
+) -> PlanRun:
+    """Project every (sku, warehouse) with a policy and a snapshot; commits one PlanRun.
+
+    progress is called at stage boundaries and while persisting; it may raise
+    PlanCancelled, in which case nothing has been committed and the caller rolls back.
+    With incremental, keys unchanged since the scenario's previous run of the same
+    week are copied from it; otherwise (or when that is not possible) all keys are projected.
+    """
     if run_at is None:
         run_at = date.today()
     run_week = _monday_before(run_at)
+    report = progress or _no_progress
+    storage = settings.plan_projection_storage
+
+    # 1-3) Starting snapshots, receipts and demand, aggregated in the database.
+    # Versions are read first: a write landing after this is picked up by the next run.
+    report("loading", 0.0)
+    versions = current_versions(db)
+    found = _incremental_base(db, scenario_name, run_week, versions) if incremental else None
+    base, dirty = found if found is not None else (None, None)
+    inputs = load_plan_inputs(db, run_week, keys=dirty)
+    keys = sorted(set(inputs.policy_by_key.keys()) & set(inputs.starting_inv.keys()))
+    params = {k: _policy_params(inputs.policy_by_key[k]) for k in keys}
 
-    # 1) Starting snapshot per (sku, warehouse): max(week_start) where week_start <= run_week
-    all_inv = (
-        db.query(InventorySnapshotWeekly)
-        .filter(InventorySnapshotWeekly.week_start <= run_week)
-        .all()
+    # 4) Forecast: history_weeks = demand where week_start <= run_week; trailing mean = last forecast_window_weeks
+    report("forecasting", 0.0)
+    history = DemandHistoryIndex.from_demand_by_type(inputs.demand_by_type)
+    forecast_customer, forecast_samples = _forecasts(history, keys, params, run_week)
+
+    plan_run_id = next_plan_run_id(db)
+    plan_run = PlanRun(
+        id=plan_run_id,
+        scenario_name=scenario_name,
+        run_at=run_at,
+        created_at=run_at,
+        base_plan_run_id=base.id if base is not None else None,
+        projection_storage=storage,
     )
-    latest_week_per_key: dict[tuple[str, str], date] = {}
-    starting_inv: dict[tuple[str, str], tuple[date, Decimal]] = {}
-    for row in all_inv:
-        sku_val = cast(str, row.sku)
-        wh_val = cast(str, row.warehouse_code)
-        key = (sku_val, wh_val)
-        ws = cast(date, row.week_start)
-        qty_val = cast(Decimal | None, row.on_hand_qty) or Decimal("0")
-        if key not in latest_week_per_key or ws > latest_week_per_key[key]:
-            latest_week_per_key[key] = ws
-            starting_inv[key] = (ws, qty_val)
-        elif ws == latest_week_per_key[key]:
-            starting_inv[key] = (ws, qty_val)
-
-    # 2) Receipts: (week_start, sku, warehouse_code) -> qty (sum)
-    receipts_rows = db.query(Receipt).all()
-    receipts: defaultdict[tuple[date, str, str], Decimal] = defaultdict(lambda: Decimal("0"))
-    for r in receipts_rows:
-        receipts[(cast(date, r.week_start), cast(str, r.sku), cast(str, r.warehouse_code))] += cast(
-            Decimal, r.qty
-        )
+    staged = stage_run_partitions(db, plan_run_id)
 
-    # 3) Demand actuals: (week_start, sku, warehouse_code, demand_type) -> qty (sum)
-    demand_rows = db.query(DemandActual).all()
-    demand_by_type: defaultdict[tuple[date, str, str, DemandType], Decimal] = defaultdict(
-        lambda: Decimal("0")
+    report("projecting", 0.0)
+    kernel_inputs = build_kernel_inputs(
+        keys,
+        inputs.starting_inv,
+        inputs.receipts,
+        inputs.demand_by_type,
+        params,
+        forecast_customer,
+        forecast_samples,
     )
-    for d in demand_rows:
-        demand_by_type[
-            (
-                cast(date, d.week_start),
-                cast(str, d.sku),
-                cast(str, d.warehouse_code),
-                cast(DemandType, d.demand_type),
+    result = project_sharded(
+        kernel_inputs, on_shard_done=lambda done: report("projecting", done)
+    )
+    report("persisting", 0.0)
+    _persist_projection(db, kernel_inputs, result, plan_run_id, storage, staged, report)
+    versions_target = staged[PlanRunInputVersion.__tablename__]
+    if base is not None and dirty is not None:
+        base_id = cast(int, base.id)
+        copied = 0
+        for table, columns in (
+            projection_table(storage),
+            (cast(Table, PlannedOrder.__table__), PLANNED_ORDER_COLUMNS),
+            (cast(Table, PlanRunInputVersion.__table__), RUN_VERSION_COLUMNS),
+        ):
+            copied += copy_forward(
+                db, table, columns, base_id, plan_run_id, dirty, target=staged[table.name]
             )
-        ] += cast(Decimal, d.qty)
+        record_run_versions(db, plan_run_id, dirty, versions, target=versions_target)
+        logger.info(
+            "Incremental plan run %s: %d changed keys recomputed, %d rows copied from run %s",
+            plan_run_id, len(dirty), copied, base_id,
+        )
+    else:
+        record_run_versions(
+            db, plan_run_id, versions.keys() | set(keys), versions, target=versions_target
+        )
+    attach_run_partitions(db, [plan_run])
+    report("persisting", 1.0)
 
-    policies = db.query(PlanningPolicy).all()
-    policy_by_key: dict[tuple[str, str], PlanningPolicy] = {
-        (cast(str, p.sku), cast(str, p.warehouse_code)): p for p in policies
-    }
+    db.commit()
+    db.refresh(plan_run)
+    return plan_run
 
-    # 4) Forecast: history_weeks = demand where week_start <= run_week; trailing mean = last forecast_window_weeks
-    forecast_customer: dict[tuple[str, str], Decimal] = {}
-    forecast_samples: dict[tuple[str, str], Decimal] = {}
-    for (sku, wh_code), policy in policy_by_key.items():
-        n = cast(int | None, policy.forecast_window_weeks) or 8
-        history_c: list[tuple[date, Decimal]] = []
-        history_s: list[tuple[date, Decimal]] = []
-        for (w, s, wc, dt), qty in demand_by_type.items():
-            if s != sku or wc != wh_code:
-                continue
-            if w > run_week:
-                continue
-            if dt == DemandType.CUSTOMER:
-                history_c.append((w, qty))
-            elif dt == DemandType.SAMPLES:
-                history_s.append((w, qty))
-        history_c.sort(key=lambda x: x[0])
-        history_s.sort(key=lambda x: x[0])
-        last_n_c = history_c[-n:] if len(history_c) >= n else history_c
-        last_n_s = history_s[-n:] if len(history_s) >= n else history_s
-        avg_c = sum(float(q) for _, q in last_n_c) / len(last_n_c) if last_n_c else Decimal("0")
-        avg_s = sum(float(q) for _, q in last_n_s) / len(last_n_s) if last_n_s else Decimal("0")
-        forecast_customer[(sku, wh_code)] = Decimal(str(round(avg_c, 4)))
-        forecast_samples[(sku, wh_code)] = Decimal(str(round(avg_s, 4)))
-
-    plan_run = PlanRun(scenario_name=scenario_name, run_at=run_at, created_at=run_at)
-    db.add(plan_run)
-    db.flush()
-
-    receipts_plus_orders: defaultdict[tuple[date, str, str], Decimal] = defaultdict(
-        lambda: Decimal("0")
+
+_QTY_QUANT = Decimal("0.0001")
+_WEEKS_QUANT = Decimal("0.01")
+
+
+def _override_params(params: Mapping[Key, PolicyParams], o: ScenarioOverrides) -> dict[Key, PolicyParams]:
+    """Policy params with a scenario's overrides; week values at the policy columns' 2 dp."""
+    changes: dict[str, float | int] = {}
+    if o.target_weeks is not None:
+        changes["target_weeks"] = float(o.target_weeks.quantize(_WEEKS_QUANT))
+    if o.safety_stock_weeks is not None:
+        changes["safety_stock_weeks"] = float(o.safety_stock_weeks.quantize(_WEEKS_QUANT))
+    if o.forecast_window_weeks is not None:
+        changes["forecast_window_weeks"] = o.forecast_window_weeks
+    if not changes:
+        return dict(params)
+    return {k: p._replace(**changes) for k, p in params.items()}
+
+
+def _has_overrides(o: ScenarioOverrides) -> bool:
+    return any(
+        v is not None
+        for v in (o.target_weeks, o.safety_stock_weeks, o.forecast_window_weeks, o.demand_uplift)
     )
-    for k, v in receipts.items():
-        receipts_plus_orders[k] += v
-
-    sku_wh_set = set(policy_by_key.keys()) | set(starting_inv.keys())
-    projected_rows: list[dict[str, Any]] = []
-    planned_order_rows: list[dict[str, Any]] = []
-
-    for (sku, wh_code) in sku_wh_set:
-        policy = policy_by_key.get((sku, wh_code))
-        if not policy:
-            continue
-        start_data = starting_inv.get((sku, wh_code))
-        if not start_data:
-            continue
-        snapshot_week, start_qty = start_data
-        lt_prod = float(cast(Decimal | None, policy.lead_time_production_weeks) or 0)
-        lt_slot = float(cast(Decimal | None, policy.lead_time_slot_wait_weeks) or 0)
-        lt_haul = float(cast(Decimal | None, policy.lead_time_haulage_weeks) or 0)
-        lt_put = float(cast(Decimal | None, policy.lead_time_putaway_weeks) or 0)
-        lt_pad = float(cast(Decimal | None, policy.lead_time_padding_weeks) or 0)
-        total_lt_float = lt_prod + lt_slot + lt_haul + lt_put + lt_pad
-        lt_weeks_int = max(0, math.ceil(total_lt_float))
-        include_samples: bool = cast(bool, getattr(policy, "include_samples", True))
-        fc_c: Decimal = forecast_customer.get((sku, wh_code), Decimal("0"))
-        fc_s: Decimal = (
-            forecast_samples.get((sku, wh_code), Decimal("0")) if include_samples else Decimal("0")
-        )
-        total_forecast_per_week: Decimal = fc_c + fc_s
-        safety_weeks = float(cast(Decimal | None, policy.safety_stock_weeks) or 0)
-        ss_method: SafetyStockMethod = cast(
-            SafetyStockMethod | None, policy.safety_stock_method
-        ) or SafetyStockMethod.WEEKS
-        safety_stock_qty: Decimal = (
-            total_forecast_per_week * Decimal(str(safety_weeks))
-            if ss_method == SafetyStockMethod.WEEKS and total_forecast_per_week > 0
-            else Decimal("0")
-        )
-        target_weeks = float(cast(Decimal | None, policy.target_weeks) or 4)
-        mode: PlanningMode = cast(PlanningMode | None, policy.mode) or PlanningMode.WOS_TARGET
-
-        inv = start_qty
-        # Build projection weeks: from snapshot_week forward only (next 52 weeks)
-        proj_weeks: list[date] = []
-        w = snapshot_week
-        for _ in range(53):
-            proj_weeks.append(w)
-            w = _next_monday(w)
-
-        for w in proj_weeks:
-            rec: Decimal = receipts_plus_orders.get((w, sku, wh_code), Decimal("0"))
-            d_c: Decimal | None = demand_by_type.get((w, sku, wh_code, DemandType.CUSTOMER))
-            d_s: Decimal | None = (
-                demand_by_type.get((w, sku, wh_code, DemandType.SAMPLES)) if include_samples else None
+
+
+def run_plan_batch(
+    db: Session, scenarios: Sequence[ScenarioOverrides], run_at: date | None = None
+) -> list[PlanRun]:
+    """One PlanRun per scenario from a single input load; all runs commit together.
+
+    Inputs, the demand history index and the (key x week) input matrices are
+    built once; each scenario only re-derives policy arrays and forecasts.
+    demand_uplift scales the trailing-mean forecasts (not recorded actuals),
+    rounded to the quantity columns' 4 dp.
+    """
+    if run_at is None:
+        run_at = date.today()
+    run_week = _monday_before(run_at)
+    storage = settings.plan_projection_storage
+
+    versions = current_versions(db)
+    inputs = load_plan_inputs(
+        db,
+        run_week,
+        forecast_windows=[o.forecast_window_weeks for o in scenarios if o.forecast_window_weeks is not None],
+    )
+    keys = sorted(set(inputs.policy_by_key.keys()) & set(inputs.starting_inv.keys()))
+    base_params = {k: _policy_params(inputs.policy_by_key[k]) for k in keys}
+    history = DemandHistoryIndex.from_demand_by_type(inputs.demand_by_type)
+
+    shared: KernelInputs | None = None
+    forecasts_by_window: dict[int | None, tuple[dict[Key, Decimal], dict[Key, Decimal]]] = {}
+    runs: list[PlanRun] = []
+    for o in scenarios:
+        params = _override_params(base_params, o)
+        window = o.forecast_window_weeks
+        if window not in forecasts_by_window:
+            forecasts_by_window[window] = _forecasts(history, keys, params, run_week)
+        forecast_customer, forecast_samples = forecasts_by_window[window]
+        if o.demand_uplift is not None:
+            uplift = o.demand_uplift
+            forecast_customer = {k: (v * uplift).quantize(_QTY_QUANT) for k, v in forecast_customer.items()}
+            forecast_samples = {k: (v * uplift).quantize(_QTY_QUANT) for k, v in forecast_samples.items()}
+
+        if shared is None:
+            shared = build_kernel_inputs(
+                keys,
+                inputs.starting_inv,
+                inputs.receipts,
+                inputs.demand_by_type,
+                params,
+                forecast_customer,
+                forecast_samples,
             )
-            d_adj: Decimal = demand_by_type.get(
-                (w, sku, wh_code, DemandType.ADJUSTMENT), Decimal("0")
+            kernel_inputs = shared
+        else:
+            kernel_inputs = with_policies(shared, params, forecast_customer, forecast_samples)
+        result = project_sharded(kernel_inputs)
+
+        plan_run_id = next_plan_run_id(db)
+        plan_run = PlanRun(
+            id=plan_run_id,
+            scenario_name=o.scenario_name,
+            run_at=run_at,
+            created_at=run_at,
+            projection_storage=storage,
+        )
+        staged = stage_run_partitions(db, plan_run_id)
+        _persist_projection(db, kernel_inputs, result, plan_run_id, storage, staged, _no_progress)
+        # Override runs are not a valid incremental base for plain runs of the scenario.
+        if not _has_overrides(o):
+            record_run_versions(
+                db,
+                plan_run_id,
+                versions.keys() | set(keys),
+                versions,
+                target=staged[PlanRunInputVersion.__tablename__],
             )
-            demand_c = d_c if d_c is not None else fc_c
-            demand_s = d_s if d_s is not None else (fc_s if include_samples else Decimal("0"))
-            demand: Decimal = demand_c + demand_s + d_adj
-            start_qty_week: Decimal = inv
-            inv = inv + rec - demand
-            end_qty_week: Decimal = inv
-
-            if total_forecast_per_week > 0:
-                woc: float = float(inv) / float(total_forecast_per_week)
-            else:
-                woc = 999.0 if inv > 0 else 0.0
-            stockout: bool = inv < 0
-
-            projected_rows.append({
-                "plan_run_id": plan_run.id,
-                "week_start": w,
-                "sku": sku,
-                "warehouse_code": wh_code,
-                "start_qty": start_qty_week,
-                "receipts_qty": rec,
-                "demand_qty": demand,
-                "projected_qty": end_qty_week,
-                "weeks_of_cover": Decimal(str(round(woc, 2))),
-                "stockout": stockout,
-            })
-
-            # Planned order
-            order_qty: Decimal = Decimal("0")
-            if mode == PlanningMode.WOS_TARGET:
-                if woc < target_weeks and total_forecast_per_week > 0:
-                    shortfall_weeks = target_weeks - woc
-                    order_qty = Decimal(
-                        str(round(shortfall_weeks * float(total_forecast_per_week), 4))
-                    )
-            else:
-                rop: Decimal = (
-                    total_forecast_per_week * Decimal(str(lt_weeks_int))
-                ) + safety_stock_qty
-                if inv < rop and total_forecast_per_week > 0:
-                    order_qty = max(rop - inv, Decimal("0"))
-                    order_qty = Decimal(str(round(float(order_qty), 4)))
-
-            if order_qty > 0:
-                arrival_week = w
-                for _ in range(lt_weeks_int):
-                    arrival_week = _next_monday(arrival_week)
-                receipts_plus_orders[(arrival_week, sku, wh_code)] += order_qty
-                planned_order_rows.append({
-                    "plan_run_id": plan_run.id,
-                    "week_start": w,
-                    "sku": sku,
-                    "warehouse_code": wh_code,
-                    "order_qty": order_qty,
-                })
-                if lt_weeks_int == 0:
-                    inv += order_qty
-                    end_qty_week = inv
-                    woc = (
-                        float(inv) / float(total_forecast_per_week)
-                        if total_forecast_per_week > 0
-                        else 999.0
-                    )
-                    last_proj: dict[str, Any] = projected_rows[-1]
-                    last_proj["projected_qty"] = inv
-                    last_proj["weeks_of_cover"] = Decimal(str(round(woc, 2)))
-                    last_proj["stockout"] = inv < 0
-
-    for r in projected_rows:
-        db.add(ProjectedInventory(**r))
-    for r in planned_order_rows:
-        db.add(PlannedOrder(**r))
+        runs.append(plan_run)
 
+    attach_run_partitions(db, runs)
     db.commit()
-    db.refresh(plan_run)
-    return plan_run
+    for plan_run in runs:
+        db.refresh(plan_run)
+    logger.info("Batch plan for %s: %d scenarios over %d keys", run_week, len(runs), len(keys))
+    return runs
@@ -0,0 +1,383 @@
+"""
+Array-backed projection kernel for run_plan.
+
+Every (sku, warehouse) key is one row of a (key x week) matrix; column j is
+snapshot_week + j weeks for that key. Weeks are walked column by column (an
+order placed in week j lands in week j + lead time), each column vectorized
+across all keys.
+
+Exactness (results match the per-key Decimal loop value for value):
+- Quantities are int64 in units of 1/QTY_SCALE, the scale of the Numeric(18, 4)
+  columns, so start/receipts/demand/end accumulate without rounding.
+- Weeks of cover and WOS_TARGET sizing use float64 built from the same
+  correctly rounded conversions the loop makes with float(Decimal).
+- Rounding to 2/4 places reproduces Python's round(); values too close to a
+  rounding boundary to decide from float64 fall back to round() itself.
+- ROP is compared in units of 1/ROP_SCALE: forecast (4 dp) x safety weeks
+  (Numeric(10, 2)) has at most 6 decimals.
+"""
+from __future__ import annotations
+
+import logging
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import dataclass, fields, replace
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, NamedTuple
+
+import numpy as np
+import numpy.typing as npt
+
+from app.models import DemandType, PlanningMode, SafetyStockMethod
+
+logger = logging.getLogger(__name__)
+
+HORIZON_WEEKS = 53
+QTY_SCALE = 10_000
+ROP_SCALE = 1_000_000
+QTY_DECIMALS = 4
+WOC_DECIMALS = 2
+
+IntArray = npt.NDArray[np.int64]
+FloatArray = npt.NDArray[np.float64]
+BoolArray = npt.NDArray[np.bool_]
+
+
+class PolicyParams(NamedTuple):
+    """Planning policy values as run_plan reads them (defaults applied)."""
+    mode: PlanningMode
+    target_weeks: float
+    safety_stock_method: SafetyStockMethod
+    safety_stock_weeks: float
+    forecast_window_weeks: int
+    lead_time_weeks: int
+    include_samples: bool
+
+
+@dataclass
+class KernelInputs:
+    """Per-key inputs laid out as (key x week) matrices; row i is keys[i]."""
+    keys: list[tuple[str, str]]
+    snapshot_weeks: list[date]
+    start_qty: IntArray
+    receipts: IntArray
+    demand_customer: IntArray
+    has_customer: BoolArray
+    demand_samples: IntArray
+    has_samples: BoolArray
+    demand_adjustment: IntArray
+    forecast_customer: IntArray
+    forecast_samples: IntArray
+    include_samples: BoolArray
+    is_rop: BoolArray
+    target_weeks: FloatArray
+    lead_time_weeks: IntArray
+    rop: IntArray
+
+
+@dataclass
+class KernelResult:
+    """Projection outputs, same row order as KernelInputs.keys."""
+    start_qty: IntArray
+    receipts_qty: IntArray
+    demand_qty: IntArray
+    end_qty: IntArray
+    weeks_of_cover: IntArray
+    stockout: BoolArray
+    order_qty: IntArray
+
+
+def to_scaled(value: Decimal, scale: int = QTY_SCALE) -> int:
+    """Decimal -> int in units of 1/scale (exact for values within the column scale)."""
+    return int(value * scale)
+
+
+def from_scaled(value: int, decimals: int = QTY_DECIMALS) -> Decimal:
+    return Decimal(value).scaleb(-decimals)
+
+
+def _py_round_scaled(x: float, decimals: int) -> int:
+    """Reference path: exactly what the loop does, Decimal(str(round(x, n)))."""
+    return int(Decimal(str(round(x, decimals))).scaleb(decimals))
+
+
+def round_scaled(x: FloatArray, decimals: int) -> IntArray:
+    """Element-wise round(x, decimals) * 10**decimals as int64, matching Python's round()."""
+    y = x * float(10**decimals)
+    r = np.rint(y)
+    ay = np.abs(y)
+    # y - r is exact; if it is not within a few ulps of a half, rint(y) is the
+    # correctly rounded value of the exact x * 10**decimals.
+    unsure = (np.abs(np.abs(y - r) - 0.5) <= 4 * np.spacing(ay)) | ~(ay < 1e15)
+    out = np.where(unsure, 0.0, r).astype(np.int64)
+    for i in np.flatnonzero(unsure):
+        out[i] = _py_round_scaled(float(x[i]), decimals)
+    return out
+
+
+def _week_offsets(
+    key_index: Mapping[tuple[str, str], int],
+    snapshot_ordinals: Sequence[int],
+    week: date,
+    key: tuple[str, str],
+) -> tuple[int, int] | None:
+    i = key_index.get(key)
+    if i is None:
+        return None
+    delta = week.toordinal() - snapshot_ordinals[i]
+    if delta < 0 or delta % 7:
+        return None
+    j = delta // 7
+    if j >= HORIZON_WEEKS:
+        return None
+    return i, j
+
+
+def _policy_arrays(
+    keys: Sequence[tuple[str, str]],
+    params: Mapping[tuple[str, str], PolicyParams],
+    forecast_customer: Mapping[tuple[str, str], Decimal],
+    forecast_samples: Mapping[tuple[str, str], Decimal],
+) -> dict[str, Any]:
+    """The KernelInputs fields that depend on policy and forecast rather than on input rows."""
+    n = len(keys)
+    zero = Decimal("0")
+    include = np.array([params[k].include_samples for k in keys], dtype=np.bool_)
+    fc_c = np.array([to_scaled(forecast_customer.get(k, zero)) for k in keys], dtype=np.int64)
+    fc_s = np.array([to_scaled(forecast_samples.get(k, zero)) for k in keys], dtype=np.int64)
+    fc_s = np.where(include, fc_s, 0)
+
+    rop = np.zeros(n, dtype=np.int64)
+    for i, k in enumerate(keys):
+        p = params[k]
+        if p.mode == PlanningMode.WOS_TARGET:
+            continue
+        total_fc = from_scaled(int(fc_c[i] + fc_s[i]))
+        safety_stock_qty = (
+            total_fc * Decimal(str(p.safety_stock_weeks))
+            if p.safety_stock_method == SafetyStockMethod.WEEKS and total_fc > 0
+            else zero
+        )
+        rop[i] = to_scaled(total_fc * Decimal(str(p.lead_time_weeks)) + safety_stock_qty, ROP_SCALE)
+
+    return {
+        "forecast_customer": fc_c,
+        "forecast_samples": fc_s,
+        "include_samples": include,
+        "is_rop": np.array([params[k].mode != PlanningMode.WOS_TARGET for k in keys], dtype=np.bool_),
+        "target_weeks": np.array([params[k].target_weeks for k in keys], dtype=np.float64),
+        "lead_time_weeks": np.array([params[k].lead_time_weeks for k in keys], dtype=np.int64),
+        "rop": rop,
+    }
+
+
+def build_kernel_inputs(
+    keys: Sequence[tuple[str, str]],
+    starting_inv: Mapping[tuple[str, str], tuple[date, Decimal]],
+    receipts: Mapping[tuple[date, str, str], Decimal],
+    demand_by_type: Mapping[tuple[date, str, str, DemandType], Decimal],
+    params: Mapping[tuple[str, str], PolicyParams],
+    forecast_customer: Mapping[tuple[str, str], Decimal],
+    forecast_samples: Mapping[tuple[str, str], Decimal],
+) -> KernelInputs:
+    """Lay the run_plan lookups out as matrices for the given keys (each needs a snapshot and params)."""
+    n = len(keys)
+    shape = (n, HORIZON_WEEKS)
+    key_index = {k: i for i, k in enumerate(keys)}
+    snapshot_weeks = [starting_inv[k][0] for k in keys]
+    snapshot_ordinals = [w.toordinal() for w in snapshot_weeks]
+
+    start_qty = np.array([to_scaled(starting_inv[k][1]) for k in keys], dtype=np.int64)
+    rec = np.zeros(shape, dtype=np.int64)
+    d_c = np.zeros(shape, dtype=np.int64)
+    d_s = np.zeros(shape, dtype=np.int64)
+    d_adj = np.zeros(shape, dtype=np.int64)
+    has_c = np.zeros(shape, dtype=np.bool_)
+    has_s = np.zeros(shape, dtype=np.bool_)
+
+    for (w, sku, wh), qty in receipts.items():
+        pos = _week_offsets(key_index, snapshot_ordinals, w, (sku, wh))
+        if pos is not None:
+            rec[pos] = to_scaled(qty)
+    for (w, sku, wh, dt), qty in demand_by_type.items():
+        pos = _week_offsets(key_index, snapshot_ordinals, w, (sku, wh))
+        if pos is None:
+            continue
+        if dt == DemandType.CUSTOMER:
+            d_c[pos] = to_scaled(qty)
+            has_c[pos] = True
+        elif dt == DemandType.SAMPLES:
+            d_s[pos] = to_scaled(qty)
+            has_s[pos] = True
+        elif dt == DemandType.ADJUSTMENT:
+            d_adj[pos] = to_scaled(qty)
+
+    return KernelInputs(
+        keys=list(keys),
+        snapshot_weeks=snapshot_weeks,
+        start_qty=start_qty,
+        receipts=rec,
+        demand_customer=d_c,
+        has_customer=has_c,
+        demand_samples=d_s,
+        has_samples=has_s,
+        demand_adjustment=d_adj,
+        **_policy_arrays(keys, params, forecast_customer, forecast_samples),
+    )
+
+
+def with_policies(
+    inp: KernelInputs,
+    params: Mapping[tuple[str, str], PolicyParams],
+    forecast_customer: Mapping[tuple[str, str], Decimal],
+    forecast_samples: Mapping[tuple[str, str], Decimal],
+) -> KernelInputs:
+    """Same input rows, different policies/forecasts (scenario overrides); matrices are shared."""
+    return replace(inp, **_policy_arrays(inp.keys, params, forecast_customer, forecast_samples))
+
+
+def project(inp: KernelInputs) -> KernelResult:
+    """Project every key over HORIZON_WEEKS, placing WOS_TARGET / ROP orders as the loop does."""
+    n = len(inp.keys)
+    shape = (n, HORIZON_WEEKS)
+    include = inp.include_samples[:, None]
+    demand = (
+        np.where(inp.has_customer, inp.demand_customer, inp.forecast_customer[:, None])
+        + np.where(include & inp.has_samples, inp.demand_samples, inp.forecast_samples[:, None])
+        + inp.demand_adjustment
+    )
+    incoming = inp.receipts.copy()
+    fc = inp.forecast_customer + inp.forecast_samples
+    has_fc = fc > 0
+    fc_f = fc / float(QTY_SCALE)
+    safe_fc_f = np.where(has_fc, fc_f, 1.0)
+    wos_rows = ~inp.is_rop & has_fc
+    rop_rows = inp.is_rop & has_fc
+    lt = inp.lead_time_weeks
+    rows = np.arange(n)
+
+    start_qty = np.empty(shape, dtype=np.int64)
+    end_qty = np.empty(shape, dtype=np.int64)
+    woc_out = np.empty(shape, dtype=np.int64)
+    order_qty = np.zeros(shape, dtype=np.int64)
+
+    inv = inp.start_qty.copy()
+    for j in range(HORIZON_WEEKS):
+        start_qty[:, j] = inv
+        inv = inv + incoming[:, j] - demand[:, j]
+        inv_f = inv / float(QTY_SCALE)
+        woc = np.where(has_fc, inv_f / safe_fc_f, np.where(inv > 0, 999.0, 0.0))
+
+        order = np.zeros(n, dtype=np.int64)
+        wos = wos_rows & (woc < inp.target_weeks)
+        if wos.any():
+            order[wos] = round_scaled((inp.target_weeks[wos] - woc[wos]) * fc_f[wos], QTY_DECIMALS)
+        inv_rop = inv * (ROP_SCALE // QTY_SCALE)
+        rop = rop_rows & (inv_rop < inp.rop)
+        if rop.any():
+            shortfall = (inp.rop[rop] - inv_rop[rop]) / float(ROP_SCALE)
+            order[rop] = round_scaled(shortfall, QTY_DECIMALS)
+
+        placed = order > 0
+        if placed.any():
+            order_qty[placed, j] = order[placed]
+            arrival = j + lt
+            later = placed & (lt > 0) & (arrival < HORIZON_WEEKS)
+            incoming[rows[later], arrival[later]] += order[later]
+            now = placed & (lt == 0)
+            if now.any():
+                inv = np.where(now, inv + order, inv)
+                woc = np.where(now, (inv / float(QTY_SCALE)) / safe_fc_f, woc)
+
+        end_qty[:, j] = inv
+        woc_out[:, j] = round_scaled(woc, WOC_DECIMALS)
+
+    return KernelResult(
+        start_qty=start_qty,
+        receipts_qty=incoming,
+        demand_qty=demand,
+        end_qty=end_qty,
+        weeks_of_cover=woc_out,
+        stockout=end_qty < 0,
+        order_qty=order_qty,
+    )
+
+
+def select_rows(inp: KernelInputs, rows: IntArray) -> KernelInputs:
+    """KernelInputs restricted to the given key rows, in that order."""
+    picked = rows.tolist()
+    values: dict[str, Any] = {}
+    for f in fields(KernelInputs):
+        v = getattr(inp, f.name)
+        values[f.name] = v[rows] if isinstance(v, np.ndarray) else [v[i] for i in picked]
+    return KernelInputs(**values)
+
+
+def merge_results(n: int, parts: Sequence[tuple[IntArray, KernelResult]]) -> KernelResult:
+    """Scatter non-empty per-shard results (rows, result) back into one result of n keys."""
+    merged: dict[str, Any] = {}
+    for f in fields(KernelResult):
+        out = np.zeros((n, HORIZON_WEEKS), dtype=getattr(parts[0][1], f.name).dtype)
+        for rows, res in parts:
+            out[rows] = getattr(res, f.name)
+        merged[f.name] = out
+    return KernelResult(**merged)
+
+
+PROJECTED_COLUMNS = (
+    "plan_run_id",
+    "week_start",
+    "sku",
+    "warehouse_code",
+    "start_qty",
+    "receipts_qty",
+    "demand_qty",
+    "projected_qty",
+    "weeks_of_cover",
+    "stockout",
+)
+PLANNED_ORDER_COLUMNS = ("plan_run_id", "week_start", "sku", "warehouse_code", "order_qty")
+
+
+def iter_projected_rows(
+    inp: KernelInputs, res: KernelResult, plan_run_id: int
+) -> Iterator[tuple[Any, ...]]:
+    """Yield projected_inventory rows (PROJECTED_COLUMNS order) in key, week order."""
+    for i, (sku, wh_code) in enumerate(inp.keys):
+        w = inp.snapshot_weeks[i]
+        start = res.start_qty[i].tolist()
+        rec = res.receipts_qty[i].tolist()
+        dem = res.demand_qty[i].tolist()
+        end = res.end_qty[i].tolist()
+        woc = res.weeks_of_cover[i].tolist()
+        stockout = res.stockout[i].tolist()
+        for j in range(HORIZON_WEEKS):
+            yield (
+                plan_run_id,
+                w,
+                sku,
+                wh_code,
+                from_scaled(start[j]),
+                from_scaled(rec[j]),
+                from_scaled(dem[j]),
+                from_scaled(end[j]),
+                from_scaled(woc[j], WOC_DECIMALS),
+                stockout[j],
+            )
+            w = w + timedelta(days=7)
+
+
+def iter_planned_order_rows(
+    inp: KernelInputs, res: KernelResult, plan_run_id: int
+) -> Iterator[tuple[Any, ...]]:
+    """Yield planned_orders rows (PLANNED_ORDER_COLUMNS order) in key, week order."""
+    idx_rows, idx_weeks = np.nonzero(res.order_qty > 0)
+    for i, j in zip(idx_rows.tolist(), idx_weeks.tolist()):
+        sku, wh_code = inp.keys[i]
+        yield (
+            plan_run_id,
+            inp.snapshot_weeks[i] + timedelta(days=7 * j),
+            sku,
+            wh_code,
+            from_scaled(int(res.order_qty[i, j])),
+        )
@@ -0,0 +1,131 @@
+"""
+Connection pool instrumentation.
+
+The engines use these QueuePool subclasses, which time every wait for a
+connection and count the waits that ended in a pool timeout; pool event hooks
+count checkouts, new connections and invalidations. Peak in-use and overflow
+counts are taken at each checkout. Figures are per process and since start,
+except the wait percentiles, which cover the last WAIT_SAMPLES waits.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, cast
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, Pool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+WAIT_SAMPLES = 1000
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waits: deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self.checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+
+    def waited(self, seconds: float, checked_out: int, overflow: int) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+            self.waits += 1
+            self.wait_total_s += seconds
+            self.wait_max_s = max(self.wait_max_s, seconds)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            self.peak_overflow = max(self.peak_overflow, overflow)
+
+    def timed_out(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def recent_waits(self) -> list[float]:
+        with self._lock:
+            return sorted(self._waits)
+
+
+class _InstrumentedPool(QueuePool):
+    stats: PoolStats
+
+    def __init__(self, *args: Any, **kw: Any) -> None:
+        super().__init__(*args, **kw)
+        self.stats = PoolStats()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timed_out()
+            raise
+        self.stats.waited(time.perf_counter() - start, self.checkedout(), max(self.overflow(), 0))
+        return entry
+
+    def recreate(self) -> QueuePool:
+        # engine.dispose() swaps in a new pool; its figures carry on
+        pool = super().recreate()
+        pool.stats = self.stats  # type: ignore[attr-defined]
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument(pool: Pool) -> None:
+    """Count checkouts, new connections and invalidations of an instrumented pool (and its replacements)."""
+    stats = cast(_InstrumentedPool, pool).stats
+    event.listen(pool, "checkout", lambda *_: stats.count("checkouts"))
+    event.listen(pool, "connect", lambda *_: stats.count("connects"))
+    event.listen(pool, "invalidate", lambda *_: stats.count("invalidations"))
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def pool_status(engine_pool: Pool, max_overflow: int) -> dict[str, Any]:
+    """Current occupancy, configuration and the instrumented figures of an instrumented pool."""
+    pool = cast(_InstrumentedPool, engine_pool)
+    stats = pool.stats
+    waits = stats.recent_waits()
+    return {
+        "size": pool.size(),
+        "max_overflow": max_overflow,
+        "timeout_s": pool.timeout(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "peak_checked_out": stats.peak_checked_out,
+        "peak_overflow": stats.peak_overflow,
+        "checkouts": stats.checkouts,
+        "connects": stats.connects,
+        "invalidations": stats.invalidations,
+        "timeouts": stats.timeouts,
+        "waits": stats.waits,
+        "wait_ms_mean": stats.wait_total_s * 1000 / stats.waits if stats.waits else 0.0,
+        "wait_ms_p50": _percentile(waits, 0.5) * 1000,
+        "wait_ms_p99": _percentile(waits, 0.99) * 1000,
+        "wait_ms_max": stats.wait_max_s * 1000,
+    }
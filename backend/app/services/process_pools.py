@@ -0,0 +1,46 @@
+"""
+Lazily started pools of worker processes (plan shards, synchronous imports).
+
+Workers are spawned, not forked: a forked child would share the parent's open
+database connections (both ends then talk on the same socket) and copy a
+snapshot of its locks mid-use, while the job, heartbeat and purge threads that
+would release them do not exist in the child.
+"""
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class SpawnPool:
+    """A ProcessPoolExecutor of spawned workers, started on first use and restarted when its size changes."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pool: ProcessPoolExecutor | None = None
+        self._workers = 0
+
+    def get(self, workers: int) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None or self._workers != workers:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                self._workers = workers
+            return self._pool
+
+    def discard(self, pool: ProcessPoolExecutor) -> None:
+        """Forget a broken pool (a worker died), so the next get starts a fresh one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
@@ -111,6 +111,25 @@ export interface SkuWeekExplanation {
   forecast_method: string
 }
 
+export interface StockoutRiskWindow {
+  weeks: number
+  stockouts: number
+  keys_at_risk: number
+}
+
+export interface StockoutRiskKey {
+  sku: string
+  warehouse_code: string
+  stockout_weeks: number
+  min_weeks_of_cover?: string | null
+}
+
+export interface StockoutRisk {
+  plan_run_id: number
+  windows: StockoutRiskWindow[]
+  top: StockoutRiskKey[]
+}
+
 export interface Receipt {
   id: number
   week_start: string
@@ -148,4 +167,6 @@ export interface ImportDryRunResult {
   valid_rows: number
   errors: ImportRowError[]
   preview?: Record<string, string | number | null>[]
+  inserted_rows?: number | null
+  updated_rows?: number | null
 }
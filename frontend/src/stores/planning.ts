@@ -8,14 +8,56 @@ import api, {
   type DemandActual,
   type InventorySnapshot,
   type SkuWeekExplanation,
+  type StockoutRisk,
 } from '@/api/client'
 
+// Largest page the plan endpoints serve (MAX_PAGE_SIZE in backend/app/services/pagination.py)
+const MAX_PAGE_SIZE = 10000
+
+export interface ResultPage<T> {
+  rows: T[]
+  nextCursor: string | null // pass back to load the next page; null on the last one
+}
+
+// One page of a plan list endpoint; the server's default page size unless limit is given
+async function fetchPage<T>(
+  url: string,
+  params: URLSearchParams,
+  cursor?: string | null,
+  limit?: number
+): Promise<ResultPage<T>> {
+  if (cursor) params.set('cursor', cursor)
+  if (limit) params.set('limit', String(limit))
+  const { data, headers } = await api.get<T[]>(`${url}?${params}`)
+  return { rows: data, nextCursor: headers['x-next-cursor'] ?? null }
+}
+
+// Every page, for lists that stay small: plan runs, or one SKU/warehouse's weeks of a run.
+// A run's full results can be millions of rows; page those with fetchPage instead.
+async function fetchAllPages<T>(url: string, params = new URLSearchParams()): Promise<T[]> {
+  const rows: T[] = []
+  let cursor: string | null = null
+  do {
+    const page: ResultPage<T> = await fetchPage<T>(url, params, cursor, MAX_PAGE_SIZE)
+    rows.push(...page.rows)
+    cursor = page.nextCursor
+  } while (cursor)
+  return rows
+}
+
+function keyParams(sku?: string, warehouseCode?: string): URLSearchParams {
+  const params = new URLSearchParams()
+  if (sku) params.set('sku', sku)
+  if (warehouseCode) params.set('warehouse_code', warehouseCode)
+  return params
+}
+
 export const usePlanningStore = defineStore('planning', () => {
   const planRuns = ref<PlanRun[]>([])
   const selectedRunIds = ref<number[]>([])
 
   async function fetchPlanRuns() {
-    const { data } = await api.get<PlanRun[]>('/plan/runs')
+    const data = await fetchAllPages<PlanRun>('/plan/runs')
     planRuns.value = data
     return data
   }
@@ -28,19 +70,49 @@ export const usePlanningStore = defineStore('planning', () => {
     return data
   }
 
-  async function fetchProjectedInventory(planRunId: number, sku?: string, warehouseCode?: string) {
-    const params = new URLSearchParams()
-    if (sku) params.set('sku', sku)
-    if (warehouseCode) params.set('warehouse_code', warehouseCode)
-    const { data } = await api.get<ProjectedInventory[]>(`/plan/runs/${planRunId}/projected-inventory?${params}`)
-    return data
+  // One page of a run's projected inventory; order 'key' keeps each SKU/warehouse's weeks together
+  async function fetchProjectedInventory(
+    planRunId: number,
+    options: { sku?: string; warehouseCode?: string; order?: 'week' | 'key'; cursor?: string | null; limit?: number } = {}
+  ) {
+    const params = keyParams(options.sku, options.warehouseCode)
+    if (options.order) params.set('order', options.order)
+    return fetchPage<ProjectedInventory>(
+      `/plan/runs/${planRunId}/projected-inventory`,
+      params,
+      options.cursor,
+      options.limit
+    )
+  }
+
+  // One page of a run's planned orders
+  async function fetchPlannedOrders(
+    planRunId: number,
+    options: { sku?: string; warehouseCode?: string; cursor?: string | null; limit?: number } = {}
+  ) {
+    return fetchPage<PlannedOrder>(
+      `/plan/runs/${planRunId}/planned-orders`,
+      keyParams(options.sku, options.warehouseCode),
+      options.cursor,
+      options.limit
+    )
+  }
+
+  // Every week of one SKU/warehouse in a run (at most the planning horizon)
+  async function fetchKeyProjectedInventory(planRunId: number, sku: string, warehouseCode: string) {
+    return fetchAllPages<ProjectedInventory>(
+      `/plan/runs/${planRunId}/projected-inventory`,
+      keyParams(sku, warehouseCode)
+    )
+  }
+
+  // Every planned order of one SKU/warehouse in a run
+  async function fetchKeyPlannedOrders(planRunId: number, sku: string, warehouseCode: string) {
+    return fetchAllPages<PlannedOrder>(`/plan/runs/${planRunId}/planned-orders`, keyParams(sku, warehouseCode))
   }
 
-  async function fetchPlannedOrders(planRunId: number, sku?: string, warehouseCode?: string) {
-    const params = new URLSearchParams()
-    if (sku) params.set('sku', sku)
-    if (warehouseCode) params.set('warehouse_code', warehouseCode)
-    const { data } = await api.get<PlannedOrder[]>(`/plan/runs/${planRunId}/planned-orders?${params}`)
+  async function fetchStockoutRisk(planRunId: number) {
+    const { data } = await api.get<StockoutRisk>(`/plan/runs/${planRunId}/stockout-risk`)
     return data
   }
 
@@ -87,6 +159,9 @@ export const usePlanningStore = defineStore('planning', () => {
     runPlan,
     fetchProjectedInventory,
     fetchPlannedOrders,
+    fetchKeyProjectedInventory,
+    fetchKeyPlannedOrders,
+    fetchStockoutRisk,
     fetchSkuWeekExplanation,
     fetchReceipts,
     fetchDemandActuals,